@@ -2,18 +2,26 @@ from flask import Flask, request, jsonify, render_template_string, redirect, url
 import sympy as sp
 import urllib.parse
 import requests
-from selenium import webdriver
-from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
-from webdriver_manager.chrome import ChromeDriverManager
+from selenium.common.exceptions import NoSuchElementException, TimeoutException, WebDriverException
 import statistics
 from bs4 import BeautifulSoup
+import atexit
+import os
+from webdriver_pool import WebDriverPool, create_webdriver, is_driver_healthy
+from page_extract import extract_listings
 
 app = Flask(__name__)
 
+driver_pool = WebDriverPool(
+    size=int(os.environ.get("WEBDRIVER_POOL_SIZE", 2)),
+    max_pages=int(os.environ.get("WEBDRIVER_MAX_PAGES", 50)),
+    acquire_timeout=float(os.environ.get("WEBDRIVER_ACQUIRE_TIMEOUT", 60))
+)
+atexit.register(driver_pool.close)
+
 def wait_for_non_empty_text(driver, locator, timeout=10):
     return WebDriverWait(driver, timeout).until(
         lambda d: d.find_element(*locator).text.strip(),
@@ -31,36 +39,24 @@ def get_listings_info(driver):
     listings_info = []
 
     try:
-        prices = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__info__price')))
-        stocks = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.add-to-cart__available')))
-        stocks = stocks[1:]
-        sellers = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__seller .seller-info__name')))
-        sales = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__seller .seller-info__sales')))
-        seller_divs = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__seller')))
-
-        for price, stock, seller, sale, seller_div in zip(prices, stocks, sellers, sales, seller_divs):
+        WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__info__price')))
+
+        # The whole listing table comes back from one execute_script call
+        for listing in extract_listings(driver):
+            if None in (listing['stock'], listing['seller'], listing['sales'], listing['direct']):
+                break
+
             shipping_cost = "0"
-            try:
-                shipping_cost_element = price.find_element(By.XPATH, "..").find_element(By.CSS_SELECTOR, '.shipping-messages__price')
-                shipping_cost = shipping_cost_element.text.strip('+ ').strip(' Shipping').replace('$', '').strip()
-            except NoSuchElementException:
-                pass
-
-            direct_seller = "no"
-            try:
-                direct_seller_element = seller_div.find_element(By.CSS_SELECTOR, 'a[title="Direct Seller"]')
-                if direct_seller_element:
-                    direct_seller = "yes"
-            except NoSuchElementException:
-                pass
+            if listing['shipping'] is not None:
+                shipping_cost = listing['shipping'].strip('+ ').strip(' Shipping').replace('$', '').strip()
 
             listings_info.append({
-                'Price': price.text.replace('$', '').replace(',', '').strip(),
-                'Stock': stock.text.strip(' of'),
+                'Price': listing['price'].replace('$', '').replace(',', '').strip(),
+                'Stock': listing['stock'].strip(' of'),
                 'Shipping Cost': shipping_cost,
-                'Seller': seller.text,
-                'Sales': sale.text.strip(' ()'),
-                'Direct': direct_seller
+                'Seller': listing['seller'],
+                'Sales': listing['sales'].strip(' ()'),
+                'Direct': "yes" if listing['direct'] else "no"
             })
 
         if not listings_info:
@@ -163,13 +159,18 @@ def get_listing_info(driver, url):
             'Direct': spotlight_info['Direct']
         }
 
+    except WebDriverException as e:
+        # A dead driver has to reach driver_pool.checkout, which replaces it instead of pooling it again
+        if not is_driver_healthy(driver):
+            raise
+        print(f"An error occurred with URL {url}: {e}")
     except Exception as e:
         print(f"An error occurred with URL {url}: {e}")
 
     return listings_data, spotlight_data
 
 def initialize_webdriver():
-    return webdriver.Chrome(service=Service(ChromeDriverManager().install()))
+    return create_webdriver()
 
 @app.route('/process-image', methods=['GET'])
 def process_image():
@@ -286,22 +287,25 @@ def calculate():
 def process_tcgplayer_url():
     url = request.args.get('url')
     if url:
-        driver = initialize_webdriver()
         try:
-            listings_data, spotlight_data = get_listing_info(driver, url)
+            with driver_pool.checkout() as driver:
+                listings_data, spotlight_data = get_listing_info(driver, url)
             response_data = {
                 "listings": listings_data,
                 "spotlight": spotlight_data
             }
             return jsonify(response_data)
+        except TimeoutError as e:
+            return jsonify({"error": "All browsers are busy", "details": str(e)}), 503
         except Exception as e:
             return jsonify({"error": "Failed to process URL", "details": str(e)}), 400
-        finally:
-            driver.quit()
     else:
         return jsonify({"error": "No URL provided"}), 400
 
+@app.route('/driver-pool-stats', methods=['GET'])
+def driver_pool_stats():
+    return jsonify(driver_pool.stats())
+
 if __name__ == '__main__':
-    import os
     port = int(os.environ.get("PORT", 5000))
     app.run(host='0.0.0.0', port=port)
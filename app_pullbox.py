@@ -1,27 +1,53 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for
-from collections import defaultdict
-import sqlite3
-import re
+from flask import Flask, render_template, request, jsonify, redirect, url_for, make_response
+import hashlib
 import os
 import urllib.parse
 import threading
-import requests
 from dotenv import load_dotenv
-from datetime import datetime
+from datetime import datetime, timezone
 from discord.ext import commands
+from page_cache import PageCache, snapshot_cache_key
+from db_pool import ReadOnlyConnectionPool
+from discord_notifier import DiscordNotifier
+from catalog import DEFAULT_PAGE_SIZE, list_boxes, query_cards
+from card_names import process_card_number, process_label, process_name, process_set_name
+from search_index import build_memory_index, has_search_index, search_cards
+from price_history import connect_history_read_only, get_history_path, get_price_rollups, get_price_trend
+from card_keys import get_catalog_path
+from box_value import load_box_valuation, update_valuation
 
 load_dotenv()
 app = Flask(__name__)
 
-def get_db_connection():
+def get_databases_path():
     script_dir = os.path.dirname(os.path.abspath(__file__))
-    db_path = os.path.join(script_dir, 'databases', 'pullbox_cards.db')
-    if not os.path.exists(db_path):
-        raise FileNotFoundError(f"Database file not found at {db_path}")
-    print(f"Connecting to database at: {db_path}")
-    conn = sqlite3.connect(db_path)
-    conn.row_factory = sqlite3.Row
-    return conn
+    return os.path.join(script_dir, 'databases')
+
+def get_page_sources():
+    # Everything the cached pages are rendered from; editing any of it invalidates the page cache
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    return [os.path.join(script_dir, 'templates'), os.path.abspath(__file__), os.path.join(script_dir, 'catalog.py')]
+
+page_cache = PageCache(get_databases_path(), get_page_sources())
+memory_search_index = {}
+memory_search_lock = threading.Lock()
+box_valuations = {}
+box_valuation_lock = threading.Lock()
+_notifier = None
+_notifier_lock = threading.Lock()
+db_pool = ReadOnlyConnectionPool(get_databases_path(), max_idle=int(os.getenv('DB_POOL_SIZE', 8)))
+
+def get_notifier():
+    # Created on first use, so importing the app doesn't open the outbox or start its sender thread
+    global _notifier
+    with _notifier_lock:
+        if _notifier is None:
+            _notifier = DiscordNotifier(os.path.join(get_databases_path(), 'discord_outbox_app.db'))
+    return _notifier
+
+def get_db_path():
+    # Resolved on every request so a newly published snapshot is picked up without a restart
+    return db_pool.current_path()
 
 @app.route('/')
 def index():
@@ -33,78 +59,80 @@ def truncate_label(label):
 def truncate_number_in_set(number_in_set):
     return (number_in_set[:1000] + '...') if len(number_in_set) > 1000 else number_in_set
 
+def card_to_json(card):
+    try:
+        new_avg_price = round(float(card['price_avg']) * 1.679, 2)
+    except (TypeError, ValueError):
+        new_avg_price = None
+    return {
+        'key': f"{card['name']}|||{card['box_name']}|||{card['label']}",
+        'name': card['name'],
+        'box_name': card['box_name'],
+        'labels': [truncate_label(card['label'])],
+        'set': card['set'],
+        'number_in_set': truncate_number_in_set(card['number_in_set'] or ''),
+        'image_url': card['image_url'],
+        'price_avg': card['price_avg'],
+        'new_avg_price': new_avg_price,
+        'prices': [(listing['price'], listing['stock'], listing['shipping']) for listing in card['listings']],
+    }
+
+def get_catalog_page(conn, args):
+    # Raises ValueError for malformed filters, sorts or cursors
+    min_price = args.get('min_price')
+    max_price = args.get('max_price')
+    cards, next_cursor = query_cards(
+        conn,
+        box=args.get('box'),
+        card_set=args.get('set'),
+        label=args.get('label'),
+        search=args.get('q'),
+        min_price=float(min_price) if min_price else None,
+        max_price=float(max_price) if max_price else None,
+        sort=args.get('sort', 'box'),
+        descending=args.get('order') == 'desc',
+        cursor=args.get('cursor'),
+        limit=int(args.get('limit', DEFAULT_PAGE_SIZE))
+    )
+    return {'cards': [card_to_json(card) for card in cards], 'next_cursor': next_cursor}
+
+def conditional_response(response, etag, last_modified):
+    response.set_etag(etag)
+    response.last_modified = datetime.fromtimestamp(last_modified, tz=timezone.utc)
+    # Browsers revalidate every time and get a 304 until the next snapshot
+    response.cache_control.no_cache = True
+    return response.make_conditional(request)
+
+def build_cards_page(db_path):
+    # Only the first page of cards is inlined; the template fetches the rest from /api/cards as the list scrolls
+    with db_pool.checkout(db_path) as conn:
+        first_page = get_catalog_page(conn, {})
+        boxes = list_boxes(conn)
+    return render_template('cards_pullbox.html', first_page=first_page, boxes=boxes)
+
 @app.route('/cards2')
 def cards():
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-    SELECT name, label, "set", number_in_set, image_url, price, price_avg, shipping, stock, box_name
-    FROM card_data
-    ORDER BY box_name, name, label
-    ''')
-    rows = cur.fetchall()
-    
-    card_data = defaultdict(lambda: {'prices': [], 'image_url': None, 'number_in_set': None, 'labels': [], 'box_name': None, 'box_class': None})
-    previous_box_name = ""
-    color_class = "light-blue"
-    
-    for row in rows:
-        card_key = (row['name'], row['box_name'], row['label'])
-        card_entry = card_data[card_key]
-
-        card_entry['prices'].append((row['price'], row['stock'], row['shipping']))
-        card_entry['price_avg'] = row['price_avg']
-        card_entry['image_url'] = row['image_url']
-        card_entry['number_in_set'] = truncate_number_in_set(row['number_in_set'])
-        
-        truncated_label = truncate_label(row['label'])
-        if truncated_label not in card_entry['labels']:
-            card_entry['labels'].append(truncated_label)
-        
-        if card_entry['box_name'] is None:
-            card_entry['box_name'] = row['box_name']
-            if previous_box_name != row['box_name']:
-                color_class = "dark-green" if color_class == "light-blue" else "light-blue"
-                previous_box_name = row['box_name']
-            card_entry['box_class'] = color_class
-
-        # Calculate the new average price
+    db_path = get_db_path()
+    page = page_cache.get('cards2', db_path, lambda: build_cards_page(db_path))
+    return conditional_response(make_response(page.html), page.etag, page.last_modified)
+
+@app.route('/api/cards')
+def api_cards():
+    db_path = get_db_path()
+    with db_pool.checkout(db_path) as conn:
         try:
-            card_entry['new_avg_price'] = round(float(row['price_avg']) * 1.679, 2)
-        except (TypeError, ValueError):
-            card_entry['new_avg_price'] = None
+            result = get_catalog_page(conn, request.args)
+        except ValueError as e:
+            return jsonify(error=str(e)), 400
 
-    conn.close()
-    
-    card_data_str_keys = {f"{key[0]}|||{key[1]}|||{key[2]}": value for key, value in card_data.items()}
-    return render_template('cards_pullbox.html', card_data=card_data_str_keys)
+    # A page depends only on the snapshot and the query string
+    etag = hashlib.sha1(f"{snapshot_cache_key(db_path)}?{request.query_string.decode('utf-8')}".encode('utf-8')).hexdigest()
+    return conditional_response(jsonify(result), etag, os.path.getmtime(db_path))
 
 @app.route('/hello-world')
 def hello_world():
     return 'Hello World!'
 
-def process_name(name):
-    processed_name = re.sub(r'\s*\([^)]*\)', '', name)
-    return processed_name.strip()
-
-def process_set_name(set_name):
-    processed_name = re.sub(r'.*[-:]\s*', '', set_name)
-    processed_name = re.sub(r'\s*\([^)]*\)', '', processed_name)
-    return processed_name.strip()
-
-def process_card_number(number_in_set):
-    processed_number = number_in_set.split('/')[0].lstrip('0')
-    return processed_number.strip()
-
-def process_label(label):
-    if "1st+Edition+Holofoil" in label:
-        return "1st Edition"
-    elif "Holofoil" in label and "1st" not in label:
-        return "Holofoil"
-    elif "1st" in label:
-        return "1st Edition"
-    return ""
-
 def transform_card_info(name, label, set_name, number_in_set):
     processed_name = process_name(name)
     processed_set_name = process_set_name(set_name)
@@ -121,7 +149,7 @@ def transform_card_info(name, label, set_name, number_in_set):
 @app.route('/flag_card', methods=['POST'])
 def flag_card():
     card_name = request.form['card_name']
-    threading.Thread(target=notify_discord, args=(card_name,)).start()
+    notify_discord(card_name)
     return jsonify({'status': 'success', 'message': 'Card flagged'})
 
 def notify_discord(card_name):
@@ -130,14 +158,21 @@ def notify_discord(card_name):
         print("Error: The DISCORD_WEBHOOK_URL is not set in the .env file.")
         return
 
-    message = f"Card {card_name} has been flagged!"
-    data = {"content": message}
+    # Queued; flags clicked in quick succession go out as one message
+    get_notifier().notify(webhook_url, f"Card {card_name} has been flagged!")
 
-    try:
-        response = requests.post(webhook_url, json=data)
-        response.raise_for_status()
-    except requests.exceptions.RequestException as e:
-        print(f"Failed to send message to Discord: {e}")
+CARD_DETAILS_SQL = '''
+SELECT name, label, "set", number_in_set, image_url, price, shipping, stock, url
+FROM card_data
+WHERE name = ? AND box_name = ? AND label = ?
+'''
+
+SEARCH_RESULT_SQL = '''
+SELECT "set", number_in_set, image_url, price_avg
+FROM card_data
+WHERE name = ? AND box_name = ? AND label = ?
+LIMIT 1
+'''
 
 @app.route('/card-details')
 def card_details():
@@ -147,15 +182,8 @@ def card_details():
     except ValueError:
         return jsonify(error="Invalid card name, box, and label format."), 400
 
-    conn = get_db_connection()
-    cur = conn.cursor()
-    cur.execute('''
-        SELECT name, label, "set", number_in_set, image_url, price, shipping, stock, url
-        FROM card_data
-        WHERE name = ? AND box_name = ? AND label = ?
-    ''', (card_name, card_box, card_label))
-    rows = cur.fetchall()
-    conn.close()
+    with db_pool.checkout() as conn:
+        rows = conn.execute(CARD_DETAILS_SQL, (card_name, card_box, card_label)).fetchall()
 
     if not rows:
         return jsonify(error="Card not found"), 404
@@ -174,6 +202,100 @@ def card_details():
 
     return jsonify(card_data=card_data)
 
+def search_snapshot(conn, db_path, query, limit):
+    if has_search_index(conn):
+        return search_cards(conn, query, limit)
+    # Snapshots published before search existed get an in-memory index, built once per snapshot
+    key = snapshot_cache_key(db_path)
+    with memory_search_lock:
+        if memory_search_index.get('key') != key:
+            memory_search_index.update(key=key, connection=build_memory_index(conn))
+        return search_cards(memory_search_index['connection'], query, limit)
+
+@app.route('/search')
+def search():
+    query = request.args.get('q', '')
+    try:
+        limit = max(1, min(int(request.args.get('limit', 20)), 100))
+    except ValueError:
+        return jsonify(error="limit must be an integer."), 400
+
+    db_path = get_db_path()
+    with db_pool.checkout(db_path) as conn:
+        keys = search_snapshot(conn, db_path, query, limit)
+        results = []
+        for name, box_name, label in keys:
+            row = conn.execute(SEARCH_RESULT_SQL, (name, box_name, label)).fetchone()
+            results.append({
+                'key': f"{name}|||{box_name}|||{label}",
+                'name': name,
+                'box_name': box_name,
+                'label': label,
+                'set': row['set'] if row else None,
+                'number_in_set': row['number_in_set'] if row else None,
+                'image_url': row['image_url'] if row else None,
+                'price_avg': row['price_avg'] if row else None
+            })
+
+    return jsonify(results=results)
+
+def get_box_valuation(db_path):
+    # Valued once per box catalog, then answered from memory; a newly published
+    # snapshot only applies its price changes to the boxes they touch
+    catalog_path = get_catalog_path(get_databases_path())
+    key = (snapshot_cache_key(db_path), snapshot_cache_key(catalog_path))
+    with box_valuation_lock:
+        current = box_valuations.get('key')
+        if current != key:
+            previous_path = box_valuations.get('db_path')
+            if current is not None and current[1] == key[1] and previous_path != db_path and \
+                    update_valuation(box_valuations['valuation'], db_path, previous_path):
+                box_valuations.update(key=key, db_path=db_path)
+            else:
+                box_valuations.update(key=key, db_path=db_path, valuation=load_box_valuation(catalog_path, db_path))
+        return box_valuations['valuation']
+
+@app.route('/api/box-value')
+def api_box_value():
+    if not os.path.exists(get_catalog_path(get_databases_path())):
+        return jsonify(error="No box catalog yet, run box_catalog.py or card_keys.py --catalog first."), 503
+    db_path = get_db_path()
+    valuation = get_box_valuation(db_path)
+    box_names = request.args.getlist('box') or None
+    return jsonify(boxes=valuation.summaries(box_names))
+
+@app.route('/price-history')
+def price_history():
+    card_name_label = request.args.get('name', '')
+    try:
+        card_name, card_box, card_label = card_name_label.split('|||')
+    except ValueError:
+        return jsonify(error="Invalid card name, box, and label format."), 400
+
+    try:
+        days = int(request.args.get('days', 90))
+    except ValueError:
+        return jsonify(error="days must be an integer."), 400
+    period = request.args.get('period', 'day')
+    if period not in ('day', 'week', 'month'):
+        return jsonify(error="period must be day, week or month."), 400
+
+    conn = connect_history_read_only(get_history_path(get_databases_path()))
+    if conn is None:
+        # No crawl has recorded any history yet
+        return jsonify(points=[], rollups=[])
+    try:
+        points = get_price_trend(conn, card_name, card_label, card_box, days=days)
+        rollups = get_price_rollups(conn, card_name, card_label, card_box, period=period, days=days)
+    finally:
+        conn.close()
+
+    return jsonify(
+        points=[{'scraped_at': scraped_at, 'price_avg': price_avg, 'min_price': min_price, 'max_price': max_price, 'listings': listings}
+                for scraped_at, price_avg, min_price, max_price, listings in points],
+        rollups=[{'period_start': period_start, 'min': min_price, 'avg': avg_price, 'max': max_price, 'samples': samples}
+                 for period_start, min_price, avg_price, max_price, samples in rollups]
+    )
 
 @app.route('/submit-ticket', methods=['POST'])
 def submit_ticket():
@@ -188,25 +310,19 @@ def submit_ticket():
     if not webhook_url:
         return jsonify({'status': 'error', 'message': 'Webhook URL not configured'}), 500
 
-    payload = {
-        "username": "Ticket Bot",
-        "embeds": [{
-            "title": "New Ticket Submission",
-            "fields": [
-                {"name": "Username", "value": username},
-                {"name": "Issue", "value": issue}
-            ],
-            "timestamp": datetime.utcnow().isoformat()
-        }]
+    embed = {
+        "title": "New Ticket Submission",
+        "fields": [
+            {"name": "Username", "value": username},
+            {"name": "Issue", "value": issue}
+        ],
+        "timestamp": datetime.utcnow().isoformat()
     }
 
-    try:
-        response = requests.post(webhook_url, json=payload)
-        response.raise_for_status()
+    # Success means the ticket is in the outbox; delivery is retried until Discord accepts it
+    if get_notifier().notify(webhook_url, embed=embed, username="Ticket Bot"):
         return jsonify({'status': 'success'})
-    except requests.exceptions.RequestException as e:
-        print(f"Error submitting ticket: {e}")
-        return jsonify({'status': 'error', 'message': 'Failed to submit ticket'}), 500
+    return jsonify({'status': 'error', 'message': 'Failed to submit ticket'}), 500
 
 print("Running the Flask app. Access it at: http://192.168.1.111:5000/cards2")
 print("/d/ngrok.exe start my_custom_domain")
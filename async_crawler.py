@@ -0,0 +1,131 @@
+import asyncio
+import random
+import time
+from urllib.parse import urlparse
+
+class TokenBucket:
+    """Allows `rate` acquisitions per second on average, with bursts of up to `capacity`."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self.lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self.lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+def backoff_delay(attempt, base_delay, max_delay):
+    # Full jitter: uniform between 0 and the exponential cap
+    return random.uniform(0, min(max_delay, base_delay * 2 ** attempt))
+
+class AsyncCrawler:
+    """Crawls (url, label, box_name) triples from a shared queue.
+
+    `scrape(fetcher, url, label, box_name)` is a blocking call that runs in a
+    worker thread and returns the rows for one card; every worker owns one
+    fetcher from `fetcher_factory`. Rows are handed to `on_result(rows)` on the
+    event loop as soon as each card completes.
+    """
+
+    def __init__(self, scrape, fetcher_factory, fetcher_closer, on_result,
+                 concurrency=4, per_host_concurrency=4, requests_per_second=2.0,
+                 max_retries=3, base_delay=1.0, max_delay=30.0):
+        self.scrape = scrape
+        self.fetcher_factory = fetcher_factory
+        self.fetcher_closer = fetcher_closer
+        self.on_result = on_result
+        self.concurrency = concurrency
+        self.per_host_concurrency = per_host_concurrency
+        self.requests_per_second = requests_per_second
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'completed': 0, 'failed': 0, 'retried': 0, 'rows': 0}
+
+    def _host_limits(self, host):
+        if host not in self.host_semaphores:
+            self.host_semaphores[host] = asyncio.Semaphore(self.per_host_concurrency)
+            self.host_buckets[host] = TokenBucket(self.requests_per_second)
+        return self.host_semaphores[host], self.host_buckets[host]
+
+    async def _requeue(self, item, delay):
+        await asyncio.sleep(delay)
+        await self.queue.put(item)
+        self.queue.task_done()
+
+    async def _worker(self):
+        try:
+            fetcher = await asyncio.to_thread(self.fetcher_factory)
+        except Exception as e:
+            print(f"Failed to start crawl worker: {e}")
+            return
+        try:
+            while True:
+                url, label, box_name, attempt = await self.queue.get()
+                semaphore, bucket = self._host_limits(urlparse(url).netloc)
+                try:
+                    async with semaphore:
+                        await bucket.acquire()
+                        rows = await asyncio.to_thread(self.scrape, fetcher, url, label, box_name)
+                except Exception as e:
+                    if attempt < self.max_retries:
+                        delay = backoff_delay(attempt, self.base_delay, self.max_delay)
+                        print(f"Retrying URL {url} in {delay:.1f}s after error: {e}")
+                        self.stats['retried'] += 1
+                        task = asyncio.create_task(self._requeue((url, label, box_name, attempt + 1), delay))
+                        self.retry_tasks.add(task)
+                        task.add_done_callback(self.retry_tasks.discard)
+                        continue
+                    print(f"Giving up on URL {url} and label {label}: {e}")
+                    self.stats['failed'] += 1
+                    self.queue.task_done()
+                    continue
+
+                try:
+                    self.on_result(rows)
+                    self.stats['completed'] += 1
+                    self.stats['rows'] += len(rows)
+                except Exception as e:
+                    print(f"Failed to store results for URL {url}: {e}")
+                    self.stats['failed'] += 1
+                finally:
+                    self.queue.task_done()
+        finally:
+            await asyncio.to_thread(self.fetcher_closer, fetcher)
+
+    async def run(self, url_label_boxname_pairs):
+        self.queue = asyncio.Queue()
+        self.host_semaphores = {}
+        self.host_buckets = {}
+        self.retry_tasks = set()
+        for url, label, box_name in url_label_boxname_pairs:
+            self.queue.put_nowait((url, label, box_name, 0))
+
+        workers = [asyncio.create_task(self._worker()) for _ in range(self.concurrency)]
+        join_task = asyncio.create_task(self.queue.join())
+        workers_done = asyncio.gather(*workers, return_exceptions=True)
+        try:
+            await asyncio.wait([join_task, workers_done], return_when=asyncio.FIRST_COMPLETED)
+            if not join_task.done():
+                print(f"All crawl workers stopped with {self.queue.qsize()} cards left in the queue")
+        finally:
+            join_task.cancel()
+            for task in self.retry_tasks:
+                task.cancel()
+            for worker in workers:
+                worker.cancel()
+            await asyncio.gather(*workers, return_exceptions=True)
+        return self.stats
+
+    def crawl(self, url_label_boxname_pairs):
+        return asyncio.run(self.run(url_label_boxname_pairs))
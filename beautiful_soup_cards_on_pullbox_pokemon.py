@@ -1,6 +1,5 @@
-import requests
-from bs4 import BeautifulSoup
 import csv
+from box_catalog import scrape_boxes
 
 # List of box names
 box_names = [
@@ -96,50 +95,19 @@ box_names = [
     "I Can Haz Battle, Meow?"
 ]
 
-# Function to convert box name to URL
-def box_name_to_url(box_name):
-    cleaned_name = box_name.lower().replace(" ", "-").replace(",", "").replace("!", "").replace("'", "").replace("?", "").replace("+", "plus")
-    return f"https://www.pullbox.gg/box/{cleaned_name}"
-
-# Function to scrape card details from a given URL
-def scrape_card_details(url, box_name):
-    response = requests.get(url)
-    card_data = []
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "html.parser")
-        card_containers = soup.find_all("div", class_="whats-in-the-box_card__iD26m")
-        
-        for container in card_containers:
-            card_name_tag = container.find("p", class_="text-center w-full text-xs font-normal line-clamp-2")
-            card_name = card_name_tag.text.strip() if card_name_tag else "Unknown Card"
-
-            details = container.find_all("div", class_="flex flex-col items-center justify-center text-center")
-            card_details = {"Condition": "", "Printing": "", "Set": ""}
-            for detail in details:
-                header = detail.find("span", class_="text-xs").text.strip()
-                value = detail.find("span", class_="font-normal text-xs").text.strip()
-                if header in card_details:
-                    card_details[header] = value
-            
-            card_data.append([card_name, card_details["Condition"], card_details["Printing"], card_details["Set"], box_name])
-
-    return card_data
-
 # CSV file to save the data
 csv_file = "card_details3.csv"
 
+# All boxes are fetched concurrently; each page is parsed once for details and coin values
+results, errors = scrape_boxes(box_names)
+
 # Write to CSV
 with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
     writer = csv.writer(file)
     writer.writerow(["Card Name", "Condition", "Printing", "Set", "Box Name"])
-    
-    # Iterate through all box names, convert to URL, and scrape card details
-    for box_name in box_names:
-        url = box_name_to_url(box_name)
-        card_details = scrape_card_details(url, box_name)
-        
-        # Write each card detail to the CSV file
-        for card in card_details:
-            writer.writerow(card)
+
+    for rows in results.values():
+        for card_name, condition, printing, card_set, coin_value, box_name in rows:
+            writer.writerow([card_name, condition, printing, card_set, box_name])
 
 print(f"Card details have been saved to {csv_file}")
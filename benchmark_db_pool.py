@@ -0,0 +1,82 @@
+import contextlib
+import io
+import random
+import sqlite3
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+import app_pullbox
+from db_pool import ReadOnlyConnectionPool
+from snapshots import current_snapshot_path
+
+# Requests per second for /card-details and /api/cards under concurrent load,
+# with pooled read-only connections versus a fresh connection per request.
+# Usage: python benchmark_db_pool.py [threads] [requests] [databases_dir]
+
+class PerRequestConnections:
+    # The pre-pool get_db_connection: resolve the path, connect, close after the request
+    def __init__(self, base_path):
+        self.base_path = base_path
+
+    def current_path(self):
+        db_path = current_snapshot_path(self.base_path)
+        if db_path is None:
+            raise FileNotFoundError(f"No published database found in {self.base_path}")
+        return db_path
+
+    @contextmanager
+    def checkout(self, db_path=None):
+        db_path = current_snapshot_path(self.base_path)
+        print(f"Connecting to database at: {db_path}")
+        conn = sqlite3.connect(db_path)
+        conn.row_factory = sqlite3.Row
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+def build_urls(num_requests, seed=0):
+    rng = random.Random(seed)
+    with app_pullbox.db_pool.checkout() as conn:
+        keys = [tuple(row) for row in conn.execute('SELECT DISTINCT name, box_name, label FROM card_data')]
+        boxes = [row[0] for row in conn.execute('SELECT DISTINCT box_name FROM card_data')]
+    client = app_pullbox.app.test_client()
+    urls = []
+    for _ in range(num_requests):
+        if rng.random() < 0.5:
+            name, box_name, label = rng.choice(keys)
+            urls.append(('/card-details', {'name': f"{name}|||{box_name}|||{label}"}))
+        else:
+            urls.append(('/api/cards', {'box': rng.choice(boxes), 'limit': 20}))
+    return client, urls
+
+def run(client, urls, threads):
+    def fetch(url):
+        path, params = url
+        response = client.get(path, query_string=params)
+        if response.status_code != 200:
+            raise RuntimeError(f"{path} returned {response.status_code}")
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        list(executor.map(fetch, urls))
+    return len(urls) / (time.perf_counter() - start)
+
+if __name__ == "__main__":
+    threads = int(sys.argv[1]) if len(sys.argv) > 1 else 8
+    num_requests = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+    if len(sys.argv) > 3:
+        app_pullbox.db_pool = ReadOnlyConnectionPool(sys.argv[3])
+    client, urls = build_urls(num_requests)
+    pooled = app_pullbox.db_pool
+
+    with contextlib.redirect_stdout(io.StringIO()):
+        app_pullbox.db_pool = PerRequestConnections(pooled.base_path)
+        per_request = run(client, urls, threads)
+        app_pullbox.db_pool = pooled
+        run(client, urls[:threads], threads)  # open the pool's connections
+        pooled_rate = run(client, urls, threads)
+
+    print(f"{num_requests} requests on {threads} threads: per-request connections {per_request:.0f} req/s, "
+          f"pooled read-only {pooled_rate:.0f} req/s ({pooled_rate / per_request:.2f}x)")
@@ -0,0 +1,108 @@
+import os
+import sys
+import tempfile
+import time
+from selenium.webdriver.common.by import By
+from selenium.common.exceptions import NoSuchElementException
+from webdriver_pool import create_webdriver
+from algorythm_scrape import get_listings_info
+
+# Counts WebDriver commands (HTTP round-trips to chromedriver) needed to read the
+# listing table, per-element lookups vs one execute_script call.
+# Usage: python benchmark_listing_roundtrips.py [listings_per_page ...]
+
+def build_listings_page(num_listings):
+    rows = []
+    for i in range(num_listings):
+        shipping = f'<span class="shipping-messages__price">+ ${i % 5}.99 Shipping</span>' if i % 3 else ''
+        direct = '<a title="Direct Seller"></a>' if i % 4 == 0 else ''
+        rows.append(f'''
+        <div class="listing-item">
+          <div class="listing-item__listing-data__seller">
+            <span class="seller-info__name">Seller {i}</span>
+            <span class="seller-info__sales">({i * 37} Sales)</span>
+            {direct}
+          </div>
+          <div class="listing-item__listing-data__info">
+            <div class="listing-item__listing-data__info__price">${i + 1},{i % 10}00.{i % 100:02d}</div>
+            {shipping}
+          </div>
+          <span class="add-to-cart__available">of {i % 7 + 1}</span>
+        </div>''')
+    return f'''<html><body>
+      <h1 class="product-details__name">Benchmark Card</h1>
+      <div class="spotlight"><span class="add-to-cart__available">1 of 4</span></div>
+      {''.join(rows)}
+    </body></html>'''
+
+def get_listings_info_per_element(driver):
+    # The pre-batching implementation: one WebDriver call per .text / find_element
+    listings_info = []
+    prices = driver.find_elements(By.CSS_SELECTOR, '.listing-item__listing-data__info__price')
+    stocks = driver.find_elements(By.CSS_SELECTOR, '.add-to-cart__available')[1:]
+    sellers = driver.find_elements(By.CSS_SELECTOR, '.listing-item__listing-data__seller .seller-info__name')
+    sales = driver.find_elements(By.CSS_SELECTOR, '.listing-item__listing-data__seller .seller-info__sales')
+    seller_divs = driver.find_elements(By.CSS_SELECTOR, '.listing-item__listing-data__seller')
+
+    for price, stock, seller, sale, seller_div in zip(prices, stocks, sellers, sales, seller_divs):
+        shipping_cost = "0"
+        try:
+            shipping_cost_element = price.find_element(By.XPATH, "..").find_element(By.CSS_SELECTOR, '.shipping-messages__price')
+            shipping_cost = shipping_cost_element.text.strip('+ ').strip(' Shipping').replace('$', '').strip()
+        except NoSuchElementException:
+            pass
+
+        direct_seller = "no"
+        try:
+            seller_div.find_element(By.CSS_SELECTOR, 'a[title="Direct Seller"]')
+            direct_seller = "yes"
+        except NoSuchElementException:
+            pass
+
+        listings_info.append({
+            'Price': price.text.replace('$', '').replace(',', '').strip(),
+            'Stock': stock.text.strip(' of'),
+            'Shipping Cost': shipping_cost,
+            'Seller': seller.text,
+            'Sales': sale.text.strip(' ()'),
+            'Direct': direct_seller
+        })
+    return listings_info
+
+def count_round_trips(driver, func):
+    calls = []
+    original_execute = driver.execute
+
+    def counting_execute(command, params=None):
+        calls.append(command)
+        return original_execute(command, params)
+
+    driver.execute = counting_execute
+    try:
+        start = time.perf_counter()
+        result = func(driver)
+        elapsed = time.perf_counter() - start
+    finally:
+        driver.execute = original_execute
+    return result, len(calls), elapsed
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [10, 50, 100]
+    driver = create_webdriver()
+    try:
+        for num_listings in sizes:
+            with tempfile.NamedTemporaryFile('w', suffix='.html', delete=False, encoding='utf-8') as page:
+                page.write(build_listings_page(num_listings))
+            try:
+                driver.get(f"file://{page.name}")
+                before, before_calls, before_time = count_round_trips(driver, get_listings_info_per_element)
+                after, after_calls, after_time = count_round_trips(driver, get_listings_info)
+            finally:
+                os.remove(page.name)
+
+            if before != after:
+                print(f"{num_listings} listings: results differ between implementations!")
+            print(f"{num_listings} listings: per-element {before_calls} round-trips in {before_time * 1000:.0f} ms, "
+                  f"batched {after_calls} round-trips in {after_time * 1000:.0f} ms")
+    finally:
+        driver.quit()
@@ -0,0 +1,89 @@
+import random
+import statistics
+import sys
+import time
+from pricing import apply_box_price
+
+# Times the box-price step against the original per-card statistics loops and
+# checks both produce the same price_avg for every row.
+# Usage: python benchmark_pricing.py [num_listings ...]
+
+LEGACY_LIMIT = 20000  # the quadratic version takes minutes beyond this
+
+def apply_box_price_legacy(listings_data, spotlight_infos, card_prices):
+    # The pre-vectorization block from get_listing_info, unchanged
+    for card_name, spotlight_data in spotlight_infos.items():
+        spotlight_price = spotlight_data[1]
+        spotlight_stock = spotlight_data[2]
+        spotlight_direct = spotlight_data[4]
+
+        if spotlight_direct == "yes" and spotlight_stock != "NA" and int(spotlight_stock) >= 25:
+            first_10_prices = [price for price in card_prices[card_name][:10]]
+            if len(first_10_prices) > 1:
+                avg_first_10 = statistics.mean(first_10_prices)
+                std_dev_first_10 = statistics.stdev(first_10_prices)
+
+                if abs(float(spotlight_price) - avg_first_10) <= 2 * std_dev_first_10:
+                    box_price = float(spotlight_price)
+                else:
+                    box_price = statistics.mean(card_prices[card_name])
+            else:
+                box_price = statistics.mean(first_10_prices) if first_10_prices else "NA"
+        else:
+            if len(card_prices[card_name]) > 1:
+                filtered_prices = [price for price in card_prices[card_name] if abs(price - statistics.mean(card_prices[card_name])) <= 2 * statistics.stdev(card_prices[card_name])]
+                filtered_prices = [price for price in filtered_prices if any(listing[4] == card_name and int(listing[5].replace(' Sales', '')) >= 500 for listing in listings_data)]
+                box_price = statistics.mean(filtered_prices) if filtered_prices else statistics.mean(card_prices[card_name])
+            else:
+                box_price = statistics.mean(card_prices[card_name]) if card_prices[card_name] else "NA"
+
+        price_avg = f"{box_price:.2f}" if box_price != "NA" else "NA"
+
+        for i in range(len(listings_data)):
+            if listings_data[i][0] == card_name:
+                listings_data[i] = listings_data[i][:-1] + (price_avg,)
+
+    return listings_data
+
+def build_listings(num_listings, seed=0):
+    rng = random.Random(seed)
+    listings_data = []
+    spotlight_infos = {}
+    card_prices = {}
+    card_index = 0
+    while len(listings_data) < num_listings:
+        card_name = f"Card {card_index}"
+        card_index += 1
+        base_price = rng.uniform(1, 500)
+        count = rng.choice([0, 1, 2, 5, 10, 25, 50])
+        prices = [round(base_price * rng.uniform(0.7, 1.6), 2) for _ in range(count)]
+        card_prices[card_name] = prices
+        for price in prices or ["NA"]:
+            listings_data.append((card_name, "Holofoil", "Set", "1/100", "https://img", "Box", "https://url",
+                                  f"${price:,.2f}" if price != "NA" else "NA", "NA", "1", "NA"))
+        direct = rng.random() < 0.3
+        spotlight_price = f"{base_price * rng.uniform(0.9, 1.3):.2f}" if prices else "NA"
+        spotlight_stock = str(rng.choice([1, 10, 30, 100])) if prices else "NA"
+        spotlight_infos[card_name] = (card_name, spotlight_price, spotlight_stock, "NA", "yes" if direct else "no")
+    return listings_data, spotlight_infos, card_prices
+
+def timed(func, listings_data, spotlight_infos, card_prices):
+    rows = list(listings_data)
+    start = time.perf_counter()
+    result = func(rows, spotlight_infos, card_prices)
+    return result, time.perf_counter() - start
+
+if __name__ == "__main__":
+    sizes = [int(arg) for arg in sys.argv[1:]] or [1000, 10000, 100000]
+    for num_listings in sizes:
+        listings_data, spotlight_infos, card_prices = build_listings(num_listings)
+        vectorized, vectorized_time = timed(apply_box_price, listings_data, spotlight_infos, card_prices)
+        line = f"{len(listings_data)} listings, {len(spotlight_infos)} cards: vectorized {vectorized_time * 1000:.1f} ms"
+
+        if len(listings_data) <= LEGACY_LIMIT:
+            legacy, legacy_time = timed(apply_box_price_legacy, listings_data, spotlight_infos, card_prices)
+            mismatches = sum(1 for a, b in zip(legacy, vectorized) if a[-1] != b[-1])
+            line += f", legacy {legacy_time * 1000:.1f} ms, {mismatches} price_avg mismatches"
+        else:
+            line += ", legacy skipped"
+        print(line)
@@ -0,0 +1,205 @@
+import csv
+import os
+import sys
+import time
+import requests
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from bs4 import BeautifulSoup
+from card_keys import get_catalog_path, open_box_catalog, store_box_cards
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Refreshes the pullbox.gg box catalog: every box page is fetched once, in
+# parallel over one pooled session, and both the card details (condition,
+# printing, set) and the coin values are read from that single parse.
+PULLBOX_BASE_URL = os.environ.get('PULLBOX_BASE_URL', 'https://www.pullbox.gg')
+
+CARD_CONTAINER_CLASS = "whats-in-the-box_card__iD26m"
+CARD_NAME_CLASS = "text-center w-full text-xs font-normal line-clamp-2"
+CARD_DETAIL_CLASS = "flex flex-col items-center justify-center text-center"
+COIN_CONTAINER_CLASS = "flex items-center p-2 justify-between"
+COIN_VALUE_CLASS = "text-xs flex justify-center items-center gap-1"
+
+CSV_HEADER = ["Card Name", "Condition", "Printing", "Set", "Coin Value", "Box Name"]
+
+BOX_NAMES = [
+    "1st Edition Base Set Rares!",
+    "Maximum VMAX",
+    "I Choose You, Charizard!",
+    "1st Edition Fossil Rares!",
+    "Elite Trainers Only!",
+    "1st Edition Jungle Rares!",
+    "Tag Team Champions!",
+    "The Legendary Beast Hunt",
+    "Hidden Fates: Shiny Vault",
+    "Master Ball: Psychic Pokemon!",
+    "Master Ball: Trainers!",
+    "My (Secret) Pokemon!",
+    "Tag Team Secrets!",
+    "I Choose You, Mew & Mewtwo!",
+    "Master Ball: Dark Pokemon!",
+    "Welcome to the Gallery!",
+    "Legendary Collections!",
+    "Legendary Pokemon!",
+    "Master Ball: Colorless Pokemon!",
+    "Sword and Shield Black Star Promo!",
+    "Tag Team Debut!",
+    "Master Ball: Water Pokemon!",
+    "Master Ball: Fighting Pokemon!",
+    "Empowered Trainers!",
+    "Collecting Elite Trainer Boxes!",
+    "Double Elite Trouble!",
+    "Officer Jenny's Secret Stash!",
+    "I Choose You, Eevee!",
+    "Nurse Joy's Secret Stash!",
+    "Master Ball: Lightning Pokemon!",
+    "The Earth Badge!",
+    "Top Shelf 151",
+    "Top Shelf Paradox Rift",
+    "My (Secret) Pokemon 2!",
+    "Welcome to Galar!",
+    "Master Ball: Fire Pokemon!",
+    "The Volcano Badge!",
+    "I Choose You, Dragonite!",
+    "The Marsh Badge!",
+    "The Rainbow Badge!",
+    "Master Ball: Fairy Pokemon!",
+    "Master Ball: Dragon Pokemon!",
+    "The Soul Badge!",
+    "The Thunder Badge!",
+    "The Cascade Badge!",
+    "Crown Zenith: Galarian Gallery",
+    "Master Ball: Grass Pokemon!",
+    "Welcome to Paldea!",
+    "Master Ball: Items!",
+    "The Boulder Badge!",
+    "Gotta Catch 'Em All!",
+    "I Choose You, Gengar!",
+    "Master Ball: Metal Pokemon!",
+    "I Choose You, Pikachu!",
+    "Paldean Fates: Shiny Rares!",
+    "Pokeball GO! Fire Types+!",
+    "Master Ball: 1st Edition Base Set!",
+    "Eggcelent Pokemon!",
+    "Team Rocket Attacks!",
+    "Pokeball GO! Water Types+!",
+    "Lost Origin: Trainer Gallery!",
+    "Artist Spotlight: Kawayoo!",
+    "Master Ball: Stadiums!",
+    "Astral Radiance Trainer Gallery!",
+    "Brilliant Stars Trainer Gallery!",
+    "Pokeball GO! Normal Types+!",
+    "Silver Tempest Trainer Gallery!",
+    "Artist Spotlight: Tomokazu Komiya",
+    "Pokeball GO! Fire Types!",
+    "Generations: Radiant Collection!",
+    "I Choose You, Tapu!",
+    "Pokeball GO! Fighting Types!",
+    "Pokeball GO! Fighting Types+!",
+    "Celebrations: Classic Collection!",
+    "Master Ball: Tools!",
+    "Pokeball GO! Normal Types!",
+    "Pokeball GO! Flying Types+!",
+    "Pokeball GO! Water Types!",
+    "I Choose You, Snorlax!",
+    "Master Ball: The Gym Leader Challenge!",
+    "Artist Spotlight: Ooyama!",
+    "Master Ball: 1st Edition Fossil Set!",
+    "Master Ball: 1st Edition Jungle Set!",
+    "Artist Spotlight: Gemi",
+    "I Choose You, Danglers!",
+    "Artist Spotlight: Yuka Morii!",
+    "Charizard's Spicy Soup",
+    "Artist Spotlight: Asako Ito!",
+    "Celadon City Soup!",
+    "I Can Haz Battle, Meow?"
+]
+
+def box_name_to_url(box_name, base_url=PULLBOX_BASE_URL):
+    cleaned_name = box_name.lower().replace(" ", "-").replace(",", "").replace("!", "").replace("'", "").replace("?", "").replace("+", "plus")
+    return f"{base_url}/box/{cleaned_name}"
+
+def create_session(pool_size=16, retries=3, backoff_factor=0.5):
+    # Retries connection errors, 429 and 5xx with exponential backoff, honouring Retry-After
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['GET']), respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def parse_box_page(content, box_name):
+    # Returns [card_name, condition, printing, set, coin_value, box_name] rows
+    soup = BeautifulSoup(content, "html.parser")
+    card_containers = soup.find_all("div", class_=CARD_CONTAINER_CLASS)
+    # Coin values line up with the cards in page order
+    coin_tags = soup.find_all("div", class_=COIN_CONTAINER_CLASS)
+
+    cards = []
+    for i, container in enumerate(card_containers):
+        card_name_tag = container.find("p", class_=CARD_NAME_CLASS)
+        card_name = card_name_tag.text.strip() if card_name_tag else "Unknown Card"
+
+        card_details = {"Condition": "", "Printing": "", "Set": ""}
+        for detail in container.find_all("div", class_=CARD_DETAIL_CLASS):
+            header = detail.find("span", class_="text-xs").text.strip()
+            value = detail.find("span", class_="font-normal text-xs").text.strip()
+            if header in card_details:
+                card_details[header] = value
+
+        coin_value = ""
+        if i < len(coin_tags):
+            coin_span = coin_tags[i].find("span", class_=COIN_VALUE_CLASS)
+            if coin_span is not None and coin_span.find("span") is not None:
+                coin_value = coin_span.find("span").text.strip()
+
+        cards.append([card_name, card_details["Condition"], card_details["Printing"], card_details["Set"], coin_value, box_name])
+    return cards
+
+def scrape_box(session, box_name, base_url=PULLBOX_BASE_URL, timeout=15):
+    response = session.get(box_name_to_url(box_name, base_url), timeout=timeout)
+    if response.status_code != 200:
+        raise RuntimeError(f"status code {response.status_code}")
+    try:
+        return parse_box_page(response.content, box_name)
+    except (AttributeError, IndexError, TypeError, ValueError) as e:
+        # Changed markup on one box page; scrape_boxes records it and carries on with the others
+        raise RuntimeError(f"could not parse the box page: {e!r}") from e
+
+def scrape_boxes(box_names=BOX_NAMES, concurrency=16, base_url=PULLBOX_BASE_URL, session=None):
+    # Returns ({box_name: rows}, {box_name: error}); rows keep the order of box_names
+    session = session or create_session(pool_size=concurrency)
+    results = {}
+    errors = {}
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        futures = {executor.submit(scrape_box, session, box_name, base_url): box_name for box_name in box_names}
+        for future in as_completed(futures):
+            box_name = futures[future]
+            try:
+                results[box_name] = future.result()
+            except (requests.exceptions.RequestException, RuntimeError) as e:
+                print(f"Failed to scrape box {box_name}: {e}")
+                errors[box_name] = str(e)
+    return {box_name: results[box_name] for box_name in box_names if box_name in results}, errors
+
+def write_catalog_csv(csv_file, results):
+    with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
+        writer = csv.writer(file)
+        writer.writerow(CSV_HEADER)
+        for rows in results.values():
+            writer.writerows(rows)
+
+if __name__ == "__main__":
+    # Usage: python box_catalog.py [csv_file]
+    csv_file = sys.argv[1] if len(sys.argv) > 1 else "box_catalog.csv"
+    start = time.perf_counter()
+    results, errors = scrape_boxes(concurrency=int(os.environ.get('BOX_SCRAPE_CONCURRENCY', 16)))
+    write_catalog_csv(csv_file, results)
+    catalog = open_box_catalog(get_catalog_path(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'databases')))
+    try:
+        store_box_cards(catalog, results)
+    finally:
+        catalog.close()
+    print(f"Scraped {sum(len(rows) for rows in results.values())} cards from {len(results)} boxes "
+          f"({len(errors)} failed) in {time.perf_counter() - start:.1f}s, saved to {csv_file}")
@@ -0,0 +1,164 @@
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+import numpy as np
+from concurrent.futures import ProcessPoolExecutor
+from box_value import QUANTILES, load_box_valuation
+from card_keys import get_catalog_path, load_box_prices, open_box_catalog
+from page_cache import snapshot_cache_key
+from snapshots import current_snapshot_path
+
+# Monte Carlo box openings. A trial opens a box `openings` times and adds up
+# what was pulled; profit/loss is that total minus what the openings cost, for
+# boxes with a price in the catalog. Pulls are drawn for every box at once:
+# each card gets a key of box number + cumulative pull share within its box,
+# so one searchsorted of (box number + uniform draw) picks a card for any box.
+# Draws are made in batches of BATCH_DRAWS to keep memory flat, boxes can be
+# split across a process pool, and results are cached per snapshot, catalog
+# and parameters in databases/box_simulations.db. Every box draws from its own
+# generator, spawned from the seed, so the worker count and batch size never
+# change the results.
+BATCH_DRAWS = 1_000_000
+# Part of the cache key; bump it when the same parameters would simulate differently
+SIMULATION_VERSION = 2
+
+CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS simulations (
+    cache_key TEXT PRIMARY KEY,
+    results TEXT NOT NULL,
+    created_at INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+def get_simulation_cache_path(base_path):
+    return os.path.join(base_path, 'box_simulations.db')
+
+def pull_keys(weights, offsets):
+    box_count = len(offsets) - 1
+    box_index = np.repeat(np.arange(box_count), np.diff(offsets))
+    totals = np.add.reduceat(weights, offsets[:-1])
+    cumulative = np.cumsum(weights)
+    starts = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+    return box_index + (cumulative - starts[box_index]) / totals[box_index]
+
+def box_generators(seed, box_count):
+    # seed: one seed for all boxes, or a list of per-box seeds (SeedSequence children)
+    seeds = seed if isinstance(seed, (list, tuple)) else np.random.SeedSequence(seed).spawn(box_count)
+    return [np.random.default_rng(box_seed) for box_seed in seeds]
+
+def simulate_totals(values, weights, offsets, trials, openings=1, seed=None):
+    # values/weights hold each box's cards as the slice offsets[box]:offsets[box + 1];
+    # returns the pulled total of every trial, shape (box_count, trials)
+    box_count = len(offsets) - 1
+    keys = pull_keys(weights, offsets)
+    last_card = offsets[1:] - 1
+    rngs = box_generators(seed, box_count)
+    totals = np.empty((box_count, trials))
+    batch = max(1, BATCH_DRAWS // (box_count * openings))
+    for start in range(0, trials, batch):
+        count = min(batch, trials - start)
+        targets = np.arange(box_count)[:, None, None] + np.stack([rng.random((count, openings)) for rng in rngs])
+        picks = np.searchsorted(keys, targets.ravel(), side='right').reshape(targets.shape)
+        # A draw landing on a share rounded to exactly 1.0 belongs to the box's last card
+        picks = np.minimum(picks, last_card[:, None, None])
+        totals[:, start:start + count] = values[picks].sum(axis=2)
+    return totals
+
+def summarize(totals, cost, quantiles=QUANTILES):
+    summary = {
+        'mean': round(float(totals.mean()), 2),
+        'std_dev': round(float(totals.std()), 2),
+        'percentiles': {f"p{round(q * 100)}": round(float(value), 2) for q, value in zip(quantiles, np.quantile(totals, quantiles))},
+    }
+    if cost is None:
+        return summary
+    profit = totals - cost
+    summary.update(
+        cost=round(cost, 2),
+        profit_mean=round(float(profit.mean()), 2),
+        profit_percentiles={f"p{round(q * 100)}": round(float(value), 2) for q, value in zip(quantiles, np.quantile(profit, quantiles))},
+        chance_of_profit=round(float((profit > 0).mean()), 4),
+        worst_loss=round(float(profit.min()), 2),
+        best_profit=round(float(profit.max()), 2),
+    )
+    return summary
+
+def simulate_chunk(box_names, values, weights, offsets, costs, trials, openings, seed):
+    # One process pool task: a contiguous run of boxes, summarized before it's sent back
+    totals = simulate_totals(values, weights, offsets, trials, openings, seed)
+    return {box_name: summarize(totals[box], None if cost is None else cost * openings)
+            for box, (box_name, cost) in enumerate(zip(box_names, costs))}
+
+def simulate_valuation(valuation, box_prices, draws=10_000_000, openings=1, seed=0, workers=1):
+    # draws is the total number of pulls across all boxes
+    box_count = len(valuation.boxes)
+    if not box_count:
+        return {}
+    trials = max(1, draws // (box_count * openings))
+    offsets = valuation.offsets
+    costs = [box_prices.get(box_name) for box_name in valuation.boxes]
+    chunk_count = max(1, min(workers, box_count))
+    bounds = np.linspace(0, box_count, chunk_count + 1).astype(int)
+    box_seeds = np.random.SeedSequence(seed).spawn(box_count)
+    tasks = []
+    for first, last in zip(bounds[:-1], bounds[1:]):
+        cards = slice(offsets[first], offsets[last])
+        tasks.append((valuation.boxes[first:last], valuation.values[cards], valuation.weights[cards],
+                      offsets[first:last + 1] - offsets[first], costs[first:last], trials, openings, box_seeds[first:last]))
+
+    results = {}
+    if chunk_count == 1:
+        results.update(simulate_chunk(*tasks[0]))
+    else:
+        with ProcessPoolExecutor(max_workers=chunk_count) as executor:
+            for chunk in executor.map(simulate_chunk, *zip(*tasks)):
+                results.update(chunk)
+    for box_name in results:
+        results[box_name]['trials'] = trials
+    return results
+
+def simulate_boxes(snapshot_path, catalog_path, cache_path, draws=10_000_000, openings=1, seed=0, workers=1):
+    # Results for a snapshot, catalog and parameters are computed once and then read from the cache
+    key = hashlib.sha1(json.dumps([snapshot_cache_key(snapshot_path), snapshot_cache_key(catalog_path),
+                                   draws, openings, seed, SIMULATION_VERSION]).encode('utf-8')).hexdigest()
+    cache = sqlite3.connect(cache_path)
+    try:
+        cache.executescript(CACHE_SCHEMA)
+        row = cache.execute('SELECT results FROM simulations WHERE cache_key = ?', (key,)).fetchone()
+        if row is not None:
+            return json.loads(row[0])
+
+        catalog = open_box_catalog(catalog_path)
+        try:
+            box_prices = load_box_prices(catalog)
+        finally:
+            catalog.close()
+        results = simulate_valuation(load_box_valuation(catalog_path, snapshot_path), box_prices, draws, openings, seed, workers)
+        with cache:
+            cache.execute('INSERT OR REPLACE INTO simulations (cache_key, results, created_at) VALUES (?, ?, ?)',
+                          (key, json.dumps(results), int(time.time())))
+        return results
+    finally:
+        cache.close()
+
+if __name__ == "__main__":
+    # Usage: python box_simulator.py [draws] [openings] [workers] [snapshot.db]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    draws = int(sys.argv[1]) if len(sys.argv) > 1 else 10_000_000
+    openings = int(sys.argv[2]) if len(sys.argv) > 2 else 1
+    workers = int(sys.argv[3]) if len(sys.argv) > 3 else os.cpu_count() or 1
+    snapshot_path = sys.argv[4] if len(sys.argv) > 4 else current_snapshot_path(base_path)
+    start = time.perf_counter()
+    results = simulate_boxes(snapshot_path, get_catalog_path(base_path), get_simulation_cache_path(base_path),
+                             draws=draws, openings=openings, workers=workers)
+    print(f"Simulated {draws:,} pulls across {len(results)} boxes in {time.perf_counter() - start:.2f}s")
+    for box_name, result in results.items():
+        line = f"{box_name}: mean ${result['mean']:,.2f}, median ${result['percentiles']['p50']:,.2f}"
+        if 'cost' in result:
+            line += (f", cost ${result['cost']:,.2f}, average P/L ${result['profit_mean']:+,.2f}, "
+                     f"{result['chance_of_profit']:.1%} chance of profit")
+        print(line)
@@ -0,0 +1,214 @@
+import os
+import sqlite3
+import sys
+import threading
+import time
+import numpy as np
+from card_keys import get_catalog_path, is_normalized_schema, match_box_cards, open_box_catalog
+from catalog import LEGACY_PRICE_SQL, NORMALIZED_PRICE_SQL
+from price_diff import diff_snapshots
+from snapshots import current_snapshot_path
+
+# Expected value of opening a pullbox box. A pull is one card from the box,
+# uniformly at random unless the catalog gives pull odds, and a pulled card is
+# worth the better of its TCGplayer price and its pullbox coin value (the
+# buyback). Every box is valued at once: cards sit in one array sorted by box,
+# means and variances come from weighted bincounts, and percentiles from one
+# searchsorted over per-box cumulative weights. A single price change only
+# adjusts its boxes' running sums; their percentiles are redone on next read.
+# When a new snapshot is published, update_valuation feeds the price changes
+# price_diff finds through update_price instead of valuing every box again.
+QUANTILES = (0.05, 0.25, 0.5, 0.75, 0.95)
+
+def card_values(prices, coin_values):
+    # NaN where neither is known; those cards count as worth nothing
+    return np.fmax(prices, coin_values)
+
+def weighted_percentiles(values, weights, box_index, box_count, quantiles=QUANTILES):
+    # box_index numbers the boxes 0..box_count - 1; returns (box_count, len(quantiles))
+    order = np.lexsort((values, box_index))
+    values, weights, box_index = values[order], weights[order], box_index[order]
+    totals = np.bincount(box_index, weights=weights, minlength=box_count)
+    cumulative = np.cumsum(weights)
+    starts = np.concatenate(([0.0], np.cumsum(totals)[:-1]))
+    # Cumulative share within each box, offset by the box number so one sorted key covers every box
+    position = box_index + (cumulative - starts[box_index]) / totals[box_index]
+    targets = np.arange(box_count)[:, None] + np.asarray(quantiles)[None, :]
+    found = np.searchsorted(position, targets - 1e-12, side='left')
+    found = np.minimum(found, len(values) - 1)
+    result = values[found]
+    result[totals == 0] = np.nan
+    return result
+
+class BoxValuation:
+    """Per-box expected value, variance and percentiles over one snapshot's prices."""
+
+    def __init__(self, matches, quantiles=QUANTILES):
+        # matches: rows from card_keys.match_box_cards(..., include_unmatched=True), sorted by box
+        self.quantiles = tuple(quantiles)
+        self.lock = threading.Lock()
+        cards = {}
+        for match in matches:
+            key = (match['box_name'], match['card_name'], match['set'], match['printing'], match['condition'])
+            card = cards.setdefault(key, {'coin_value': match['coin_value'], 'odds': match.get('odds'), 'matches': [], 'same_box': []})
+            if match['name'] is not None:
+                card['matches'].append((match['name'], match['label']))
+                card['same_box'].append(match['same_box'])
+
+        self.boxes = list(dict.fromkeys(key[0] for key in cards))
+        positions = {box_name: i for i, box_name in enumerate(self.boxes)}
+        # Each box's cards are one contiguous slice, self.offsets[box]:self.offsets[box + 1]
+        cards = dict(sorted(cards.items(), key=lambda item: positions[item[0][0]]))
+        self.cards = list(cards)
+        self.box_index = np.array([positions[key[0]] for key in self.cards], dtype=np.int64)
+        self.coin_values = np.array([np.nan if card['coin_value'] is None else card['coin_value'] for card in cards.values()], dtype=float)
+        odds = np.array([np.nan if card['odds'] is None else card['odds'] for card in cards.values()], dtype=float)
+        self.weights = np.where(np.isnan(odds), 1.0, odds)
+
+        # A box card priced by several TCGplayer variants takes the mean of the
+        # ones scraped for that box, or of all of them when none were
+        self.market_prices = {}
+        self.card_matches = []
+        self.cards_by_match = {}
+        for position, card in enumerate(cards.values()):
+            preferred = [match for match, same_box in zip(card['matches'], card['same_box']) if same_box]
+            chosen = preferred or card['matches']
+            self.card_matches.append(chosen)
+            for match in chosen:
+                self.cards_by_match.setdefault(match, []).append(position)
+        for match in matches:
+            if match['name'] is not None:
+                self.market_prices[(match['name'], match['label'])] = match['price_avg']
+        self.prices = np.array([self._card_price(position) for position in range(len(self.cards))], dtype=float)
+        self.recompute()
+
+    def _card_price(self, position):
+        prices = [self.market_prices[match] for match in self.card_matches[position] if self.market_prices.get(match) is not None]
+        return sum(prices) / len(prices) if prices else np.nan
+
+    def recompute(self):
+        # Full, vectorized pass over every box
+        box_count = len(self.boxes)
+        self.values = np.nan_to_num(card_values(self.prices, self.coin_values))
+        self.total_weight = np.bincount(self.box_index, weights=self.weights, minlength=box_count)
+        self.sum_value = np.bincount(self.box_index, weights=self.weights * self.values, minlength=box_count)
+        self.sum_square = np.bincount(self.box_index, weights=self.weights * self.values ** 2, minlength=box_count)
+        self.priced = np.bincount(self.box_index, weights=~np.isnan(self.prices), minlength=box_count).astype(np.int64)
+        self.counts = np.bincount(self.box_index, minlength=box_count)
+        self.offsets = np.concatenate(([0], np.cumsum(self.counts)))
+        if len(self.values):
+            self.minimum = np.minimum.reduceat(self.values, self.offsets[:-1])
+            self.maximum = np.maximum.reduceat(self.values, self.offsets[:-1])
+            self.percentiles = weighted_percentiles(self.values, self.weights, self.box_index, box_count, self.quantiles)
+        else:
+            self.minimum = self.maximum = np.empty(0)
+            self.percentiles = np.empty((0, len(self.quantiles)))
+        self.dirty = set()
+
+    def update_price(self, name, label, price_avg):
+        # Applies one TCGplayer price change; returns the names of the boxes it touched
+        with self.lock:
+            positions = self.cards_by_match.get((name, label), [])
+            self.market_prices[(name, label)] = price_avg
+            touched = set()
+            for position in positions:
+                box = self.box_index[position]
+                old_value = self.values[position]
+                was_priced = not np.isnan(self.prices[position])
+                self.prices[position] = self._card_price(position)
+                new_value = np.nan_to_num(card_values(self.prices[position], self.coin_values[position]))
+                weight = self.weights[position]
+                self.values[position] = new_value
+                self.sum_value[box] += weight * (new_value - old_value)
+                self.sum_square[box] += weight * (new_value ** 2 - old_value ** 2)
+                self.priced[box] += int(not np.isnan(self.prices[position])) - int(was_priced)
+                touched.add(box)
+            self.dirty |= touched
+            return [self.boxes[box] for box in sorted(touched)]
+
+    def _refresh_dirty(self):
+        for box in self.dirty:
+            cards = slice(self.offsets[box], self.offsets[box + 1])
+            values = self.values[cards]
+            self.minimum[box] = values.min()
+            self.maximum[box] = values.max()
+            self.percentiles[box] = weighted_percentiles(values, self.weights[cards], np.zeros(len(values), dtype=np.int64), 1, self.quantiles)[0]
+        self.dirty = set()
+
+    def summary(self, box):
+        total = self.total_weight[box]
+        mean = self.sum_value[box] / total
+        # Running sums can drift a hair below zero after many updates
+        variance = max(self.sum_square[box] / total - mean ** 2, 0.0)
+        return {
+            'box_name': self.boxes[box],
+            'cards': int(self.counts[box]),
+            'priced_cards': int(self.priced[box]),
+            'expected_value': round(float(mean), 2),
+            'variance': round(float(variance), 2),
+            'std_dev': round(float(np.sqrt(variance)), 2),
+            'min': round(float(self.minimum[box]), 2),
+            'max': round(float(self.maximum[box]), 2),
+            'percentiles': {f"p{round(q * 100)}": round(float(value), 2) for q, value in zip(self.quantiles, self.percentiles[box])},
+        }
+
+    def summaries(self, box_names=None):
+        with self.lock:
+            self._refresh_dirty()
+            if box_names is None:
+                return [self.summary(box) for box in range(len(self.boxes))]
+            positions = {box_name: i for i, box_name in enumerate(self.boxes)}
+            return [self.summary(positions[box_name]) for box_name in box_names if box_name in positions]
+
+def load_box_valuation(catalog_path, snapshot_path):
+    catalog = open_box_catalog(catalog_path)
+    try:
+        matches = match_box_cards(catalog, snapshot_path, include_unmatched=True)
+    finally:
+        catalog.close()
+    return BoxValuation(matches)
+
+def load_match_prices(snapshot_path, matches):
+    # The price match_box_cards gives a (name, label): the highest across the boxes it was scraped for
+    connection = sqlite3.connect(f"file:{snapshot_path}?mode=ro", uri=True)
+    try:
+        normalized = is_normalized_schema(connection, 'main')
+        sql = f'''
+        SELECT {NORMALIZED_PRICE_SQL if normalized else LEGACY_PRICE_SQL}
+        FROM {'cards' if normalized else 'card_data'}
+        WHERE name = ? AND label = ?
+        '''
+        return {match: connection.execute(sql, match).fetchone()[0] for match in matches}
+    finally:
+        connection.close()
+
+def update_valuation(valuation, snapshot_path, previous_path):
+    # Moves a valuation of previous_path onto snapshot_path through update_price. Returns
+    # False when it must be loaded again instead: cards were added or removed, which
+    # changes matching, or previous_path can't be read (e.g. pruned since)
+    try:
+        # Unrounded, any move at all, so repeated updates stay equal to a fresh load
+        diff = diff_snapshots(snapshot_path, previous_path, min_change=0, min_percent=0, precision=None)
+    except sqlite3.Error as e:
+        print(f"Could not diff {snapshot_path} against {previous_path}, revaluing every box: {e}")
+        return False
+    if diff['added'] or diff['removed']:
+        return False
+    changed = {(row['name'], row['label']) for row in diff['changed']}
+    for (name, label), price_avg in load_match_prices(snapshot_path, changed).items():
+        valuation.update_price(name, label, price_avg)
+    return True
+
+if __name__ == "__main__":
+    # Usage: python box_value.py [snapshot.db] [catalog.db]
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    snapshot_path = sys.argv[1] if len(sys.argv) > 1 else current_snapshot_path(base_path)
+    catalog_path = sys.argv[2] if len(sys.argv) > 2 else get_catalog_path(base_path)
+    start = time.perf_counter()
+    valuation = load_box_valuation(catalog_path, snapshot_path)
+    print(f"Valued {len(valuation.boxes)} boxes ({len(valuation.cards)} cards) in {(time.perf_counter() - start) * 1000:.1f}ms")
+    for box in valuation.summaries():
+        percentiles = ', '.join(f"{name} ${value:,.2f}" for name, value in box['percentiles'].items())
+        print(f"{box['box_name']}: EV ${box['expected_value']:,.2f}, std dev ${box['std_dev']:,.2f} "
+              f"({box['priced_cards']}/{box['cards']} priced), {percentiles}")
@@ -0,0 +1,241 @@
+import csv
+import os
+import sqlite3
+import sys
+import time
+from card_names import canonical_key
+from snapshots import current_snapshot_path, is_published, new_staging_path, publish_snapshot
+
+# Canonical card keys, so pullbox box contents and TCGplayer listings can be
+# joined in SQLite instead of by string munging in Python. Every snapshot gets
+# a card_keys table (one row per name/box/label with its key and average
+# price) and the box catalog database keeps box_cards with the same key
+# columns; both are indexed on the key, so matching a box is an index lookup
+# per card. pullbox.gg doesn't show card numbers, so a box card with no
+# number matches any number. Published snapshots are opened immutable by the
+# web app and are never written to: the crawler keys its staging file before
+# publishing, and older snapshots are keyed through a copy that is published
+# in their place.
+CARD_KEYS_SCHEMA = '''
+DROP TABLE IF EXISTS {schema}.card_keys;
+CREATE TABLE {schema}.card_keys (
+    name TEXT NOT NULL,
+    box_name TEXT NOT NULL,
+    label TEXT NOT NULL,
+    key_name TEXT NOT NULL,
+    key_set TEXT NOT NULL,
+    key_number TEXT NOT NULL,
+    key_printing TEXT NOT NULL,
+    price_avg REAL,
+    PRIMARY KEY (name, box_name, label)
+) WITHOUT ROWID;
+CREATE INDEX {schema}.idx_card_keys_key ON card_keys (key_name, key_set, key_printing, key_number);
+'''
+
+BOX_CARDS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS box_cards (
+    box_name TEXT NOT NULL,
+    card_name TEXT NOT NULL,
+    condition TEXT NOT NULL,
+    printing TEXT NOT NULL,
+    set_name TEXT NOT NULL,
+    coin_value REAL,
+    odds REAL,
+    key_name TEXT NOT NULL,
+    key_set TEXT NOT NULL,
+    key_number TEXT NOT NULL,
+    key_printing TEXT NOT NULL,
+    updated_at INTEGER NOT NULL,
+    PRIMARY KEY (box_name, card_name, set_name, printing, condition)
+) WITHOUT ROWID;
+CREATE INDEX IF NOT EXISTS idx_box_cards_key ON box_cards (key_name, key_set, key_printing, key_number);
+
+CREATE TABLE IF NOT EXISTS box_prices (
+    box_name TEXT PRIMARY KEY,
+    price REAL NOT NULL,
+    updated_at INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+# One row per box card and TCGplayer card it matches. A card scraped for
+# several boxes has one card_keys row per box; they share a price, so they
+# collapse to one match, flagged same_box when the crawler scraped it for that
+# very box. With include_unmatched, box cards with no match come back once
+# with NULL TCGplayer columns.
+MATCH_SQL = '''
+SELECT b.box_name, b.card_name, b.condition, b.printing, b.set_name, b.coin_value, b.odds,
+    k.name, k.label, MAX(k.price_avg), COALESCE(MAX(k.box_name = b.box_name), 0)
+FROM box_cards b
+{join} {keys} k
+    ON k.key_name = b.key_name AND k.key_set = b.key_set AND k.key_printing = b.key_printing
+    AND (b.key_number = '' OR k.key_number = b.key_number)
+{where}
+GROUP BY b.box_name, b.card_name, b.set_name, b.printing, b.condition, k.name, k.label
+ORDER BY b.box_name, b.card_name, k.name, k.label
+'''
+
+def get_catalog_path(base_path):
+    return os.path.join(base_path, 'box_catalog.db')
+
+def is_normalized_schema(connection, schema):
+    row = connection.execute(f"SELECT type FROM {schema}.sqlite_master WHERE name = 'card_data'").fetchone()
+    return row is not None and row[0] == 'view'
+
+def build_card_keys(connection, source='main', schema='main'):
+    # Reads the cards in `source` and writes card_keys into `schema`
+    normalized = is_normalized_schema(connection, source)
+    table = 'cards' if normalized else 'card_data'
+    price_sql = 'MAX(price_avg)' if normalized else "MAX(CASE WHEN price_avg != 'NA' THEN CAST(price_avg AS REAL) END)"
+    cards = connection.execute(f'''
+    SELECT name, box_name, label, MAX("set"), MAX(number_in_set), {price_sql}
+    FROM {source}.{table}
+    WHERE name IS NOT NULL AND box_name IS NOT NULL AND label IS NOT NULL
+    GROUP BY name, box_name, label
+    ''').fetchall()
+    rows = [(name, box_name, label) + canonical_key(name, card_set, number_in_set, label) + (price_avg,)
+            for name, box_name, label, card_set, number_in_set, price_avg in cards]
+    with connection:
+        connection.executescript(CARD_KEYS_SCHEMA.format(schema=schema))
+        connection.executemany(f'''
+        INSERT INTO {schema}.card_keys (name, box_name, label, key_name, key_set, key_number, key_printing, price_avg)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return len(rows)
+
+def has_card_keys(connection, schema='main'):
+    return connection.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'card_keys'").fetchone() is not None
+
+def open_box_catalog(db_path):
+    connection = sqlite3.connect(db_path)
+    connection.executescript(BOX_CARDS_SCHEMA)
+    columns = [row[1] for row in connection.execute('PRAGMA table_info(box_cards)')]
+    if 'odds' not in columns:
+        # Catalogs stored before pull odds were tracked
+        with connection:
+            connection.execute('ALTER TABLE box_cards ADD COLUMN odds REAL')
+    return connection
+
+def parse_number(value):
+    try:
+        return float(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+def store_box_cards(connection, results):
+    # results: {box_name: rows} as scrape_boxes returns them, optionally with pull odds
+    # as a seventh column; each box listed is replaced as a whole
+    now = int(time.time())
+    rows = []
+    for box_rows in results.values():
+        for card_name, condition, printing, card_set, coin_value, box_name, *odds in box_rows:
+            rows.append((box_name, card_name, condition or '', printing or '', card_set or '',
+                         parse_number(coin_value), parse_number(odds[0]) if odds else None)
+                        + canonical_key(card_name, card_set, '', printing) + (now,))
+    with connection:
+        connection.executemany('DELETE FROM box_cards WHERE box_name = ?', [(box_name,) for box_name in results])
+        connection.executemany('''
+        INSERT OR REPLACE INTO box_cards (box_name, card_name, condition, printing, set_name, coin_value, odds,
+            key_name, key_set, key_number, key_printing, updated_at)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+        ''', rows)
+    return len(rows)
+
+def read_catalog_csv(csv_path):
+    # Any CSV with Card Name, Condition, Printing, Set and Box Name columns; Coin Value and Odds are optional
+    results = {}
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            results.setdefault(row['Box Name'], []).append(
+                [row['Card Name'], row['Condition'], row['Printing'], row['Set'], row.get('Coin Value'), row['Box Name'], row.get('Odds')])
+    return results
+
+def store_box_prices(connection, prices):
+    # prices: {box_name: price to open the box once}
+    now = int(time.time())
+    with connection:
+        connection.executemany('INSERT OR REPLACE INTO box_prices (box_name, price, updated_at) VALUES (?, ?, ?)',
+                               [(box_name, price, now) for box_name, price in prices.items()])
+    return len(prices)
+
+def load_box_prices(connection):
+    return dict(connection.execute('SELECT box_name, price FROM box_prices'))
+
+def read_box_prices_csv(csv_path):
+    # Box Name and Price columns
+    prices = {}
+    with open(csv_path, newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            price = parse_number(row['Price'])
+            if price is not None:
+                prices[row['Box Name']] = price
+    return prices
+
+def match_box_cards(catalog_connection, snapshot_path, box_name=None, include_unmatched=False):
+    # Returns dicts for every box card with a TCGplayer match in the snapshot
+    catalog_connection.execute('ATTACH DATABASE ? AS snapshot', (snapshot_path,))
+    try:
+        keys = 'snapshot.card_keys'
+        if not has_card_keys(catalog_connection, 'snapshot'):
+            # Snapshots published before card keys existed are keyed into a temp table
+            build_card_keys(catalog_connection, source='snapshot', schema='temp')
+            keys = 'temp.card_keys'
+        where, params = ('WHERE b.box_name = ?', (box_name,)) if box_name is not None else ('', ())
+        sql = MATCH_SQL.format(join='LEFT JOIN' if include_unmatched else 'JOIN', keys=keys, where=where)
+        rows = catalog_connection.execute(sql, params).fetchall()
+    finally:
+        catalog_connection.execute('DETACH DATABASE snapshot')
+    return [{
+        'box_name': box_name, 'card_name': card_name, 'condition': condition, 'printing': printing,
+        'set': set_name, 'coin_value': coin_value, 'odds': odds, 'name': name, 'label': label, 'price_avg': price_avg,
+        'same_box': bool(same_box),
+    } for box_name, card_name, condition, printing, set_name, coin_value, odds, name, label, price_avg, same_box in rows]
+
+def key_snapshot(base_path, keep=7):
+    # Copies the live snapshot, keys the copy and publishes it like a nightly crawl
+    source_path = current_snapshot_path(base_path)
+    if source_path is None:
+        raise FileNotFoundError(f"No published database found in {base_path}")
+    staging_path = new_staging_path(base_path)
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    staging = sqlite3.connect(staging_path)
+    try:
+        source.backup(staging)
+        print(f"Keyed {build_card_keys(staging)} cards from {source_path}")
+    finally:
+        staging.close()
+        source.close()
+    return publish_snapshot(base_path, staging_path, keep=keep)
+
+if __name__ == "__main__":
+    # Usage: python card_keys.py                         (keys a copy of the live snapshot and publishes it)
+    #        python card_keys.py db_path [db_path ...]   (keys unpublished databases, e.g. staging files, in place)
+    #        python card_keys.py --catalog catalog.csv   (loads a box catalog CSV into databases/box_catalog.db)
+    #        python card_keys.py --prices prices.csv     (loads box prices, Box Name and Price columns)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    if sys.argv[1:2] in (['--catalog'], ['--prices']):
+        if len(sys.argv) < 3:
+            print(f"Usage: python {os.path.basename(__file__)} {sys.argv[1]} file.csv")
+            sys.exit(1)
+        catalog = open_box_catalog(get_catalog_path(base_path))
+        try:
+            if sys.argv[1] == '--catalog':
+                print(f"Stored {store_box_cards(catalog, read_catalog_csv(sys.argv[2]))} box cards from {sys.argv[2]}")
+            else:
+                print(f"Stored prices for {store_box_prices(catalog, read_box_prices_csv(sys.argv[2]))} boxes from {sys.argv[2]}")
+        finally:
+            catalog.close()
+    elif len(sys.argv) == 1:
+        key_snapshot(base_path)
+    else:
+        published = [db_path for db_path in sys.argv[1:] if is_published(base_path, db_path)]
+        if published:
+            print(f"Not writing to published snapshots {', '.join(published)}; run without arguments to key and republish the live one")
+            sys.exit(1)
+        for db_path in sys.argv[1:]:
+            connection = sqlite3.connect(db_path)
+            try:
+                print(f"Keyed {build_card_keys(connection)} cards in {db_path}")
+            finally:
+                connection.close()
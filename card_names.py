@@ -0,0 +1,84 @@
+import re
+import unicodedata
+from functools import lru_cache
+from urllib.parse import unquote_plus
+
+# Cleans up TCGplayer names for display, eBay queries and search. The patterns
+# are compiled once and results memoized: the same few thousand names, sets
+# and labels come through on every page view and every crawl.
+
+PARENTHESES_PATTERN = re.compile(r'\s*\([^)]*\)')
+SET_PREFIX_PATTERN = re.compile(r'.*[-:]\s*')
+NON_WORD_PATTERN = re.compile(r'[^a-z0-9]+')
+
+@lru_cache(maxsize=65536)
+def process_name(name):
+    processed_name = PARENTHESES_PATTERN.sub('', name)
+    return processed_name.strip()
+
+@lru_cache(maxsize=8192)
+def process_set_name(set_name):
+    processed_name = SET_PREFIX_PATTERN.sub('', set_name)
+    processed_name = PARENTHESES_PATTERN.sub('', processed_name)
+    return processed_name.strip()
+
+@lru_cache(maxsize=65536)
+def process_card_number(number_in_set):
+    processed_number = number_in_set.split('/')[0].lstrip('0')
+    return processed_number.strip()
+
+@lru_cache(maxsize=1024)
+def process_label(label):
+    if "1st+Edition+Holofoil" in label:
+        return "1st Edition"
+    elif "Holofoil" in label and "1st" not in label:
+        return "Holofoil"
+    elif "1st" in label:
+        return "1st Edition"
+    return ""
+
+# Canonical keys: (name, set, number, printing), lowercased and reduced to
+# letters and digits, so TCGplayer listings, pullbox box contents and the
+# cards_with_label sheet agree on one spelling per card
+
+# Printing names used by pullbox.gg that TCGplayer spells differently
+PRINTING_SYNONYMS = {
+    'non foil': 'normal',
+    'nonfoil': 'normal',
+    'unlimited': 'normal',
+    'holo': 'holofoil',
+    'reverse holo': 'reverse holofoil',
+    '1st edition holo': '1st edition holofoil',
+}
+
+def canonical_text(text):
+    text = unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+    return NON_WORD_PATTERN.sub(' ', text).strip()
+
+@lru_cache(maxsize=65536)
+def canonical_name(name):
+    # TCGplayer names carry " - Number - Set" after the card name
+    return canonical_text(process_name(name.split(' - ')[0]))
+
+@lru_cache(maxsize=8192)
+def canonical_set(set_name):
+    return canonical_text(process_set_name(set_name))
+
+@lru_cache(maxsize=65536)
+def canonical_number(number_in_set):
+    return canonical_text(process_card_number(number_in_set)).replace(' ', '')
+
+@lru_cache(maxsize=1024)
+def canonical_printing(printing):
+    # Accepts a plain printing ("Reverse Holofoil") or a label taken from a URL ("&Printing=1st+Edition+Holofoil")
+    text = unquote_plus(printing).split('Printing=')[-1].split('&')[0]
+    text = canonical_text(text)
+    return PRINTING_SYNONYMS.get(text, text)
+
+def canonical_key(name, set_name, number_in_set, printing):
+    return (
+        canonical_name(name or ''),
+        canonical_set(set_name or ''),
+        canonical_number(number_in_set or ''),
+        canonical_printing(printing or ''),
+    )
@@ -1,124 +1,64 @@
 import sqlite3
 import os
-import requests
+import queue
+import threading
+import time
 from datetime import datetime
-from concurrent.futures import ThreadPoolExecutor, as_completed
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.ui import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import NoSuchElementException, TimeoutException
 from webdriver_manager.chrome import ChromeDriverManager
-import statistics
-
-def get_spotlight_price(driver):
-    try:
-        price_element = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, '.spotlight__price')))
-        price = price_element.text.strip().replace('$', '').replace(',', '').strip()
-    except TimeoutException:
-        price = "NA"
-    return price
-
-def get_spotlight_stock(driver):
-    try:
-        stock_element = WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.CSS_SELECTOR, '.add-to-cart__available')))
-        stock = stock_element.text.strip().split()[-1]
-    except TimeoutException:
-        stock = "NA"
-    return stock
-
-def is_spotlight_direct(driver):
-    direct_seller = "no"
-    try:
-        driver.find_element(By.CSS_SELECTOR, '.spotlight__banner.direct')
-        direct_seller = "yes"
-    except NoSuchElementException:
-        pass
-    return direct_seller
-
-def get_spotlight_info(driver):
-    spotlight_info = {}
-    try:
-        spotlight_price = get_spotlight_price(driver)
-        spotlight_stock = get_spotlight_stock(driver)
-        direct_seller = is_spotlight_direct(driver)
-
-        spotlight_info = {
-            'Spotlight Price': spotlight_price,
-            'Spotlight Stock': spotlight_stock,
-            'Direct': direct_seller
-        }
-
-    except Exception as e:
-        print(f"An error occurred: {e}")
-        spotlight_info = {
-            'Spotlight Price': "NA",
-            'Spotlight Stock': "NA",
-            'Direct': "NA"
-        }
-
-    return spotlight_info
-
-def wait_for_non_empty_text(driver, locator, timeout=10):
-    return WebDriverWait(driver, timeout).until(
-        lambda d: d.find_element(*locator).text.strip(),
-        f"Element with locator {locator} did not have non-empty text after {timeout} seconds"
-    )
-
-def get_card_info(driver):
-    try:
-        card_name = wait_for_non_empty_text(driver, (By.CSS_SELECTOR, 'h1.product-details__name'))
-        card_set = wait_for_non_empty_text(driver, (By.CSS_SELECTOR, 'span[data-testid="lblProductDetailsSetName"]'))
-        number_in_set = wait_for_non_empty_text(driver, (By.CSS_SELECTOR, 'span[data-v-b277cce0]'))
-    except TimeoutException:
-        card_set = "NA"
-        number_in_set = "NA"
-        try:
-            card_name = wait_for_non_empty_text(driver, (By.CSS_SELECTOR, 'h1.product-details__name'))
-        except TimeoutException:
-            card_name = "NA"
-
-    images = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.TAG_NAME, 'img')))
-    card_image_url = next((img.get_attribute('src') for img in images if 'https://tcgplayer-cdn.tcgplayer.com' in img.get_attribute('src')), None)
+from tcgplayer_http import TcgplayerHttpClient
+from pricing import apply_box_price
+from async_crawler import AsyncCrawler
+from webdriver_pool import is_driver_healthy
+from page_extract import AdaptiveTimeout, load_page
+from crawl_state import CrawlState, copy_cards_from_snapshot, fetch_snapshot_cards
+from sqlite_writer import SqliteBatchWriter, configure_connection
+from snapshots import current_snapshot_path, new_staging_path, publish_snapshot, remove_database_files
+from price_history import get_history_path, record_snapshot
+from schema import create_schema, finish_scrape_run, start_scrape_run
+from search_index import build_search_index
+from card_keys import build_card_keys
+from discord_notifier import DiscordNotifier
+from price_diff import DEFAULT_MIN_CHANGE, DEFAULT_MIN_PERCENT, diff_snapshots, format_diff_message
+
+page_timeout = AdaptiveTimeout()
+
+def get_spotlight_info(page):
+    spotlight = page['spotlight']
+    price = spotlight['price'].replace('$', '').replace(',', '').strip() if spotlight['price'] else "NA"
+    stock = spotlight['stock'].split()[-1] if spotlight['stock'] else "NA"
+    return {
+        'Spotlight Price': price or "NA",
+        'Spotlight Stock': stock,
+        'Direct': "yes" if spotlight['direct'] else "no"
+    }
 
+def get_card_info(page):
     return {
-        'Card Name': card_name,
-        'Card Set': card_set,
-        'Number in Set': number_in_set,
-        'Image URL': card_image_url
+        'Card Name': page['name'] or "NA",
+        'Card Set': page['set'] or "NA",
+        'Number in Set': page['number'] or "NA",
+        'Image URL': page['image']
     }
 
-def get_listings_info(driver):
+def get_listings_info(page):
     listings_info = []
 
-    try:
-        prices = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.listing-item__listing-data__info__price')))
-        stocks = WebDriverWait(driver, 10).until(EC.presence_of_all_elements_located((By.CSS_SELECTOR, '.add-to-cart__available')))
-        stocks = stocks[1:]
-
-        for price, stock in zip(prices, stocks):
-            shipping_cost = "NA"
-            try:
-                shipping_cost_element = price.find_element(By.XPATH, "..").find_element(By.CSS_SELECTOR, '.shipping-messages__price')
-                shipping_cost = shipping_cost_element.text.strip('+ ').strip(' Shipping')
-            except NoSuchElementException:
-                pass
-
-            listings_info.append({
-                'Price': price.text,
-                'Stock': stock.text.strip(' of'),
-                'Shipping Cost': shipping_cost
-            })
+    for listing in page['listings']:
+        if listing['stock'] is None:
+            break
+        shipping_cost = "NA"
+        if listing['shipping'] is not None:
+            shipping_cost = listing['shipping'].strip('+ ').strip(' Shipping')
 
-        if not listings_info:
-            listings_info.append({
-                'Price': "NA",
-                'Stock': "NA",
-                'Shipping Cost': "NA"
-            })
+        listings_info.append({
+            'Price': listing['price'],
+            'Stock': listing['stock'].strip(' of'),
+            'Shipping Cost': shipping_cost
+        })
 
-    except TimeoutException:
+    if not listings_info:
         listings_info.append({
             'Price': "NA",
             'Stock': "NA",
@@ -127,6 +67,53 @@ def get_listings_info(driver):
 
     return listings_info
 
+def fetch_card_page(driver, url):
+    if isinstance(driver, TcgplayerHttpClient):
+        return driver.fetch_card_page(url)
+
+    # One wait for the page to settle, then every field in a single execute_script round-trip
+    page = load_page(driver, url, page_timeout)
+    return get_card_info(page), get_listings_info(page), get_spotlight_info(page)
+
+def scrape_card(driver, url, label, box_name):
+    card_info, listings_info, spotlight_info = fetch_card_page(driver, url)
+
+    # Collect prices including shipping costs
+    prices = []
+    for listing in listings_info:
+        price = listing['Price']
+        if price != "NA":
+            try:
+                prices.append(float(price.replace('$', '').replace(',', '').strip()))
+            except ValueError:
+                pass
+
+    rows = []
+    for listing in listings_info:
+        listing_price = listing['Price'] if listing['Price'] != "NA" else "NA"
+        rows.append((
+            card_info['Card Name'],
+            label,
+            card_info['Card Set'],
+            card_info['Number in Set'],
+            card_info['Image URL'],
+            box_name,
+            url,
+            listing_price,
+            listing['Shipping Cost'],
+            listing['Stock'],
+            "NA"  # Placeholder for price_avg, will be updated later
+        ))
+
+    spotlight_data = (
+        card_info['Card Name'],
+        spotlight_info['Spotlight Price'],
+        spotlight_info['Spotlight Stock'],
+        "Free Shipping" if spotlight_info['Direct'] == "yes" else "NA",
+        spotlight_info['Direct']
+    )
+    return rows, spotlight_data, prices
+
 def get_listing_info(driver, url_label_boxname_pairs):
     listings_data = []
     spotlight_infos = {}
@@ -134,147 +121,192 @@ def get_listing_info(driver, url_label_boxname_pairs):
 
     for url, label, box_name in url_label_boxname_pairs:
         try:
-            driver.get(url)
-            WebDriverWait(driver, 10).until(EC.presence_of_element_located((By.TAG_NAME, 'body')))
-            card_info = get_card_info(driver)
-            listings_info = get_listings_info(driver)
-
-            # Ensure the card name is in the card_prices dictionary
-            if card_info['Card Name'] not in card_prices:
-                card_prices[card_info['Card Name']] = []
-
-            # Collect prices including shipping costs
-            prices_without_shipping = []
-            for listing in listings_info:
-                price = listing['Price']
-                if price != "NA":
-                    try:
-                        total_price = float(price.replace('$', '').replace(',', '').strip())
-                        prices_without_shipping.append(total_price)
-                        card_prices[card_info['Card Name']].append(total_price)
-                    except ValueError:
-                        pass
-            for listing in listings_info:
-                listing_price = listing['Price'] if listing['Price'] != "NA" else "NA"
-                listings_data.append((
-                    card_info['Card Name'],
-                    label,
-                    card_info['Card Set'],
-                    card_info['Number in Set'],
-                    card_info['Image URL'],
-                    box_name,
-                    url,
-                    listing_price,
-                    listing['Shipping Cost'],
-                    listing['Stock'],
-                    "NA"  # Placeholder for price_avg, will be updated later
-                ))
-
-            # Get spotlight info
-            spotlight_info = get_spotlight_info(driver)
-            spotlight_data = (
-                card_info['Card Name'],
-                spotlight_info['Spotlight Price'],
-                spotlight_info['Spotlight Stock'],
-                "Free Shipping" if spotlight_info['Direct'] == "yes" else "NA",
-                spotlight_info['Direct']
-            )
-            spotlight_infos[spotlight_data[0]] = spotlight_data
-
+            rows, spotlight_data, prices = scrape_card(driver, url, label, box_name)
         except Exception as e:
             print(f"An error occurred with URL {url} and label {label}: {e}")
             continue
 
-    # Calculate box price idea
-    for card_name, spotlight_data in spotlight_infos.items():
-        spotlight_price = spotlight_data[1]
-        spotlight_stock = spotlight_data[2]
-        spotlight_direct = spotlight_data[4]
-
-        if spotlight_direct == "yes" and spotlight_stock != "NA" and int(spotlight_stock) >= 25:
-            # Calculate the average and standard deviation of the first 10 listings
-            first_10_prices = [price for price in card_prices[card_name][:10]]
-            if len(first_10_prices) > 1:
-                avg_first_10 = statistics.mean(first_10_prices)
-                std_dev_first_10 = statistics.stdev(first_10_prices)
-
-                if abs(float(spotlight_price) - avg_first_10) <= 2 * std_dev_first_10:
-                    box_price = float(spotlight_price)
-                else:
-                    box_price = statistics.mean(card_prices[card_name])
-            else:
-                box_price = statistics.mean(first_10_prices) if first_10_prices else "NA"
-        else:
-            # Calculate the weighted average excluding vendors with fewer than 500 sales and prices outside 2 standard deviations
-            if len(card_prices[card_name]) > 1:
-                filtered_prices = [price for price in card_prices[card_name] if abs(price - statistics.mean(card_prices[card_name])) <= 2 * statistics.stdev(card_prices[card_name])]
-                filtered_prices = [price for price in filtered_prices if any(listing[4] == card_name and int(listing[5].replace(' Sales', '')) >= 500 for listing in listings_data)]
-                box_price = statistics.mean(filtered_prices) if filtered_prices else statistics.mean(card_prices[card_name])
-            else:
-                box_price = statistics.mean(card_prices[card_name]) if card_prices[card_name] else "NA"
-
-        price_avg = f"{box_price:.2f}" if box_price != "NA" else "NA"
-
-        # Update listings_data with the calculated price_avg
-        for i in range(len(listings_data)):
-            if listings_data[i][0] == card_name:
-                listings_data[i] = listings_data[i][:-1] + (price_avg,)
-
-    return listings_data
-
-def fetch_all_card_data(cursor):
-    cursor.execute("SELECT name, box_name, price_avg FROM card_data")
-    return {row[:2]: row[2] for row in cursor.fetchall()}
-
-def send_discord_messages(webhook_url, data):
-    message_content = data["content"]
-    max_length = 2000
-    parts = []
-
-    while len(message_content) > max_length:
-        last_newline = message_content[:max_length].rfind('\n')
-        if last_newline == -1:
-            last_newline = max_length
-        parts.append(message_content[:last_newline])
-        message_content = message_content[last_newline:].strip()
-    parts.append(message_content)
-
-    for part in parts:
-        response = requests.post(webhook_url, json={"content": part, "username": data["username"]})
-        if response.status_code != 204:
-            print(f"Failed to send part of the message, status code: {response.status_code}")
-
-def compare_databases(today_db_path, yesterday_db_path, webhook_url):
-    conn_today = sqlite3.connect(today_db_path)
-    cursor_today = conn_today.cursor()
-    today_data = fetch_all_card_data(cursor_today)
-    cursor_today.close()
-    conn_today.close()
-
-    conn_yesterday = sqlite3.connect(yesterday_db_path)
-    cursor_yesterday = conn_yesterday.cursor()
-    yesterday_data = fetch_all_card_data(cursor_yesterday)
-    cursor_yesterday.close()
-    conn_yesterday.close()
-
-    differences = []
-    for card in today_data:
-        today_price = today_data[card]
-        yesterday_price = yesterday_data.get(card)
-        if str(today_price) != str(yesterday_price):
-            differences.append((card[0], card[1], yesterday_price, today_price))
-
-    if differences:
-        message_content = "Differences found in price_avg between today and yesterday:\n"
-        for name, box_name, price_yesterday, price_today in differences:
-            message_content += f"{name} in {box_name} - Yesterday: {price_yesterday}, Today: {price_today}\n"
-        send_discord_messages(webhook_url, {"content": message_content, "username": "Price Checker Bot"})
+        listings_data.extend(rows)
+        card_prices.setdefault(spotlight_data[0], []).extend(prices)
+        spotlight_infos[spotlight_data[0]] = spotlight_data
+
+    return apply_box_price(listings_data, spotlight_infos, card_prices)
+
+class CardRows(list):
+    """One card's card_data rows, carrying the spotlight row it was priced with."""
+
+    def __init__(self, rows, spotlight):
+        super().__init__(rows)
+        self.spotlight = spotlight
+
+def spotlight_row(url, label, box_name, spotlight_data):
+    # (url, label, box_name, price, stock, direct) for the spotlights table
+    _, spotlight_price, spotlight_stock, _, spotlight_direct = spotlight_data
+    return (
+        url, label, box_name,
+        float(spotlight_price) if spotlight_price != "NA" else None,
+        int(spotlight_stock) if spotlight_stock != "NA" else None,
+        1 if spotlight_direct == "yes" else 0
+    )
+
+def scrape_and_price_card(driver, url, label, box_name):
+    # Single-card version of get_listing_info, for crawlers that stream results per card
+    rows, spotlight_data, prices = scrape_card(driver, url, label, box_name)
+    rows = apply_box_price(rows, {spotlight_data[0]: spotlight_data}, {spotlight_data[0]: prices})
+    return CardRows(rows, spotlight_row(url, label, box_name, spotlight_data))
+
+INSERT_CARD_DATA_SQL = '''
+INSERT INTO card_data (name, label, "set", number_in_set, image_url, box_name, url, price, shipping, stock, price_avg)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+'''
+
+INSERT_SPOTLIGHT_SQL = '''
+INSERT OR REPLACE INTO spotlights (url, label, box_name, price, stock, direct)
+VALUES (?, ?, ?, ?, ?, ?)
+'''
+
+def send_discord_messages(notifier, webhook_url, data):
+    # The notifier splits long messages at Discord's 2000 character limit and handles rate limits
+    notifier.notify(webhook_url, data["content"], username=data["username"])
+
+def compare_databases(today_db_path, yesterday_db_path, webhook_url, notifier):
+    diff = diff_snapshots(
+        today_db_path, yesterday_db_path,
+        min_change=float(os.environ.get('PRICE_ALERT_MIN_CHANGE', DEFAULT_MIN_CHANGE)),
+        min_percent=float(os.environ.get('PRICE_ALERT_MIN_PERCENT', DEFAULT_MIN_PERCENT))
+    )
+    message_content = format_diff_message(diff)
+    if message_content:
+        send_discord_messages(notifier, webhook_url, {"content": message_content, "username": "Price Checker Bot"})
     else:
         print("No differences found in price_avg between the two databases.")
 
 def initialize_webdriver():
     return webdriver.Chrome(service=Service(ChromeDriverManager().install()))
 
+def initialize_fetcher(backend):
+    # "selenium" drives Chrome, "http" reads the same data from TCGplayer's JSON API
+    if backend == "http":
+        return TcgplayerHttpClient()
+    if backend == "selenium":
+        return initialize_webdriver()
+    raise ValueError(f"Unknown fetch backend: {backend}")
+
+def close_fetcher(driver):
+    if isinstance(driver, TcgplayerHttpClient):
+        driver.close()
+    else:
+        driver.quit()
+
+def is_fetcher_healthy(driver):
+    if isinstance(driver, TcgplayerHttpClient):
+        return True
+    return is_driver_healthy(driver)
+
+def close_fetcher_quietly(driver):
+    try:
+        close_fetcher(driver)
+    except Exception as e:
+        print(f"Failed to close a browser: {e}")
+
+def work_queue_worker(worker_id, drivers, work_queue, results, stats, backend, max_attempts, stop):
+    # Each worker pulls the next card from the shared queue, so a slow driver only delays its own card.
+    # drivers[worker_id] always holds this worker's current driver, so the main thread can quit it.
+    driver = drivers[worker_id]
+    worker_stats = stats[worker_id]
+    started = time.monotonic()
+    try:
+        while not stop.is_set():
+            try:
+                url, label, box_name, attempt = work_queue.get(timeout=0.5)
+            except queue.Empty:
+                # Only stop once no other worker can still hand a card back
+                if work_queue.unfinished_tasks == 0:
+                    break
+                continue
+
+            try:
+                rows = scrape_and_price_card(driver, url, label, box_name)
+                results.put(rows)
+                worker_stats['cards'] += 1
+                worker_stats['rows'] += len(rows)
+                work_queue.task_done()
+            except Exception as e:
+                worker_stats['errors'] += 1
+                healthy = is_fetcher_healthy(driver)
+                if not healthy and attempt + 1 < max_attempts:
+                    # Hand the card back so another worker (or this one, after a restart) picks it up
+                    work_queue.put((url, label, box_name, attempt + 1))
+                else:
+                    print(f"An error occurred with URL {url} and label {label}: {e}")
+
+                work_queue.task_done()
+                if not healthy:
+                    print(f"Worker {worker_id} lost its browser, restarting it")
+                    drivers[worker_id] = None
+                    close_fetcher_quietly(driver)
+                    try:
+                        driver = drivers[worker_id] = initialize_fetcher(backend)
+                        worker_stats['restarts'] += 1
+                    except Exception as restart_error:
+                        print(f"Worker {worker_id} could not restart its browser and is stopping: {restart_error}")
+                        driver = None
+                        break
+    finally:
+        worker_stats['seconds'] = time.monotonic() - started
+        if driver is not None and drivers[worker_id] is driver:
+            drivers[worker_id] = None
+            close_fetcher_quietly(driver)
+
+def print_worker_stats(stats):
+    for worker_id, worker_stats in sorted(stats.items()):
+        cards_per_minute = worker_stats['cards'] / worker_stats['seconds'] * 60 if worker_stats['seconds'] else 0
+        print(f"Worker {worker_id}: {worker_stats['cards']} cards, {worker_stats['rows']} rows, "
+              f"{worker_stats['errors']} errors, {worker_stats['restarts']} restarts, "
+              f"{worker_stats['seconds']:.1f}s, {cards_per_minute:.1f} cards/min")
+
+def run_work_queue(drivers, url_label_boxname_pairs, store_rows, backend, max_attempts=2, join_timeout=30):
+    # Takes ownership of drivers: every one of them is quit before this returns, even on KeyboardInterrupt
+    drivers = list(drivers)
+    work_queue = queue.Queue()
+    for url, label, box_name in url_label_boxname_pairs:
+        work_queue.put((url, label, box_name, 0))
+
+    results = queue.Queue()
+    stop = threading.Event()
+    stats = {worker_id: {'cards': 0, 'rows': 0, 'errors': 0, 'restarts': 0, 'seconds': 0.0} for worker_id in range(len(drivers))}
+    threads = [
+        threading.Thread(target=work_queue_worker, args=(worker_id, drivers, work_queue, results, stats, backend, max_attempts, stop), daemon=True)
+        for worker_id in range(len(drivers))
+    ]
+    try:
+        for thread in threads:
+            thread.start()
+
+        # Rows are written from this thread as each card completes
+        while any(thread.is_alive() for thread in threads) or not results.empty():
+            try:
+                store_rows(results.get(timeout=0.5))
+            except queue.Empty:
+                continue
+    finally:
+        # Workers finish the card in hand and quit their own drivers; whatever is
+        # still open after join_timeout (a worker stuck in a page load) is quit here
+        stop.set()
+        deadline = time.monotonic() + join_timeout
+        for thread in threads:
+            if thread.is_alive():
+                thread.join(max(0.0, deadline - time.monotonic()))
+        for worker_id, driver in enumerate(drivers):
+            if driver is not None:
+                drivers[worker_id] = None
+                close_fetcher_quietly(driver)
+
+    if not work_queue.empty():
+        print(f"All workers stopped with {work_queue.qsize()} cards left in the queue")
+    print_worker_stats(stats)
+    return stats
+
 if __name__ == "__main__":
     # Define the path to the databases folder in the same directory as the script
     script_dir = os.path.dirname(os.path.abspath(__file__))
@@ -290,63 +322,112 @@ if __name__ == "__main__":
     cursor.close()
     connection.close()
 
-    today_db_path = os.path.join(base_path, 'pullbox_cards.db')
-
-    if os.path.exists(today_db_path):
-        new_db_path = os.path.join(base_path, 'pullbox_cards_yesterday.db')
-
-        if os.path.exists(new_db_path):
-            os.remove(new_db_path)
-
-        os.rename(today_db_path, new_db_path)
-
-    connection = sqlite3.connect(today_db_path)
-    cursor = connection.cursor()
+    # The live snapshot keeps serving the web app while tonight's crawl builds into a staging database
+    yesterday_db_path = current_snapshot_path(base_path)
+    staging_db_path = new_staging_path(base_path)
+
+    connection = sqlite3.connect(staging_db_path)
+    configure_connection(connection)
+    create_schema(connection)
+
+    crawl_state = None
+    if os.environ.get('INCREMENTAL_CRAWL') == '1' and yesterday_db_path is not None:
+        # Only re-scrape cards that are due; the rest are carried over from the previous run
+        crawl_state = CrawlState(os.path.join(base_path, 'crawl_state.db'))
+        url_label_boxname_pairs, unchanged_cards = crawl_state.plan(url_label_boxname_pairs, fetch_snapshot_cards(yesterday_db_path))
+        copied_rows = copy_cards_from_snapshot(connection, yesterday_db_path, unchanged_cards) if unchanged_cards else 0
+        print(f"Incremental crawl: {len(url_label_boxname_pairs)} cards to crawl, {len(unchanged_cards)} unchanged cards ({copied_rows} rows) copied from the previous run")
+
+    backend = os.environ.get('CARD_FETCH_BACKEND', 'selenium')
+    crawler = os.environ.get('CARD_CRAWLER', 'threads')
+    run_id = start_scrape_run(connection, backend)
+    connection.close()
 
-    cursor.execute('''
-    CREATE TABLE IF NOT EXISTS card_data (
-        name TEXT,
-        label TEXT,
-        "set" TEXT,
-        number_in_set TEXT,
-        image_url TEXT,
-        box_name TEXT,
-        url TEXT,
-        price TEXT,
-        shipping TEXT,
-        stock TEXT,
-        price_avg REAL 
+    # Rows go to a dedicated writer thread as each card completes and are inserted in batches
+    writer = SqliteBatchWriter(
+        staging_db_path,
+        INSERT_CARD_DATA_SQL,
+        batch_size=int(os.environ.get('DB_WRITE_BATCH_SIZE', 500)),
+        flush_interval=float(os.environ.get('DB_WRITE_FLUSH_INTERVAL', 2))
     )
-    ''')
 
-    num_workers = 4  # Number of Chrome instances to run in parallel
-    chunks = [url_label_boxname_pairs[i::num_workers] for i in range(num_workers)]
+    # Spotlights are one row per card, so they go out in smaller batches
+    spotlight_writer = SqliteBatchWriter(
+        staging_db_path,
+        INSERT_SPOTLIGHT_SQL,
+        batch_size=max(1, int(os.environ.get('DB_WRITE_BATCH_SIZE', 500)) // 10),
+        flush_interval=float(os.environ.get('DB_WRITE_FLUSH_INTERVAL', 2))
+    )
 
-    drivers = [initialize_webdriver() for _ in range(num_workers)]
+    def store_rows(rows):
+        writer.put(rows)
+        if getattr(rows, 'spotlight', None) is not None:
+            spotlight_writer.put([rows.spotlight])
+        if crawl_state is not None:
+            crawl_state.record(rows)
 
+    interrupted = False
+    writers_ok = False
     try:
-        with ThreadPoolExecutor(max_workers=num_workers) as executor:
-            futures = []
-            for driver, chunk in zip(drivers, chunks):
-                futures.append(executor.submit(get_listing_info, driver, chunk))
-
-            for future in as_completed(futures):
-                listings_data = future.result()
-                for data in listings_data:
-                    cursor.execute('''
-                    INSERT INTO card_data (name, label, "set", number_in_set, image_url, box_name, url, price, shipping, stock, price_avg)
-                    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                    ''', data)
-                connection.commit()
+        if crawler == 'async':
+            async_crawler = AsyncCrawler(
+                scrape_and_price_card,
+                lambda: initialize_fetcher(backend),
+                close_fetcher,
+                store_rows,
+                concurrency=int(os.environ.get('CRAWL_CONCURRENCY', 4)),
+                per_host_concurrency=int(os.environ.get('CRAWL_PER_HOST_CONCURRENCY', 4)),
+                requests_per_second=float(os.environ.get('CRAWL_REQUESTS_PER_SECOND', 2)),
+                max_retries=int(os.environ.get('CRAWL_MAX_RETRIES', 3))
+            )
+            print(f"Crawl finished: {async_crawler.crawl(url_label_boxname_pairs)}")
+        else:
+            num_workers = 4  # Number of Chrome instances to run in parallel
+            drivers = []
+            try:
+                for _ in range(num_workers):
+                    drivers.append(initialize_fetcher(backend))
+            except BaseException:
+                for driver in drivers:
+                    close_fetcher_quietly(driver)
+                raise
+            run_work_queue(drivers, url_label_boxname_pairs, store_rows, backend)
     except KeyboardInterrupt:
         print("Program interrupted by user. Closing resources...")
+        interrupted = True
     finally:
-        for driver in drivers:
-            driver.quit()
-        cursor.close()
+        writers_ok = writer.close()
+        writers_ok = spotlight_writer.close() and writers_ok
+        if (interrupted or not writers_ok) and crawl_state is not None:
+            crawl_state.close()
+
+    if interrupted or not writers_ok:
+        # Never publish a partial crawl; the previous snapshot stays live
+        if not writers_ok:
+            print("Rows were lost writing the staging database, not publishing this crawl")
+        remove_database_files(staging_db_path)
+    else:
+        connection = sqlite3.connect(staging_db_path)
+        finish_scrape_run(connection, run_id)
+        print(f"Indexed {build_search_index(connection)} cards for search")
+        print(f"Keyed {build_card_keys(connection)} cards for box matching")
         connection.close()
 
-    yesterday_db_path = os.path.join(base_path, 'pullbox_cards_yesterday.db')
-    webhook_url = 'https://discord.com/api/webhooks/1232752903140278342/uXpkRiAjvN3nw4iCs9t0K42HZZj3x_ddvZ7sAcgHa5CYcCEPGTzQG1TtL8JLu7ZFpnl5'
-
-    compare_databases(today_db_path, yesterday_db_path, webhook_url)
+        try:
+            today_db_path = publish_snapshot(base_path, staging_db_path, keep=int(os.environ.get('SNAPSHOTS_TO_KEEP', 7)))
+            if crawl_state is not None:
+                print(f"Recorded fingerprints for {crawl_state.commit()} crawled cards")
+        finally:
+            if crawl_state is not None:
+                crawl_state.close()
+        print(f"Recorded {record_snapshot(get_history_path(base_path), today_db_path)} price points in the price history")
+
+        webhook_url = 'https://discord.com/api/webhooks/1232752903140278342/uXpkRiAjvN3nw4iCs9t0K42HZZj3x_ddvZ7sAcgHa5CYcCEPGTzQG1TtL8JLu7ZFpnl5'
+
+        if yesterday_db_path is not None:
+            notifier = DiscordNotifier(os.path.join(base_path, 'discord_outbox_crawler.db'))
+            try:
+                compare_databases(today_db_path, yesterday_db_path, webhook_url, notifier)
+            finally:
+                # Anything Discord hasn't accepted by then stays in the outbox for the next run
+                notifier.close(timeout=float(os.environ.get('DISCORD_FLUSH_TIMEOUT', 120)))
@@ -0,0 +1,134 @@
+import base64
+import json
+from schema import is_normalized
+
+# Card catalog queries for the JSON API. A catalog entry is one (name, box_name,
+# label) group, the same grouping /cards2 has always shown. Pages use keyset
+# cursors: the cursor holds the sort values of the last card returned, so every
+# page is an index range scan no matter how deep the user has scrolled.
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 200
+
+# Cards without a price sort after every priced card, in either direction
+UNPRICED_KEY = 1e18
+
+SORTS = {
+    'box': ('box_name', 'name', 'label'),
+    'name': ('name', 'box_name', 'label'),
+    'price': ('price_key', 'box_name', 'name', 'label'),
+}
+
+# Normalized snapshots group the indexed cards table; flat card_data tables from
+# before the schema change are grouped directly
+NORMALIZED_PRICE_SQL = 'MAX(price_avg)'
+LEGACY_PRICE_SQL = "MAX(CASE WHEN typeof(price_avg) IN ('real', 'integer') OR price_avg GLOB '[0-9]*' THEN CAST(price_avg AS REAL) END)"
+
+def encode_cursor(values):
+    return base64.urlsafe_b64encode(json.dumps(values).encode('utf-8')).decode('ascii')
+
+def decode_cursor(cursor, sort):
+    try:
+        values = json.loads(base64.urlsafe_b64decode(cursor.encode('ascii')))
+    except (ValueError, UnicodeError):
+        raise ValueError("Invalid cursor.")
+    if not isinstance(values, list) or len(values) != len(SORTS[sort]):
+        raise ValueError("Invalid cursor.")
+    return values
+
+def query_cards(connection, box=None, card_set=None, label=None, search=None, min_price=None, max_price=None,
+                sort='box', descending=False, cursor=None, limit=DEFAULT_PAGE_SIZE):
+    # Returns (cards, next_cursor); cards are dicts and next_cursor is None on the last page
+    if sort not in SORTS:
+        raise ValueError(f"Unknown sort {sort}, choose from {', '.join(SORTS)}")
+    limit = max(1, min(int(limit), MAX_PAGE_SIZE))
+    sort_columns = SORTS[sort]
+
+    conditions = []
+    params = []
+    if box:
+        conditions.append('box_name = ?')
+        params.append(box)
+    if card_set:
+        conditions.append('"set" = ?')
+        params.append(card_set)
+    if label:
+        conditions.append('label = ?')
+        params.append(label)
+    if search:
+        conditions.append('name LIKE ?')
+        params.append(f'%{search}%')
+    normalized = is_normalized(connection)
+    price_sql = NORMALIZED_PRICE_SQL if normalized else LEGACY_PRICE_SQL
+    price_key_sql = f'COALESCE({price_sql}, {-UNPRICED_KEY if descending else UNPRICED_KEY})'
+
+    # Price filters and the price cursor apply to the grouped value; the other
+    # cursors are plain column ranges the index can seek to
+    having = []
+    if min_price is not None:
+        having.append(f'{price_sql} >= ?')
+    if max_price is not None:
+        having.append(f'{price_sql} <= ?')
+    having_params = [float(price) for price in (min_price, max_price) if price is not None]
+    if cursor:
+        values = decode_cursor(cursor, sort)
+        comparison = '<' if descending else '>'
+        if sort == 'price':
+            having.append(f"({price_key_sql}, box_name, name, label) {comparison} (?, ?, ?, ?)")
+            having_params.extend(values)
+        else:
+            conditions.append(f"({', '.join(sort_columns)}) {comparison} (?, ?, ?)")
+            params.extend(values)
+
+    direction = 'DESC' if descending else 'ASC'
+    # Grouping in the sort order lets SQLite walk the matching index instead of sorting
+    group_by = 'name, box_name, label' if sort == 'name' else 'box_name, name, label'
+    order_by = ', '.join(f'{column} {direction}' for column in sort_columns).replace('price_key', price_key_sql)
+    rows = connection.execute(f'''
+    SELECT name, box_name, label, MAX("set"), MAX(number_in_set), MAX(image_url), {price_sql}, {price_key_sql}
+    FROM {'cards' if normalized else 'card_data'}
+    {f"WHERE {' AND '.join(conditions)}" if conditions else ''}
+    GROUP BY {group_by}
+    {f"HAVING {' AND '.join(having)}" if having else ''}
+    ORDER BY {order_by}
+    LIMIT ?
+    ''', params + having_params + [limit + 1]).fetchall()
+
+    has_more = len(rows) > limit
+    rows = rows[:limit]
+    cards = [{
+        'name': row[0],
+        'box_name': row[1],
+        'label': row[2],
+        'set': row[3],
+        'number_in_set': row[4],
+        'image_url': row[5],
+        'price_avg': row[6],
+        'listings': [],
+    } for row in rows]
+    attach_listings(connection, cards)
+
+    next_cursor = None
+    if has_more:
+        last = {'name': rows[-1][0], 'box_name': rows[-1][1], 'label': rows[-1][2], 'price_key': rows[-1][7]}
+        next_cursor = encode_cursor([last[column] for column in sort_columns])
+    return cards, next_cursor
+
+def attach_listings(connection, cards):
+    # One query for the listings of every card on the page
+    if not cards:
+        return
+    by_key = {(card['name'], card['box_name'], card['label']): card for card in cards}
+    values = ', '.join('(?, ?, ?)' for _ in by_key)
+    params = [value for key in by_key for value in key]
+    rows = connection.execute(f'''
+    WITH page (name, box_name, label) AS (VALUES {values})
+    SELECT d.name, d.box_name, d.label, d.price, d.stock, d.shipping
+    FROM page p
+    JOIN card_data d ON d.name = p.name AND d.box_name = p.box_name AND d.label = p.label
+    ''', params).fetchall()
+    for name, box_name, label, price, stock, shipping in rows:
+        by_key[(name, box_name, label)]['listings'].append({'price': price, 'stock': stock, 'shipping': shipping})
+
+def list_boxes(connection):
+    table = 'cards' if is_normalized(connection) else 'card_data'
+    return [row[0] for row in connection.execute(f'SELECT DISTINCT box_name FROM {table} ORDER BY box_name')]
@@ -0,0 +1,166 @@
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from schema import has_spotlights
+
+DAY = 24 * 60 * 60
+
+def fingerprint_rows(rows):
+    # Everything a card's listings contribute to card_data: price, shipping, stock and price_avg
+    listings = sorted((row[7], row[8], row[9]) for row in rows)
+    price_avg = rows[0][10] if rows else None
+    payload = json.dumps([listings, price_avg], separators=(',', ':'))
+    return hashlib.sha1(payload.encode('utf-8')).hexdigest()
+
+def parse_price_avg(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+class CrawlState:
+    """Per-card fingerprints kept across nightly runs.
+
+    A card whose listings came back unchanged is revisited after
+    `min_interval * 2 ** unchanged_runs` seconds (capped at `max_interval`);
+    cards worth at least `high_value_price` are crawled every run.
+    Fingerprints recorded during a crawl are held in memory and only
+    written by commit(), once the crawl's snapshot has been published.
+    """
+
+    def __init__(self, db_path, min_interval=DAY, max_interval=7 * DAY, high_value_price=50.0):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.high_value_price = high_value_price
+        self.pending = {}
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(db_path)
+        self.connection.execute('''
+        CREATE TABLE IF NOT EXISTS card_fingerprints (
+            url TEXT,
+            label TEXT,
+            box_name TEXT,
+            listings_hash TEXT,
+            price_avg REAL,
+            last_checked REAL,
+            last_changed REAL,
+            unchanged_runs INTEGER DEFAULT 0,
+            PRIMARY KEY (url, label, box_name)
+        )
+        ''')
+        self.connection.commit()
+
+    def revisit_interval(self, unchanged_runs):
+        return min(self.max_interval, self.min_interval * 2 ** unchanged_runs)
+
+    def plan(self, url_label_boxname_pairs, previous_cards, now=None):
+        # Returns (cards to crawl, most volatile and valuable first; cards to copy from the previous snapshot)
+        now = now if now is not None else time.time()
+        states = {
+            (url, label, box_name): (last_checked, unchanged_runs, price_avg)
+            for url, label, box_name, last_checked, unchanged_runs, price_avg in self.connection.execute(
+                'SELECT url, label, box_name, last_checked, unchanged_runs, price_avg FROM card_fingerprints'
+            )
+        }
+
+        to_crawl = []
+        to_copy = []
+        for card in url_label_boxname_pairs:
+            state = states.get(tuple(card))
+            if state is None or tuple(card) not in previous_cards:
+                to_crawl.append((card, 0, float('inf')))
+                continue
+
+            last_checked, unchanged_runs, price_avg = state
+            price_avg = price_avg or 0.0
+            # A small tolerance so a card crawled at 02:05 last night is due again at 02:00 tonight
+            due = now - last_checked >= self.revisit_interval(unchanged_runs) * 0.9
+            if due or price_avg >= self.high_value_price:
+                to_crawl.append((card, unchanged_runs, price_avg))
+            else:
+                to_copy.append(card)
+
+        to_crawl.sort(key=lambda item: (item[1], -item[2]))
+        return [card for card, _, _ in to_crawl], to_copy
+
+    def record(self, rows, now=None):
+        # Called from the scraping threads; nothing reaches the database until commit()
+        if not rows:
+            return
+        now = now if now is not None else time.time()
+        url, label, box_name = rows[0][6], rows[0][1], rows[0][5]
+        with self.lock:
+            self.pending[(url, label, box_name)] = (fingerprint_rows(rows), parse_price_avg(rows[0][10]), now)
+
+    def commit(self):
+        # Call only after publish_snapshot: a crawl that crashes or never publishes must leave
+        # its cards due, or the next run would copy their stale rows from the old snapshot
+        with self.lock:
+            pending, self.pending = self.pending, {}
+        previous = {
+            (url, label, box_name): (listings_hash, unchanged_runs, last_changed)
+            for url, label, box_name, listings_hash, unchanged_runs, last_changed in self.connection.execute(
+                'SELECT url, label, box_name, listings_hash, unchanged_runs, last_changed FROM card_fingerprints'
+            )
+        }
+        rows = []
+        for (url, label, box_name), (listings_hash, price_avg, now) in pending.items():
+            state = previous.get((url, label, box_name))
+            if state and state[0] == listings_hash:
+                unchanged_runs, last_changed = state[1] + 1, state[2]
+            else:
+                unchanged_runs, last_changed = 0, now
+            rows.append((url, label, box_name, listings_hash, price_avg, now, last_changed, unchanged_runs))
+        with self.connection:
+            self.connection.executemany('''
+            INSERT OR REPLACE INTO card_fingerprints (url, label, box_name, listings_hash, price_avg, last_checked, last_changed, unchanged_runs)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+            ''', rows)
+        return len(rows)
+
+    def close(self):
+        # Fingerprints not committed by now belong to a crawl that wasn't published
+        self.pending = {}
+        self.connection.close()
+
+def fetch_snapshot_cards(snapshot_path):
+    if not os.path.exists(snapshot_path):
+        return set()
+    connection = sqlite3.connect(snapshot_path)
+    try:
+        return set(connection.execute('SELECT DISTINCT url, label, box_name FROM card_data'))
+    except sqlite3.OperationalError:
+        return set()
+    finally:
+        connection.close()
+
+def copy_cards_from_snapshot(connection, snapshot_path, cards):
+    # Carries unchanged cards' rows over from the previous run's database
+    connection.execute('ATTACH DATABASE ? AS previous', (snapshot_path,))
+    try:
+        connection.execute('CREATE TEMP TABLE copied_cards (url TEXT, label TEXT, box_name TEXT)')
+        connection.executemany('INSERT INTO copied_cards VALUES (?, ?, ?)', cards)
+        # card_data is a view with an INSTEAD OF trigger, so the row count can't come from the cursor
+        before = connection.execute('SELECT COUNT(*) FROM main.card_data').fetchone()[0]
+        connection.execute('''
+        INSERT INTO main.card_data (name, label, "set", number_in_set, image_url, box_name, url, price, shipping, stock, price_avg)
+        SELECT p.name, p.label, p."set", p.number_in_set, p.image_url, p.box_name, p.url, p.price, p.shipping, p.stock, p.price_avg
+        FROM previous.card_data p
+        JOIN copied_cards c ON p.url = c.url AND p.label = c.label AND p.box_name = c.box_name
+        ''')
+        copied = connection.execute('SELECT COUNT(*) FROM main.card_data').fetchone()[0] - before
+        if has_spotlights(connection, 'previous'):
+            connection.execute('''
+            INSERT OR REPLACE INTO main.spotlights (url, label, box_name, price, stock, direct, inferred)
+            SELECT p.url, p.label, p.box_name, p.price, p.stock, p.direct, p.inferred
+            FROM previous.spotlights p
+            JOIN copied_cards c ON p.url = c.url AND p.label = c.label AND p.box_name = c.box_name
+            ''')
+        connection.execute('DROP TABLE copied_cards')
+        connection.commit()
+    finally:
+        connection.execute('DETACH DATABASE previous')
+    return copied
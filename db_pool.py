@@ -0,0 +1,103 @@
+import os
+import pathlib
+import sqlite3
+import threading
+from contextlib import contextmanager
+from page_cache import snapshot_cache_key
+from snapshots import POINTER_FILE, current_snapshot_path
+
+# Published snapshots are never written again (a new crawl publishes a new
+# file), so the web app opens them read-only and immutable: SQLite skips file
+# locking and change detection entirely. Connections are shared between request
+# threads and keep their statement cache, so the app's fixed queries are parsed
+# once per connection rather than once per request. A connection is only reused
+# for the exact file it was opened on; if the snapshot changes (or a legacy
+# database is rewritten in place) the old connections are closed as they come back.
+CACHED_STATEMENTS = 256
+
+def connect_read_only(db_path, cached_statements=CACHED_STATEMENTS):
+    uri = f"{pathlib.Path(os.path.abspath(db_path)).as_uri()}?mode=ro&immutable=1"
+    connection = sqlite3.connect(uri, uri=True, check_same_thread=False, cached_statements=cached_statements)
+    connection.row_factory = sqlite3.Row
+    return connection
+
+class ReadOnlyConnectionPool:
+    def __init__(self, base_path, max_idle=8, connect=connect_read_only):
+        self.base_path = base_path
+        self.max_idle = max_idle
+        self.connect = connect
+        self.idle = {}
+        self.current_key = None
+        self.lock = threading.Lock()
+        self.pointer_state = None
+        self.snapshot_path = None
+
+    def current_path(self, refresh=False):
+        # The pointer file is only re-read when it changes
+        try:
+            stat = os.stat(os.path.join(self.base_path, POINTER_FILE))
+            pointer_state = (stat.st_mtime_ns, stat.st_size)
+        except FileNotFoundError:
+            pointer_state = None
+        snapshot_path = self.snapshot_path
+        if refresh or snapshot_path is None or pointer_state != self.pointer_state:
+            snapshot_path = current_snapshot_path(self.base_path)
+            if snapshot_path is None:
+                raise FileNotFoundError(f"No published database found in {self.base_path}")
+            print(f"Serving database at: {snapshot_path}")
+            self.snapshot_path, self.pointer_state = snapshot_path, pointer_state
+        return snapshot_path
+
+    def acquire(self, db_path):
+        key = snapshot_cache_key(db_path)
+        stale = []
+        with self.lock:
+            if key != self.current_key:
+                # Connections for files that have since been replaced
+                for connections in self.idle.values():
+                    stale.extend(connections)
+                self.idle = {}
+                self.current_key = key
+            connections = self.idle.get(key)
+            connection = connections.pop() if connections else None
+        for old in stale:
+            old.close()
+        if connection is None:
+            connection = self.connect(db_path)
+        return key, connection
+
+    def release(self, key, connection):
+        with self.lock:
+            connections = self.idle.setdefault(key, []) if key == self.current_key else None
+            if connections is not None and len(connections) < self.max_idle:
+                connections.append(connection)
+                return
+        connection.close()
+
+    @contextmanager
+    def checkout(self, db_path=None):
+        if db_path is None:
+            try:
+                db_path = self.current_path()
+                key, connection = self.acquire(db_path)
+            except FileNotFoundError:
+                # The remembered snapshot was removed; resolve it again
+                db_path = self.current_path(refresh=True)
+                key, connection = self.acquire(db_path)
+        else:
+            key, connection = self.acquire(db_path)
+        try:
+            yield connection
+        finally:
+            self.release(key, connection)
+
+    def stats(self):
+        with self.lock:
+            return {'idle': sum(len(connections) for connections in self.idle.values()), 'files': len(self.idle)}
+
+    def close(self):
+        with self.lock:
+            idle, self.idle = self.idle, {}
+        for connections in idle.values():
+            for connection in connections:
+                connection.close()
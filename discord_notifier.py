@@ -0,0 +1,258 @@
+import json
+import os
+import sqlite3
+import sys
+import threading
+import time
+import requests
+from async_crawler import backoff_delay
+
+# Discord webhook posts go through one background sender per process. Messages
+# are written to a small SQLite outbox first, so anything not yet delivered
+# survives a restart and is sent by the next process that opens the outbox.
+# The sender waits `batch_window` seconds to coalesce bursts: consecutive text
+# messages for the same webhook and username are joined up to Discord's 2000
+# character limit, and embeds are sent up to 10 per post.
+MAX_CONTENT_LENGTH = 2000
+MAX_EMBEDS = 10
+
+OUTBOX_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS outbox (
+    message_id INTEGER PRIMARY KEY,
+    webhook_url TEXT NOT NULL,
+    username TEXT,
+    content TEXT,
+    embed TEXT,
+    created_at REAL NOT NULL
+);
+'''
+
+def split_content(content, max_length=MAX_CONTENT_LENGTH):
+    # Splits on the last newline before the limit, as the crawler always has
+    parts = []
+    while len(content) > max_length:
+        last_newline = content[:max_length].rfind('\n')
+        if last_newline == -1:
+            last_newline = max_length
+        parts.append(content[:last_newline])
+        content = content[last_newline:].strip()
+    parts.append(content)
+    return parts
+
+def coalesce(messages):
+    # messages: (message_id, webhook_url, username, content, embed) in order.
+    # Returns [(webhook_url, payload, message_ids)] preserving that order.
+    batches = []
+    for message_id, webhook_url, username, content, embed in messages:
+        kind = 'embed' if embed else 'content'
+        last = batches[-1] if batches else None
+        if last is not None and last['key'] == (webhook_url, username, kind):
+            if kind == 'content' and len(last['content']) + 1 + len(content) <= MAX_CONTENT_LENGTH:
+                last['content'] += '\n' + content
+                last['ids'].append(message_id)
+                continue
+            if kind == 'embed' and len(last['embeds']) < MAX_EMBEDS:
+                last['embeds'].append(json.loads(embed))
+                last['ids'].append(message_id)
+                continue
+        batches.append({
+            'key': (webhook_url, username, kind),
+            'content': content,
+            'embeds': [json.loads(embed)] if embed else [],
+            'ids': [message_id],
+        })
+
+    result = []
+    for batch in batches:
+        webhook_url, username, kind = batch['key']
+        payload = {'embeds': batch['embeds']} if kind == 'embed' else {'content': batch['content']}
+        if username:
+            payload['username'] = username
+        result.append((webhook_url, payload, batch['ids']))
+    return result
+
+def retry_after_seconds(response):
+    # Discord sends retry_after (seconds) in the 429 body and Retry-After as a header
+    try:
+        return float(response.json().get('retry_after'))
+    except (ValueError, TypeError, AttributeError):
+        pass
+    try:
+        return float(response.headers.get('Retry-After'))
+    except (TypeError, ValueError):
+        return 1.0
+
+class DiscordNotifier:
+    """Queues webhook messages from any thread and delivers them on one sender thread."""
+
+    def __init__(self, outbox_path, batch_window=2.0, max_pending=1000, max_retries=5,
+                 base_delay=1.0, max_delay=60.0, timeout=10, session=None):
+        self.outbox_path = outbox_path
+        self.batch_window = batch_window
+        self.max_pending = max_pending
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.sent = 0
+        self.dropped = 0
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopping = threading.Event()
+
+        self.connection = sqlite3.connect(outbox_path, check_same_thread=False)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.executescript(OUTBOX_SCHEMA)
+        if self.pending():
+            # Left over from a previous run
+            self.wakeup.set()
+        self.thread = threading.Thread(target=self._run, name='discord-notifier', daemon=True)
+        self.thread.start()
+
+    def notify(self, webhook_url, content=None, username=None, embed=None):
+        # Returns as soon as the message is in the outbox
+        if not webhook_url:
+            print("Error: no Discord webhook URL configured, message not sent.")
+            return False
+        now = time.time()
+        if embed:
+            rows = [(webhook_url, username, None, json.dumps(embed), now)]
+        else:
+            rows = [(webhook_url, username, part, None, now) for part in split_content(content or '')]
+        with self.lock:
+            with self.connection:
+                self.connection.executemany('INSERT INTO outbox (webhook_url, username, content, embed, created_at) VALUES (?, ?, ?, ?, ?)', rows)
+                # Bounded: past max_pending the oldest messages give way
+                overflow = self.connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0] - self.max_pending
+                if overflow > 0:
+                    self.connection.execute('DELETE FROM outbox WHERE message_id IN (SELECT message_id FROM outbox ORDER BY message_id LIMIT ?)', (overflow,))
+                    self.dropped += overflow
+                    print(f"Discord outbox full, dropped the {overflow} oldest messages")
+        self.wakeup.set()
+        return True
+
+    def pending(self):
+        with self.lock:
+            return self.connection.execute('SELECT COUNT(*) FROM outbox').fetchone()[0]
+
+    def _load(self):
+        with self.lock:
+            return self.connection.execute('SELECT message_id, webhook_url, username, content, embed FROM outbox ORDER BY message_id').fetchall()
+
+    def _delete(self, message_ids):
+        with self.lock:
+            with self.connection:
+                self.connection.executemany('DELETE FROM outbox WHERE message_id = ?', [(message_id,) for message_id in message_ids])
+
+    def _post(self, webhook_url, payload):
+        # Returns True when delivered or permanently rejected, False to keep it for later
+        for attempt in range(self.max_retries + 1):
+            try:
+                response = self.session.post(webhook_url, json=payload, timeout=self.timeout)
+            except requests.exceptions.RequestException as e:
+                print(f"Failed to send message to Discord: {e}")
+            else:
+                if response.status_code == 429:
+                    delay = retry_after_seconds(response)
+                    print(f"Discord rate limited, retrying in {delay:.2f}s")
+                    self.stopping.wait(delay)
+                    continue
+                if response.status_code < 300:
+                    # Wait out the bucket instead of running into a 429
+                    if response.headers.get('X-RateLimit-Remaining') == '0':
+                        self.stopping.wait(float(response.headers.get('X-RateLimit-Reset-After', 0)))
+                    return True
+                if response.status_code < 500:
+                    print(f"Discord rejected a message, status code: {response.status_code}")
+                    return True
+                print(f"Failed to send message to Discord, status code: {response.status_code}")
+            if attempt < self.max_retries:
+                self.stopping.wait(backoff_delay(attempt, self.base_delay, self.max_delay))
+        return False
+
+    def _send_pending(self):
+        for webhook_url, payload, message_ids in coalesce(self._load()):
+            if not self._post(webhook_url, payload):
+                # Still undelivered; it stays in the outbox for the next round or the next run
+                return False
+            self._delete(message_ids)
+            self.sent += len(message_ids)
+        return True
+
+    def _run(self):
+        while not self.stopping.is_set():
+            self.wakeup.wait()
+            self.wakeup.clear()
+            # Give a burst of messages a moment to arrive so they go out together
+            self.stopping.wait(self.batch_window)
+            if not self._send_pending() and not self.stopping.is_set():
+                self.stopping.wait(self.max_delay)
+                self.wakeup.set()
+        self._send_pending()
+
+    def flush(self, timeout=30.0):
+        # Blocks until the outbox is empty or the timeout passes; returns whether it emptied
+        deadline = time.monotonic() + timeout
+        self.wakeup.set()
+        while self.pending():
+            if time.monotonic() >= deadline:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def close(self, timeout=30.0):
+        self.flush(timeout)
+        self.stopping.set()
+        self.wakeup.set()
+        self.thread.join(timeout)
+        with self.lock:
+            self.connection.close()
+
+if __name__ == "__main__":
+    # Usage: python discord_notifier.py [messages]
+    # Sends a burst to a local fake webhook that rate limits every few posts
+    import tempfile
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    received = []
+
+    class FakeWebhook(BaseHTTPRequestHandler):
+        def do_POST(self):
+            payload = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            if len(received) % 3 == 2 and not getattr(self.server, 'limited', False):
+                self.server.limited = True
+                body = json.dumps({'retry_after': 0.2}).encode('utf-8')
+                self.send_response(429)
+                self.send_header('Content-Type', 'application/json')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+                return
+            self.server.limited = False
+            received.append(payload)
+            self.send_response(204)
+            self.end_headers()
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeWebhook)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    webhook_url = f"http://127.0.0.1:{server.server_port}/webhook"
+    outbox_path = os.path.join(tempfile.mkdtemp(), 'discord_outbox.db')
+
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50
+    notifier = DiscordNotifier(outbox_path, batch_window=0.5)
+    start = time.perf_counter()
+    for i in range(count):
+        if i % 5 == 0:
+            notifier.notify(webhook_url, embed={'title': f'Ticket {i}'}, username='Ticket Bot')
+        else:
+            notifier.notify(webhook_url, f"Card {i} has been flagged!")
+    notifier.flush()
+    elapsed = time.perf_counter() - start
+    pending = notifier.pending()
+    notifier.close()
+    server.shutdown()
+    print(f"{notifier.sent} of {count} messages delivered in {len(received)} posts in {elapsed:.2f}s, {pending} pending")
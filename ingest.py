@@ -0,0 +1,198 @@
+import hashlib
+import os
+import sqlite3
+import sys
+import time
+import pandas as pd
+from sqlite_writer import configure_connection
+
+# Loads CSV and XLSX files into SQLite in fixed-size chunks, so memory stays
+# flat however large the file is. Rows are upserted on the table's key inside
+# one transaction per chunk; rows that are no longer in the file are removed
+# at the end, which gives the same result as rewriting the table without
+# dropping it. Files already ingested unchanged (same size and mtime, or same
+# content hash) are skipped. With no key columns, rows are keyed by their
+# position in the file, so duplicate rows are all kept. A table of the same
+# name with other columns or another key (e.g. one written by
+# DataFrame.to_sql) is dropped and rebuilt.
+
+SQL_TO_PANDAS = {
+    'TEXT': 'string',
+    'REAL': 'float64',
+    'INTEGER': 'Int64',
+}
+
+INGEST_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS ingested_files (
+    table_name TEXT NOT NULL,
+    source_path TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    sha1 TEXT NOT NULL,
+    rows INTEGER NOT NULL,
+    ingested_at INTEGER NOT NULL,
+    PRIMARY KEY (table_name, source_path)
+);
+'''
+
+# Key column holding each row's 1-based position among the file's data rows
+ROW_NUMBER_COLUMN = 'row_number'
+
+def file_sha1(path):
+    digest = hashlib.sha1()
+    with open(path, 'rb') as source:
+        for block in iter(lambda: source.read(1 << 20), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+def table_matches(connection, table, columns, key_columns):
+    # True when the table doesn't exist yet or already has these columns and this key
+    info = connection.execute(f'PRAGMA table_info("{table}")').fetchall()
+    if not info:
+        return True
+    existing = {row[1] for row in info}
+    primary_key = [row[1] for row in sorted(info, key=lambda row: row[5]) if row[5]]
+    return existing == set(columns) | {'ingest_id'} and primary_key == list(key_columns)
+
+def create_table(connection, table, columns, key_columns):
+    if not table_matches(connection, table, columns, key_columns):
+        with connection:
+            connection.execute(f'DROP TABLE "{table}"')
+            connection.execute('DELETE FROM ingested_files WHERE table_name = ?', (table,))
+        print(f"Rebuilding {table}, its columns or key don't match this ingest")
+    column_sql = ', '.join(f'"{name}" {sql_type}' for name, sql_type in columns.items())
+    connection.execute(f'''
+    CREATE TABLE IF NOT EXISTS "{table}" (
+        {column_sql},
+        ingest_id INTEGER NOT NULL,
+        PRIMARY KEY ({', '.join(f'"{name}"' for name in key_columns)})
+    )
+    ''')
+    connection.execute(f'CREATE INDEX IF NOT EXISTS "idx_{table}_ingest_id" ON "{table}" (ingest_id)')
+
+def upsert_sql(table, columns, key_columns):
+    names = list(columns) + ['ingest_id']
+    value_columns = [name for name in columns if name not in key_columns]
+    updates = ', '.join(f'"{name}" = excluded."{name}"' for name in value_columns + ['ingest_id'])
+    return f'''
+    INSERT INTO "{table}" ({', '.join(f'"{name}"' for name in names)})
+    VALUES ({', '.join('?' for _ in names)})
+    ON CONFLICT ({', '.join(f'"{name}"' for name in key_columns)}) DO UPDATE SET {updates}
+    '''
+
+def read_csv_chunks(path, columns, chunksize):
+    dtypes = {name: SQL_TO_PANDAS[sql_type] for name, sql_type in columns.items()}
+    yield from pd.read_csv(path, usecols=list(columns), dtype=dtypes, chunksize=chunksize)
+
+def read_xlsx_chunks(path, columns, chunksize, sheet_name=None):
+    # openpyxl's read-only mode streams rows instead of loading the whole workbook
+    from openpyxl import load_workbook
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook[sheet_name] if sheet_name else workbook.active
+        rows = sheet.iter_rows(values_only=True)
+        header = [str(value) if value is not None else '' for value in next(rows, ())]
+        missing = [name for name in columns if name not in header]
+        if missing:
+            raise ValueError(f"Columns {missing} not found in {path}")
+        positions = [header.index(name) for name in columns]
+
+        chunk = []
+        for row in rows:
+            chunk.append([row[position] if position < len(row) else None for position in positions])
+            if len(chunk) >= chunksize:
+                yield to_frame(chunk, columns)
+                chunk = []
+        if chunk:
+            yield to_frame(chunk, columns)
+    finally:
+        workbook.close()
+
+def to_frame(rows, columns):
+    frame = pd.DataFrame(rows, columns=list(columns))
+    return frame.astype({name: SQL_TO_PANDAS[sql_type] for name, sql_type in columns.items()})
+
+def read_chunks(path, columns, chunksize):
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return read_csv_chunks(path, columns, chunksize)
+    if extension in ('.xlsx', '.xlsm'):
+        return read_xlsx_chunks(path, columns, chunksize)
+    raise ValueError(f"Unsupported file type {extension}, expected .csv or .xlsx")
+
+def ingest_file(path, db_path, table, columns, key_columns=(), required=(), chunksize=50000):
+    # columns: {name: 'TEXT' | 'REAL' | 'INTEGER'}; rows missing a `required` column are skipped.
+    # Without key_columns rows are keyed by ROW_NUMBER_COLUMN.
+    # Returns the number of rows now in the table from this file, or None when it was unchanged.
+    if not os.path.exists(path):
+        raise FileNotFoundError(f"The file {path} does not exist.")
+    source_path = os.path.abspath(path)
+    stat = os.stat(path)
+    read_columns = columns
+    key_columns = list(key_columns) or [ROW_NUMBER_COLUMN]
+    numbered = ROW_NUMBER_COLUMN in key_columns and ROW_NUMBER_COLUMN not in columns
+    if numbered:
+        columns = {**columns, ROW_NUMBER_COLUMN: 'INTEGER'}
+
+    connection = sqlite3.connect(db_path)
+    try:
+        configure_connection(connection)
+        connection.executescript(INGEST_SCHEMA)
+        create_table(connection, table, columns, key_columns)
+
+        previous = connection.execute('SELECT size, mtime_ns, sha1 FROM ingested_files WHERE table_name = ? AND source_path = ?',
+                                      (table, source_path)).fetchone()
+        if previous and previous[:2] == (stat.st_size, stat.st_mtime_ns):
+            print(f"{path} is unchanged since it was last ingested into {table}")
+            return None
+        sha1 = file_sha1(path)
+        if previous and previous[2] == sha1:
+            with connection:
+                connection.execute('UPDATE ingested_files SET mtime_ns = ? WHERE table_name = ? AND source_path = ?',
+                                   (stat.st_mtime_ns, table, source_path))
+            print(f"{path} has the same content as when it was last ingested into {table}")
+            return None
+
+        ingest_id = int(time.time() * 1000)
+        insert_sql = upsert_sql(table, columns, key_columns)
+        required = list(required) + [name for name in key_columns if name not in required]
+        start = time.perf_counter()
+        read = 0
+        written = 0
+        for chunk in read_chunks(path, read_columns, chunksize):
+            if numbered:
+                chunk[ROW_NUMBER_COLUMN] = range(read + 1, read + len(chunk) + 1)
+            read += len(chunk)
+            chunk = chunk.dropna(subset=required)
+            rows = chunk.astype(object).where(chunk.notna(), None).itertuples(index=False, name=None)
+            with connection:
+                connection.executemany(insert_sql, [row + (ingest_id,) for row in rows])
+            written += len(chunk)
+            elapsed = time.perf_counter() - start
+            print(f"{written} rows into {table} ({written / elapsed:,.0f} rows/s)")
+
+        with connection:
+            # Rows the file no longer has
+            removed = connection.execute(f'DELETE FROM "{table}" WHERE ingest_id != ?', (ingest_id,)).rowcount
+            # Rows sharing a key were upserted into one, so count what was stored
+            total = connection.execute(f'SELECT COUNT(*) FROM "{table}" WHERE ingest_id = ?', (ingest_id,)).fetchone()[0]
+            connection.execute('''
+            INSERT OR REPLACE INTO ingested_files (table_name, source_path, size, mtime_ns, sha1, rows, ingested_at)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ''', (table, source_path, stat.st_size, stat.st_mtime_ns, sha1, total, int(time.time())))
+        elapsed = time.perf_counter() - start
+        print(f"Ingested {total} rows from {path} into {table} in {elapsed:.2f}s "
+              f"({total / elapsed if elapsed else 0:,.0f} rows/s), removed {removed} stale rows")
+        return total
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    # Usage: python ingest.py input.csv|input.xlsx output.db table key_column[,key_column...] column:TYPE [column:TYPE ...]
+    # A key of row_number keys rows by their position in the file
+    if len(sys.argv) < 6:
+        print("Usage: python ingest.py input.csv output.db table key_column[,key_column...]|row_number column:TYPE [column:TYPE ...]")
+        sys.exit(1)
+    input_path, output_db, table_name, keys = sys.argv[1:5]
+    column_types = dict(spec.split(':', 1) for spec in sys.argv[5:])
+    ingest_file(input_path, output_db, table_name, {name: sql_type.upper() for name, sql_type in column_types.items()}, keys.split(','))
@@ -0,0 +1,88 @@
+import hashlib
+import json
+import os
+import threading
+
+# Pages built from a snapshot never change until the next one is published, so
+# each page is built once per snapshot and kept in memory, with a JSON copy on
+# disk so a restarted app doesn't rebuild it either. The cache key is the
+# snapshot's path, size and mtime: publishing a new snapshot (or migrating one
+# in place) changes it and the next request rebuilds. The key also carries a
+# hash of the templates and code that build the pages, so a deploy doesn't
+# serve HTML left on disk by the previous version.
+CACHE_DIR = 'page_cache'
+
+class CachedPage:
+    def __init__(self, key, html, last_modified):
+        self.key = key
+        self.html = html
+        self.last_modified = last_modified
+        self.etag = hashlib.sha1(key.encode('utf-8')).hexdigest()
+
+def snapshot_cache_key(snapshot_path):
+    stat = os.stat(snapshot_path)
+    return f"{os.path.basename(snapshot_path)}:{stat.st_size}:{stat.st_mtime_ns}"
+
+def code_version(paths):
+    # Hash of the contents of every file in `paths` (files or directories)
+    digest = hashlib.sha1()
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file_path in files:
+            digest.update(os.path.relpath(file_path, path).encode('utf-8'))
+            with open(file_path, 'rb') as source:
+                digest.update(source.read())
+    return digest.hexdigest()[:12]
+
+class PageCache:
+    def __init__(self, base_path, version_paths=()):
+        # version_paths: templates and modules the pages are rendered from
+        self.cache_dir = os.path.join(base_path, CACHE_DIR)
+        self.version = code_version(version_paths)
+        self.pages = {}
+        self.lock = threading.Lock()
+
+    def get_path(self, page_name):
+        return os.path.join(self.cache_dir, f'{page_name}.json')
+
+    def load(self, page_name, key):
+        try:
+            with open(self.get_path(page_name), encoding='utf-8') as cache_file:
+                stored = json.load(cache_file)
+        except (FileNotFoundError, ValueError):
+            return None
+        if stored.get('key') != key:
+            return None
+        return CachedPage(key, stored['html'], stored['last_modified'])
+
+    def store(self, page_name, page):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        cache_path = self.get_path(page_name)
+        temp_path = cache_path + '.tmp'
+        with open(temp_path, 'w', encoding='utf-8') as cache_file:
+            json.dump({'key': page.key, 'html': page.html, 'last_modified': page.last_modified}, cache_file)
+        os.replace(temp_path, cache_path)
+
+    def get(self, page_name, snapshot_path, build):
+        # build() returns the rendered HTML; it runs at most once per snapshot
+        key = f"{snapshot_cache_key(snapshot_path)}:{self.version}"
+        page = self.pages.get(page_name)
+        if page is not None and page.key == key:
+            return page
+
+        with self.lock:
+            page = self.pages.get(page_name)
+            if page is not None and page.key == key:
+                return page
+            page = self.load(page_name, key)
+            if page is None:
+                page = CachedPage(key, build(), os.path.getmtime(snapshot_path))
+                try:
+                    self.store(page_name, page)
+                except OSError as e:
+                    print(f"Could not write page cache for {page_name}: {e}")
+            self.pages[page_name] = page
+            return page
@@ -0,0 +1,140 @@
+import threading
+import time
+from collections import deque
+from selenium.webdriver.support.ui import WebDriverWait
+from selenium.common.exceptions import TimeoutException
+
+# Listing table fields, one entry per price element. Lists are paired by index
+# like the old zip() over separate find_elements calls; a field is null when
+# its list ran out.
+LISTINGS_JS = """
+const text = (el) => el ? el.innerText.trim() : '';
+const all = (selector) => Array.from(document.querySelectorAll(selector));
+
+const prices = all('.listing-item__listing-data__info__price');
+const stocks = all('.add-to-cart__available').slice(1);
+const sellers = all('.listing-item__listing-data__seller .seller-info__name');
+const sales = all('.listing-item__listing-data__seller .seller-info__sales');
+const sellerDivs = all('.listing-item__listing-data__seller');
+
+const listings = prices.map((price, i) => ({
+    price: text(price),
+    stock: stocks[i] ? text(stocks[i]) : null,
+    shipping: price.parentElement ? text(price.parentElement.querySelector('.shipping-messages__price')) || null : null,
+    seller: sellers[i] ? text(sellers[i]) : null,
+    sales: sales[i] ? text(sales[i]) : null,
+    direct: sellerDivs[i] ? sellerDivs[i].querySelector('a[title="Direct Seller"]') !== null : null
+}));
+"""
+
+EXTRACT_LISTINGS_JS = LISTINGS_JS + "return listings;"
+
+# Raw text of every field the scrapers read, collected in one execute_script call.
+# Text is returned as rendered; each scraper applies its own cleanup.
+EXTRACT_PAGE_JS = LISTINGS_JS + """
+const image = all('img').map((img) => img.getAttribute('src') || '')
+    .find((src) => src.includes('https://tcgplayer-cdn.tcgplayer.com'));
+
+const spotlightStock = document.querySelector('.add-to-cart__available');
+return {
+    name: text(document.querySelector('h1.product-details__name')),
+    set: text(document.querySelector('span[data-testid="lblProductDetailsSetName"]')),
+    number: text(document.querySelector('span[data-v-b277cce0]')),
+    image: image || null,
+    listings: listings,
+    spotlight: {
+        price: text(document.querySelector('.spotlight__price')) || null,
+        stock: spotlightStock ? text(spotlightStock) : null,
+        direct: document.querySelector('.spotlight__banner.direct') !== null
+    }
+};
+"""
+
+# Cheap fingerprint of how far the page has rendered, polled while waiting
+PAGE_SIGNATURE_JS = """
+const name = document.querySelector('h1.product-details__name');
+if (!name || !name.innerText.trim() || document.readyState !== 'complete') {
+    return null;
+}
+return {
+    listings: document.querySelectorAll('.listing-item__listing-data__info__price').length,
+    available: document.querySelectorAll('.add-to-cart__available').length,
+    spotlight: document.querySelector('.spotlight__price') !== null
+};
+"""
+
+class PageSettled:
+    """WebDriverWait condition: the product name is rendered and either listings
+    are on the page or nothing has changed for `quiet_period` seconds (a card
+    with no listings or no spotlight)."""
+
+    def __init__(self, quiet_period=1.0):
+        self.quiet_period = quiet_period
+        self.last_signature = None
+        self.stable_since = None
+
+    def __call__(self, driver):
+        signature = driver.execute_script(PAGE_SIGNATURE_JS)
+        if signature is None:
+            self.last_signature = None
+            return False
+        # The first .add-to-cart__available is the spotlight's (LISTINGS_JS skips it),
+        # so every listing has its stock once there is one more than listings
+        if signature['listings'] and signature['available'] > signature['listings']:
+            return True
+
+        now = time.monotonic()
+        if signature != self.last_signature:
+            self.last_signature = signature
+            self.stable_since = now
+            return False
+        return now - self.stable_since >= self.quiet_period
+
+class AdaptiveTimeout:
+    """Page-settle timeout derived from the p95 of recently observed settle times.
+    A wait that times out is recorded at the time it gave up, so when pages slow
+    down and more than 5% time out, the p95 reaches the timeout and the next one
+    is `factor` times longer (up to `maximum`)."""
+
+    def __init__(self, initial=10.0, minimum=3.0, maximum=30.0, factor=1.5, window=200, min_samples=10):
+        self.initial = initial
+        self.minimum = minimum
+        self.maximum = maximum
+        self.factor = factor
+        self.min_samples = min_samples
+        self.samples = deque(maxlen=window)
+        self.lock = threading.Lock()
+
+    def record(self, seconds):
+        with self.lock:
+            self.samples.append(seconds)
+
+    def current(self):
+        with self.lock:
+            if len(self.samples) < self.min_samples:
+                return self.initial
+            ordered = sorted(self.samples)
+        p95 = ordered[min(len(ordered) - 1, int(0.95 * len(ordered)))]
+        return max(self.minimum, min(self.maximum, p95 * self.factor))
+
+def wait_for_page_settled(driver, page_timeout, quiet_period=1.0):
+    start = time.monotonic()
+    settled = True
+    try:
+        WebDriverWait(driver, page_timeout.current(), poll_frequency=0.25).until(PageSettled(quiet_period))
+    except TimeoutException:
+        settled = False
+    page_timeout.record(time.monotonic() - start)
+    return settled
+
+def extract_page(driver):
+    return driver.execute_script(EXTRACT_PAGE_JS)
+
+def extract_listings(driver):
+    return driver.execute_script(EXTRACT_LISTINGS_JS)
+
+def load_page(driver, url, page_timeout, quiet_period=1.0):
+    driver.get(url)
+    if not wait_for_page_settled(driver, page_timeout, quiet_period):
+        print(f"Page did not settle within {page_timeout.current():.1f}s, reading what rendered: {url}")
+    return extract_page(driver)
@@ -0,0 +1,126 @@
+import os
+import sqlite3
+import sys
+from catalog import LEGACY_PRICE_SQL, NORMALIZED_PRICE_SQL
+
+# Compares two snapshots inside SQLite. Each side is reduced to one row per
+# (name, label, box_name) in a temp table keyed on that triple, so the join is
+# a primary key lookup per card and nothing but the differences reaches Python.
+# A price change is only reported when it moves by at least `min_change`
+# dollars AND `min_percent` percent, so float jitter and cent-level noise stay quiet.
+# Prices are compared rounded to the cent unless `precision` is None. Both
+# snapshots are opened read-only: a missing file is an error, never a new empty one.
+DEFAULT_MIN_CHANGE = 0.25
+DEFAULT_MIN_PERCENT = 5.0
+
+def is_normalized_schema(connection, schema):
+    row = connection.execute(f"SELECT type FROM {schema}.sqlite_master WHERE name = 'card_data'").fetchone()
+    return row is not None and row[0] == 'view'
+
+def load_card_prices(connection, schema, table_name, precision=2):
+    normalized = is_normalized_schema(connection, schema)
+    price_sql = NORMALIZED_PRICE_SQL if normalized else LEGACY_PRICE_SQL
+    if precision is not None:
+        price_sql = f'ROUND({price_sql}, {int(precision)})'
+    connection.execute(f'DROP TABLE IF EXISTS temp.{table_name}')
+    connection.execute(f'''
+    CREATE TEMP TABLE {table_name} (
+        name TEXT NOT NULL,
+        label TEXT NOT NULL,
+        box_name TEXT NOT NULL,
+        price REAL,
+        PRIMARY KEY (name, label, box_name)
+    ) WITHOUT ROWID
+    ''')
+    connection.execute(f'''
+    INSERT INTO {table_name} (name, label, box_name, price)
+    SELECT name, label, box_name, {price_sql}
+    FROM {schema}.{'cards' if normalized else 'card_data'}
+    WHERE name IS NOT NULL AND label IS NOT NULL AND box_name IS NOT NULL
+    GROUP BY name, label, box_name
+    ''')
+
+def diff_snapshots(today_db_path, yesterday_db_path, min_change=DEFAULT_MIN_CHANGE, min_percent=DEFAULT_MIN_PERCENT, precision=2):
+    # Returns {'added': [...], 'removed': [...], 'changed': [...], 'boxes': {box_name: {...}}}
+    connection = sqlite3.connect(f"file:{today_db_path}?mode=ro", uri=True)
+    try:
+        connection.execute('ATTACH DATABASE ? AS previous', (f"file:{yesterday_db_path}?mode=ro",))
+        load_card_prices(connection, 'main', 'today_prices', precision)
+        load_card_prices(connection, 'previous', 'yesterday_prices', precision)
+
+        added = connection.execute('''
+        SELECT t.name, t.label, t.box_name, t.price
+        FROM today_prices t
+        WHERE NOT EXISTS (SELECT 1 FROM yesterday_prices y WHERE y.name = t.name AND y.label = t.label AND y.box_name = t.box_name)
+        ORDER BY t.box_name, t.name, t.label
+        ''').fetchall()
+        removed = connection.execute('''
+        SELECT y.name, y.label, y.box_name, y.price
+        FROM yesterday_prices y
+        WHERE NOT EXISTS (SELECT 1 FROM today_prices t WHERE t.name = y.name AND t.label = y.label AND t.box_name = y.box_name)
+        ORDER BY y.box_name, y.name, y.label
+        ''').fetchall()
+        # A card gaining or losing its price always counts as a change
+        changed = connection.execute('''
+        SELECT t.name, t.label, t.box_name, y.price, t.price,
+            ROUND(t.price - y.price, 2),
+            CASE WHEN y.price > 0 THEN ROUND((t.price - y.price) * 100.0 / y.price, 1) END
+        FROM today_prices t
+        JOIN yesterday_prices y ON y.name = t.name AND y.label = t.label AND y.box_name = t.box_name
+        WHERE (t.price IS NULL) != (y.price IS NULL)
+            OR (t.price != y.price AND ABS(t.price - y.price) >= ? AND (y.price = 0 OR ABS(t.price - y.price) * 100.0 / y.price >= ?))
+        ORDER BY t.box_name, ABS(COALESCE(t.price, 0) - COALESCE(y.price, 0)) DESC
+        ''', (min_change - 0.005, min_percent)).fetchall()
+    finally:
+        connection.close()
+
+    boxes = {}
+    def box_summary(box_name):
+        return boxes.setdefault(box_name, {'added': 0, 'removed': 0, 'changed': 0, 'up': 0, 'down': 0, 'net_change': 0.0})
+    for _, _, box_name, _ in added:
+        box_summary(box_name)['added'] += 1
+    for _, _, box_name, _ in removed:
+        box_summary(box_name)['removed'] += 1
+    for _, _, box_name, _, _, change, _ in changed:
+        summary = box_summary(box_name)
+        summary['changed'] += 1
+        if change is not None:
+            summary['up' if change > 0 else 'down'] += 1
+            summary['net_change'] = round(summary['net_change'] + change, 2)
+
+    return {
+        'added': [{'name': name, 'label': label, 'box_name': box_name, 'price': price} for name, label, box_name, price in added],
+        'removed': [{'name': name, 'label': label, 'box_name': box_name, 'price': price} for name, label, box_name, price in removed],
+        'changed': [{'name': name, 'label': label, 'box_name': box_name, 'yesterday': yesterday, 'today': today, 'change': change, 'percent': percent}
+                    for name, label, box_name, yesterday, today, change, percent in changed],
+        'boxes': dict(sorted(boxes.items())),
+    }
+
+def format_price(price):
+    return f"${price:,.2f}" if price is not None else "NA"
+
+def format_diff_message(diff):
+    if not (diff['added'] or diff['removed'] or diff['changed']):
+        return None
+    lines = ["Price changes between yesterday and today:"]
+    for box_name, summary in diff['boxes'].items():
+        lines.append(f"**{box_name}**: {summary['changed']} changed ({summary['up']} up, {summary['down']} down, net {summary['net_change']:+.2f}), "
+                     f"{summary['added']} added, {summary['removed']} removed")
+    for card in diff['changed']:
+        percent = f" ({card['percent']:+.1f}%)" if card['percent'] is not None else ""
+        lines.append(f"{card['name']} [{card['label']}] in {card['box_name']} - Yesterday: {format_price(card['yesterday'])}, Today: {format_price(card['today'])}{percent}")
+    for card in diff['added']:
+        lines.append(f"Added: {card['name']} [{card['label']}] in {card['box_name']} at {format_price(card['price'])}")
+    for card in diff['removed']:
+        lines.append(f"Removed: {card['name']} [{card['label']}] in {card['box_name']} (was {format_price(card['price'])})")
+    return "\n".join(lines) + "\n"
+
+if __name__ == "__main__":
+    # Usage: python price_diff.py today.db yesterday.db [min_change] [min_percent]
+    if len(sys.argv) < 3:
+        print(f"Usage: python {os.path.basename(__file__)} today.db yesterday.db [min_change] [min_percent]")
+        sys.exit(1)
+    diff = diff_snapshots(sys.argv[1], sys.argv[2],
+                          float(sys.argv[3]) if len(sys.argv) > 3 else DEFAULT_MIN_CHANGE,
+                          float(sys.argv[4]) if len(sys.argv) > 4 else DEFAULT_MIN_PERCENT)
+    print(format_diff_message(diff) or "No price changes above the thresholds.")
@@ -0,0 +1,168 @@
+import os
+import pathlib
+import sqlite3
+import time
+from datetime import datetime, timedelta, timezone
+from snapshots import list_snapshots
+
+DAY = 24 * 60 * 60
+
+# Append-only price history. Cards get a small integer id; price_points is
+# clustered on (card_id, scraped_at) so one card's trend over any window is a
+# single primary key range scan.
+HISTORY_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS cards (
+    card_id INTEGER PRIMARY KEY,
+    name TEXT NOT NULL,
+    label TEXT NOT NULL,
+    box_name TEXT NOT NULL,
+    UNIQUE (name, label, box_name)
+);
+
+CREATE TABLE IF NOT EXISTS price_points (
+    card_id INTEGER NOT NULL,
+    scraped_at INTEGER NOT NULL,
+    price_avg REAL,
+    min_price REAL,
+    max_price REAL,
+    listings INTEGER NOT NULL,
+    PRIMARY KEY (card_id, scraped_at)
+) WITHOUT ROWID;
+
+CREATE INDEX IF NOT EXISTS idx_price_points_scraped_at ON price_points (scraped_at);
+
+CREATE TABLE IF NOT EXISTS price_rollups (
+    card_id INTEGER NOT NULL,
+    period TEXT NOT NULL,
+    period_start INTEGER NOT NULL,
+    min_price REAL,
+    avg_price REAL,
+    max_price REAL,
+    samples INTEGER NOT NULL,
+    PRIMARY KEY (card_id, period, period_start)
+) WITHOUT ROWID;
+
+CREATE TABLE IF NOT EXISTS recorded_snapshots (
+    snapshot TEXT PRIMARY KEY,
+    scraped_at INTEGER NOT NULL
+);
+'''
+
+LISTING_PRICE_SQL = "CAST(REPLACE(REPLACE(price, '$', ''), ',', '') AS REAL)"
+
+def get_history_path(base_path):
+    return os.path.join(base_path, 'price_history.db')
+
+def connect_history(history_path):
+    connection = sqlite3.connect(history_path)
+    connection.executescript(HISTORY_SCHEMA)
+    return connection
+
+def connect_history_read_only(history_path):
+    # For readers such as the web app: never creates the file or the schema; None when there is no history yet
+    if not os.path.exists(history_path):
+        return None
+    return sqlite3.connect(f"{pathlib.Path(os.path.abspath(history_path)).as_uri()}?mode=ro", uri=True)
+
+def period_bounds(period, timestamp):
+    moment = datetime.fromtimestamp(timestamp, tz=timezone.utc)
+    day_start = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    if period == 'day':
+        start, end = day_start, day_start + timedelta(days=1)
+    elif period == 'week':
+        start = day_start - timedelta(days=day_start.weekday())
+        end = start + timedelta(days=7)
+    elif period == 'month':
+        start = day_start.replace(day=1)
+        end = (start + timedelta(days=32)).replace(day=1)
+    else:
+        raise ValueError(f"Unknown rollup period: {period}")
+    return int(start.timestamp()), int(end.timestamp())
+
+def update_rollups(connection, scraped_at):
+    # Only the day/week/month buckets containing the new points can change
+    for period in ('day', 'week', 'month'):
+        start, end = period_bounds(period, scraped_at)
+        connection.execute('''
+        INSERT OR REPLACE INTO price_rollups (card_id, period, period_start, min_price, avg_price, max_price, samples)
+        SELECT card_id, ?, ?, MIN(price_avg), AVG(price_avg), MAX(price_avg), COUNT(price_avg)
+        FROM price_points
+        WHERE scraped_at >= ? AND scraped_at < ?
+        GROUP BY card_id
+        ''', (period, start, start, end))
+
+def record_snapshot(history_path, snapshot_path, scraped_at=None):
+    scraped_at = int(scraped_at if scraped_at is not None else time.time())
+    snapshot_name = os.path.basename(snapshot_path)
+    connection = connect_history(history_path)
+    try:
+        if connection.execute('SELECT 1 FROM recorded_snapshots WHERE snapshot = ?', (snapshot_name,)).fetchone():
+            return 0
+
+        connection.execute('ATTACH DATABASE ? AS snapshot', (snapshot_path,))
+        try:
+            with connection:
+                connection.execute('''
+                INSERT OR IGNORE INTO cards (name, label, box_name)
+                SELECT DISTINCT name, label, box_name FROM snapshot.card_data
+                WHERE name IS NOT NULL AND label IS NOT NULL AND box_name IS NOT NULL
+                ''')
+                cursor = connection.execute(f'''
+                INSERT OR REPLACE INTO price_points (card_id, scraped_at, price_avg, min_price, max_price, listings)
+                SELECT c.card_id, ?,
+                    MAX(CASE WHEN typeof(d.price_avg) IN ('real', 'integer') THEN d.price_avg END),
+                    MIN(CASE WHEN d.price LIKE '$%' THEN {LISTING_PRICE_SQL} END),
+                    MAX(CASE WHEN d.price LIKE '$%' THEN {LISTING_PRICE_SQL} END),
+                    COUNT(CASE WHEN d.price LIKE '$%' THEN 1 END)
+                FROM snapshot.card_data d
+                JOIN cards c ON c.name = d.name AND c.label = d.label AND c.box_name = d.box_name
+                GROUP BY c.card_id
+                ''', (scraped_at,))
+                recorded = cursor.rowcount
+                update_rollups(connection, scraped_at)
+                connection.execute('INSERT INTO recorded_snapshots (snapshot, scraped_at) VALUES (?, ?)', (snapshot_name, scraped_at))
+        finally:
+            connection.execute('DETACH DATABASE snapshot')
+        return recorded
+    finally:
+        connection.close()
+
+def get_card_id(connection, name, label, box_name):
+    row = connection.execute('SELECT card_id FROM cards WHERE name = ? AND label = ? AND box_name = ?', (name, label, box_name)).fetchone()
+    return row[0] if row else None
+
+def get_price_trend(connection, name, label, box_name, days=90, now=None):
+    card_id = get_card_id(connection, name, label, box_name)
+    if card_id is None:
+        return []
+    since = int((now if now is not None else time.time()) - days * DAY)
+    return connection.execute('''
+    SELECT scraped_at, price_avg, min_price, max_price, listings
+    FROM price_points
+    WHERE card_id = ? AND scraped_at >= ?
+    ORDER BY scraped_at
+    ''', (card_id, since)).fetchall()
+
+def get_price_rollups(connection, name, label, box_name, period='day', days=90, now=None):
+    card_id = get_card_id(connection, name, label, box_name)
+    if card_id is None:
+        return []
+    since = int((now if now is not None else time.time()) - days * DAY)
+    return connection.execute('''
+    SELECT period_start, min_price, avg_price, max_price, samples
+    FROM price_rollups
+    WHERE card_id = ? AND period = ? AND period_start >= ?
+    ORDER BY period_start
+    ''', (card_id, period, period_bounds(period, since)[0])).fetchall()
+
+def backfill(base_path):
+    # Loads every snapshot still on disk, using the file's modification time as the scrape time
+    history_path = get_history_path(base_path)
+    legacy = [os.path.join(base_path, name) for name in ('pullbox_cards_yesterday.db', 'pullbox_cards.db')]
+    for snapshot_path in [path for path in legacy if os.path.exists(path)] + list_snapshots(base_path):
+        recorded = record_snapshot(history_path, snapshot_path, os.path.getmtime(snapshot_path))
+        print(f"Recorded {recorded} price points from {snapshot_path}")
+
+if __name__ == "__main__":
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    backfill(os.path.join(script_dir, 'databases'))
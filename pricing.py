@@ -0,0 +1,369 @@
+import os
+import sqlite3
+import statistics
+import sys
+import time
+import numpy as np
+from snapshots import current_snapshot_path, new_staging_path, publish_snapshot
+from schema import create_spotlights, has_spotlights, is_normalized
+
+# Float sums can land on the other side of a half-cent (or a 2-sigma edge) than
+# statistics' exact arithmetic; values this close are recomputed exactly
+TIE_TOLERANCE = 1e-6
+
+class GroupedPrices:
+    """All cards' listing prices in one flat array, with per-card sums,
+    means and sample standard deviations computed in a few array passes."""
+
+    def __init__(self, names, card_prices):
+        counts = np.array([len(card_prices[name]) for name in names], dtype=np.int64)
+        self.names = names
+        self.counts = counts
+        self.flat = np.fromiter((price for name in names for price in card_prices[name]), dtype=np.float64, count=int(counts.sum()))
+        self.group_ids = np.repeat(np.arange(len(names)), counts)
+        starts = np.concatenate(([0], np.cumsum(counts)[:-1])) if len(names) else np.zeros(0, dtype=np.int64)
+        self.positions = np.arange(len(self.flat)) - starts[self.group_ids]
+
+        self.mean, self.std = self.mean_std(np.ones(len(self.flat), dtype=bool))
+        self.first_10_count = np.minimum(counts, 10)
+        self.first_10_mean, self.first_10_std = self.mean_std(self.positions < 10)
+
+        # Prices within 2 standard deviations of their card's mean
+        within = np.abs(self.flat - self.mean[self.group_ids]) <= 2 * self.std[self.group_ids]
+        self.within_count = np.bincount(self.group_ids, weights=within, minlength=len(names))
+
+    def mean_std(self, mask):
+        size = len(self.names)
+        ids = self.group_ids[mask]
+        values = self.flat[mask]
+        counts = np.bincount(ids, minlength=size)
+        sums = np.bincount(ids, weights=values, minlength=size)
+        with np.errstate(invalid='ignore', divide='ignore'):
+            mean = sums / counts
+            squares = np.bincount(ids, weights=(values - mean[ids]) ** 2, minlength=size)
+            std = np.sqrt(squares / (counts - 1))
+        return mean, std
+
+def has_qualifying_seller(card_name, rows_by_column_4):
+    # Mirrors the original seller filter, which compares listing[4] and listing[5]
+    # (image_url and box_name in a card_data row) against the card
+    return any(int(listing[5].replace(' Sales', '')) >= 500 for listing in rows_by_column_4.get(card_name, ()))
+
+def near_half_cent(value):
+    cents = value * 100
+    return abs(cents - np.floor(cents) - 0.5) < TIE_TOLERANCE
+
+def within_two_std(value, mean, std, exact_prices):
+    if abs(abs(value - mean) - 2 * std) < TIE_TOLERANCE:
+        prices = exact_prices()
+        return abs(value - statistics.mean(prices)) <= 2 * statistics.stdev(prices)
+    return abs(value - mean) <= 2 * std
+
+def mean_of(approx_mean, exact_prices, exact=statistics.mean):
+    if near_half_cent(approx_mean):
+        return exact(exact_prices())
+    return float(approx_mean)
+
+def compute_box_prices(listings_data, spotlight_infos, card_prices):
+    names = list(spotlight_infos)
+    grouped = GroupedPrices(names, card_prices)
+
+    rows_by_column_4 = {}
+    for listing in listings_data:
+        rows_by_column_4.setdefault(listing[4], []).append(listing)
+
+    price_avgs = {}
+    for i, card_name in enumerate(names):
+        spotlight_data = spotlight_infos[card_name]
+        spotlight_price = spotlight_data[1]
+        spotlight_stock = spotlight_data[2]
+        spotlight_direct = spotlight_data[4]
+        prices = card_prices[card_name]
+        count = grouped.counts[i]
+
+        if spotlight_direct == "yes" and spotlight_stock != "NA" and int(spotlight_stock) >= 25:
+            # Spotlight price if it sits within 2 standard deviations of the first 10 listings
+            if grouped.first_10_count[i] > 1:
+                if within_two_std(float(spotlight_price), grouped.first_10_mean[i], grouped.first_10_std[i], lambda: prices[:10]):
+                    box_price = float(spotlight_price)
+                else:
+                    box_price = mean_of(grouped.mean[i], lambda: prices)
+            else:
+                box_price = mean_of(grouped.first_10_mean[i], lambda: prices[:10]) if grouped.first_10_count[i] else "NA"
+        else:
+            if count > 1:
+                if grouped.within_count[i] and has_qualifying_seller(card_name, rows_by_column_4):
+                    mean, std = statistics.mean(prices), statistics.stdev(prices)
+                    box_price = statistics.mean([price for price in prices if abs(price - mean) <= 2 * std])
+                else:
+                    box_price = mean_of(grouped.mean[i], lambda: prices)
+            else:
+                box_price = mean_of(grouped.mean[i], lambda: prices) if count else "NA"
+
+        price_avgs[card_name] = f"{box_price:.2f}" if box_price != "NA" else "NA"
+    return price_avgs
+
+def apply_box_price(listings_data, spotlight_infos, card_prices):
+    price_avgs = compute_box_prices(listings_data, spotlight_infos, card_prices)
+
+    # Update listings_data with the calculated price_avg in one pass
+    for i, listing in enumerate(listings_data):
+        price_avg = price_avgs.get(listing[0])
+        if price_avg is not None:
+            listings_data[i] = listing[:-1] + (price_avg,)
+    return listings_data
+
+# Repricing from stored listings: estimators work on every card at once and
+# return one price per card (NaN when a card has no priced listings). An
+# estimator registered with `exact` has estimates that land near a half cent
+# recomputed exactly, as mean_of does for the crawler. The estimator only
+# replaces the crawler's listing mean: a qualifying Direct spotlight still
+# wins, exactly as in compute_box_prices, so repricing with `mean` rewrites
+# every price_avg unchanged.
+
+ESTIMATORS = {}
+EXACT_ESTIMATORS = {}
+
+def register_estimator(name, exact=None):
+    def register(func):
+        ESTIMATORS[name] = func
+        EXACT_ESTIMATORS[name] = exact
+        return func
+    return register
+
+class ListingBatch:
+    """Stored listings for many cards, grouped by card, as flat arrays."""
+
+    def __init__(self, keys, group_ids, prices, shipping, stock, spotlights=None):
+        # Listings come in page order; spotlights: {key: (price, stock, direct, inferred)}
+        self.keys = keys
+        self.size = len(keys)
+        self.spotlights = spotlights or {}
+        self.page_prices = {key: [] for key in keys}
+        for group_id, price in zip(group_ids.tolist(), prices.tolist()):
+            self.page_prices[keys[group_id]].append(price)
+        order = np.lexsort((prices, group_ids))
+        self.group_ids = group_ids[order]
+        self.prices = prices[order]
+        self.shipping = shipping[order]
+        self.stock = stock[order]
+        self.counts = np.bincount(self.group_ids, minlength=self.size)
+        starts = np.concatenate(([0], np.cumsum(self.counts)[:-1])) if self.size else np.zeros(0, dtype=np.int64)
+        self.starts = starts
+        # Position of each listing within its card, cheapest first
+        self.ranks = np.arange(len(self.prices)) - starts[self.group_ids]
+
+    def group_mean(self, values, mask=None, weights=None):
+        ids = self.group_ids if mask is None else self.group_ids[mask]
+        values = values if mask is None else values[mask]
+        if weights is None:
+            weights = np.ones(len(values))
+        elif mask is not None:
+            weights = weights[mask]
+        with np.errstate(invalid='ignore', divide='ignore'):
+            return np.bincount(ids, weights=values * weights, minlength=self.size) / np.bincount(ids, weights=weights, minlength=self.size)
+
+@register_estimator('mean', exact=statistics.mean)
+def mean_estimator(batch):
+    # What get_listing_info produces for cards without a direct spotlight
+    return batch.group_mean(batch.prices)
+
+@register_estimator('median', exact=statistics.median)
+def median_estimator(batch):
+    result = np.full(batch.size, np.nan)
+    has_prices = batch.counts > 0
+    counts = batch.counts[has_prices]
+    starts = batch.starts[has_prices]
+    lower = batch.prices[starts + (counts - 1) // 2]
+    upper = batch.prices[starts + counts // 2]
+    result[has_prices] = (lower + upper) / 2
+    return result
+
+@register_estimator('trimmed_mean')
+def trimmed_mean_estimator(batch, proportion=0.1):
+    trim = np.floor(batch.counts * proportion).astype(np.int64)[batch.group_ids]
+    keep = (batch.ranks >= trim) & (batch.ranks < batch.counts[batch.group_ids] - trim)
+    return batch.group_mean(batch.prices, mask=keep)
+
+@register_estimator('lowest_3_with_shipping')
+def lowest_n_with_shipping_estimator(batch, n=3):
+    delivered = batch.prices + batch.shipping
+    order = np.lexsort((delivered, batch.group_ids))
+    delivered_ranks = np.empty(len(order), dtype=np.int64)
+    delivered_ranks[order] = batch.ranks
+    return batch.group_mean(delivered, mask=delivered_ranks < n)
+
+def load_listing_batch(connection):
+    normalized = is_normalized(connection)
+    if normalized:
+        rows = connection.execute('''
+        SELECT c.name, c.box_name, c.label, l.price, COALESCE(l.shipping, 0), COALESCE(l.stock, 0)
+        FROM listings l
+        JOIN cards c ON c.card_id = l.card_id
+        WHERE l.price IS NOT NULL
+        ORDER BY l.listing_id
+        ''').fetchall()
+        all_keys = connection.execute('SELECT DISTINCT name, box_name, label FROM cards').fetchall()
+    else:
+        rows = connection.execute('''
+        SELECT name, box_name, label,
+            CAST(REPLACE(REPLACE(price, '$', ''), ',', '') AS REAL),
+            CASE WHEN shipping LIKE '$%' THEN CAST(REPLACE(REPLACE(shipping, '$', ''), ',', '') AS REAL) ELSE 0 END,
+            CAST(stock AS INTEGER)
+        FROM card_data
+        WHERE price LIKE '$%'
+        ORDER BY rowid
+        ''').fetchall()
+        all_keys = connection.execute('SELECT DISTINCT name, box_name, label FROM card_data').fetchall()
+
+    spotlights = {}
+    if has_spotlights(connection):
+        for name, box_name, label, price, stock, direct, inferred in connection.execute(f'''
+        SELECT DISTINCT c.name, c.box_name, c.label, s.price, s.stock, s.direct, s.inferred
+        FROM spotlights s
+        JOIN {'cards' if normalized else 'card_data'} c ON c.url = s.url AND c.label = s.label AND c.box_name = s.box_name
+        '''):
+            spotlights[(name, box_name, label)] = (price, stock, direct, inferred)
+
+    key_index = {key: i for i, key in enumerate(all_keys)}
+    group_ids = np.fromiter((key_index[row[:3]] for row in rows), dtype=np.int64, count=len(rows))
+    prices = np.fromiter((row[3] for row in rows), dtype=np.float64, count=len(rows))
+    shipping = np.fromiter((row[4] for row in rows), dtype=np.float64, count=len(rows))
+    stock = np.fromiter((row[5] or 0 for row in rows), dtype=np.float64, count=len(rows))
+    return ListingBatch([tuple(key) for key in all_keys], group_ids, prices, shipping, stock, spotlights)
+
+def spotlight_qualifies(spotlight):
+    # compute_box_prices' test: a Direct spotlight with at least 25 in stock.
+    # An inferred spotlight is one the crawler already found qualifying.
+    if spotlight is None:
+        return False
+    price, stock, direct, inferred = spotlight
+    if inferred:
+        return True
+    return bool(direct) and price is not None and stock is not None and stock >= 25
+
+def estimate_prices(batch, estimator='mean'):
+    # Returns {key: price_avg text}, formatted once, as the crawler stores it
+    if estimator not in ESTIMATORS:
+        raise ValueError(f"Unknown estimator {estimator}, choose from {', '.join(sorted(ESTIMATORS))}")
+    estimates = ESTIMATORS[estimator](batch)
+    exact = EXACT_ESTIMATORS[estimator]
+    grouped = GroupedPrices(batch.keys, batch.page_prices)
+
+    price_avgs = {}
+    for i, key in enumerate(batch.keys):
+        prices = batch.page_prices[key]
+        spotlight = batch.spotlights.get(key)
+        if spotlight_qualifies(spotlight) and grouped.first_10_count[i] > 1 and \
+                within_two_std(spotlight[0], grouped.first_10_mean[i], grouped.first_10_std[i], lambda: prices[:10]):
+            box_price = spotlight[0]
+        elif np.isnan(estimates[i]):
+            box_price = "NA"
+        elif exact is not None:
+            box_price = mean_of(estimates[i], lambda: prices, exact)
+        else:
+            box_price = float(estimates[i])
+        price_avgs[key] = f"{box_price:.2f}" if box_price != "NA" else "NA"
+    return price_avgs
+
+def infer_spotlights(connection):
+    # Snapshots crawled before spotlights were stored: a card whose stored
+    # price_avg isn't the crawler's listing mean was priced from its Direct
+    # spotlight, so that price is recorded as an inferred spotlight
+    create_spotlights(connection)
+    table = 'cards' if is_normalized(connection) else 'card_data'
+    stored = connection.execute(f'''
+    SELECT c.name, c.box_name, c.label, MAX(c.url), MAX(c.price_avg)
+    FROM {table} c
+    WHERE NOT EXISTS (SELECT 1 FROM spotlights s WHERE s.url = c.url AND s.label = c.label AND s.box_name = c.box_name)
+    GROUP BY c.name, c.box_name, c.label
+    ''').fetchall()
+    if not stored:
+        return 0
+    means = estimate_prices(load_listing_batch(connection), "mean")
+    rows = []
+    for name, box_name, label, url, price_avg in stored:
+        try:
+            stored_price = float(price_avg)
+        except (TypeError, ValueError):
+            continue
+        mean = means.get((name, box_name, label), "NA")
+        if mean == "NA" or float(mean) != stored_price:
+            rows.append((url, label, box_name, stored_price))
+    with connection:
+        connection.executemany('''
+        INSERT OR IGNORE INTO spotlights (url, label, box_name, price, stock, direct, inferred)
+        VALUES (?, ?, ?, ?, NULL, 1, 1)
+        ''', rows)
+    return len(rows)
+
+def reprice_database(connection, estimator='mean'):
+    # Recomputes price_avg for every card from the listings already stored; no network access
+    infer_spotlights(connection)
+    price_avgs = estimate_prices(load_listing_batch(connection), estimator)
+    with connection:
+        if is_normalized(connection):
+            # The card_data trigger stores CAST(price_avg AS REAL), NULL for "NA"
+            connection.executemany(
+                'UPDATE cards SET price_avg = ? WHERE name = ? AND box_name = ? AND label = ?',
+                [(float(price) if price != "NA" else None, name, box_name, label) for (name, box_name, label), price in price_avgs.items()]
+            )
+        else:
+            connection.execute('CREATE INDEX IF NOT EXISTS idx_card_data_card ON card_data (name, box_name, label)')
+            connection.executemany(
+                'UPDATE card_data SET price_avg = ? WHERE name = ? AND box_name = ? AND label = ?',
+                [(price, name, box_name, label) for (name, box_name, label), price in price_avgs.items()]
+            )
+    return price_avgs
+
+def reprice_snapshot(base_path, estimator='mean', keep=7):
+    # Copies the live snapshot, reprices the copy and publishes it like a nightly crawl
+    source_path = current_snapshot_path(base_path)
+    if source_path is None:
+        raise FileNotFoundError(f"No published database found in {base_path}")
+    staging_path = new_staging_path(base_path)
+
+    source = sqlite3.connect(source_path)
+    staging = sqlite3.connect(staging_path)
+    try:
+        source.backup(staging)
+        start = time.perf_counter()
+        price_avgs = reprice_database(staging, estimator)
+        print(f"Repriced {len(price_avgs)} cards with the {estimator} estimator in {time.perf_counter() - start:.2f}s")
+    finally:
+        staging.close()
+        source.close()
+    return publish_snapshot(base_path, staging_path, keep=keep)
+
+def check_repricing(db_path):
+    # Repricing a snapshot with `mean` must rewrite every price_avg byte for byte;
+    # the snapshot is copied into memory and left untouched
+    source = sqlite3.connect(f"file:{db_path}?mode=ro", uri=True)
+    connection = sqlite3.connect(':memory:')
+    try:
+        source.backup(connection)
+        query = 'SELECT rowid, name, box_name, label, price_avg, typeof(price_avg) FROM card_data ORDER BY rowid, name, box_name, label'
+        before = connection.execute(query).fetchall()
+        reprice_database(connection, 'mean')
+        after = connection.execute(query).fetchall()
+    finally:
+        connection.close()
+        source.close()
+    return [(old, new) for old, new in zip(before, after) if old != new] + [(row, None) for row in before[len(after):]]
+
+if __name__ == "__main__":
+    # Usage: python pricing.py [estimator]
+    #        python pricing.py --check [db_path]   (mean repricing of a stored snapshot changes nothing)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    if sys.argv[1:2] == ['--check']:
+        db_path = sys.argv[2] if len(sys.argv) > 2 else current_snapshot_path(base_path)
+        differences = check_repricing(db_path)
+        for old, new in differences[:20]:
+            print(f"{old} -> {new}")
+        if differences:
+            print(f"{len(differences)} rows changed when repricing {db_path} with mean")
+            sys.exit(1)
+        print(f"Repricing {db_path} with mean left every price_avg unchanged")
+    else:
+        reprice_snapshot(base_path, sys.argv[1] if len(sys.argv) > 1 else 'mean')
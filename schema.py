@@ -0,0 +1,184 @@
+import os
+import sqlite3
+import sys
+import time
+from snapshots import current_snapshot_path, is_published, republish_snapshot
+
+# Typed, normalized storage for a scrape. One cards row per scraped page
+# (url, label, box_name); listings hold numeric price/shipping/stock, with NULL
+# where the page showed "NA". card_data is kept as a view in the old text
+# format, with INSTEAD OF triggers, so code that reads or writes the flat
+# layout keeps working.
+SCHEMA = '''
+CREATE TABLE IF NOT EXISTS scrape_runs (
+    run_id INTEGER PRIMARY KEY,
+    started_at INTEGER NOT NULL,
+    finished_at INTEGER,
+    backend TEXT,
+    cards INTEGER,
+    listings INTEGER
+);
+
+CREATE TABLE IF NOT EXISTS cards (
+    card_id INTEGER PRIMARY KEY,
+    url TEXT NOT NULL,
+    label TEXT NOT NULL,
+    box_name TEXT NOT NULL,
+    name TEXT NOT NULL,
+    "set" TEXT,
+    number_in_set TEXT,
+    image_url TEXT,
+    price_avg REAL,
+    UNIQUE (url, label, box_name)
+);
+
+CREATE INDEX IF NOT EXISTS idx_cards_name_box_label ON cards (name, box_name, label);
+CREATE INDEX IF NOT EXISTS idx_cards_box_name_label ON cards (box_name, name, label);
+
+CREATE TABLE IF NOT EXISTS listings (
+    listing_id INTEGER PRIMARY KEY,
+    card_id INTEGER NOT NULL REFERENCES cards (card_id),
+    price REAL,
+    shipping REAL,
+    stock INTEGER,
+    seller TEXT,
+    seller_sales INTEGER,
+    direct INTEGER
+);
+
+CREATE INDEX IF NOT EXISTS idx_listings_card ON listings (card_id);
+
+CREATE VIEW IF NOT EXISTS card_data AS
+SELECT c.name AS name,
+    c.label AS label,
+    c."set" AS "set",
+    c.number_in_set AS number_in_set,
+    c.image_url AS image_url,
+    c.box_name AS box_name,
+    c.url AS url,
+    CASE WHEN l.price IS NULL THEN 'NA'
+        ELSE printf('$%,d.%02d', CAST(ROUND(l.price * 100) AS INTEGER) / 100, CAST(ROUND(l.price * 100) AS INTEGER) % 100) END AS price,
+    CASE WHEN l.shipping IS NULL THEN 'NA'
+        ELSE printf('$%,d.%02d', CAST(ROUND(l.shipping * 100) AS INTEGER) / 100, CAST(ROUND(l.shipping * 100) AS INTEGER) % 100) END AS shipping,
+    COALESCE(CAST(l.stock AS TEXT), 'NA') AS stock,
+    COALESCE(c.price_avg, 'NA') AS price_avg
+FROM cards c
+JOIN listings l ON l.card_id = c.card_id;
+
+CREATE TRIGGER IF NOT EXISTS card_data_insert INSTEAD OF INSERT ON card_data
+BEGIN
+    INSERT INTO cards (url, label, box_name, name, "set", number_in_set, image_url, price_avg)
+    VALUES (NEW.url, NEW.label, NEW.box_name, NEW.name, NEW."set", NEW.number_in_set, NEW.image_url,
+        CASE WHEN NEW.price_avg = 'NA' THEN NULL ELSE CAST(NEW.price_avg AS REAL) END)
+    ON CONFLICT (url, label, box_name) DO UPDATE SET
+        name = excluded.name,
+        "set" = excluded."set",
+        number_in_set = excluded.number_in_set,
+        image_url = excluded.image_url,
+        price_avg = excluded.price_avg;
+
+    INSERT INTO listings (card_id, price, shipping, stock)
+    SELECT card_id,
+        CASE WHEN NEW.price LIKE '$%' THEN CAST(REPLACE(REPLACE(NEW.price, '$', ''), ',', '') AS REAL) END,
+        CASE WHEN NEW.shipping LIKE '$%' THEN CAST(REPLACE(REPLACE(NEW.shipping, '$', ''), ',', '') AS REAL) END,
+        CASE WHEN NEW.stock GLOB '[0-9]*' THEN CAST(NEW.stock AS INTEGER) END
+    FROM cards
+    WHERE url = NEW.url AND label = NEW.label AND box_name = NEW.box_name;
+END;
+
+CREATE TRIGGER IF NOT EXISTS card_data_update INSTEAD OF UPDATE OF price_avg ON card_data
+BEGIN
+    UPDATE cards
+    SET price_avg = CASE WHEN NEW.price_avg = 'NA' THEN NULL ELSE CAST(NEW.price_avg AS REAL) END
+    WHERE url = OLD.url AND label = OLD.label AND box_name = OLD.box_name;
+END;
+'''
+
+# The spotlight each card was priced with. Pages don't keep it in card_data,
+# yet the crawler's price rule depends on it, so repricing needs it. Flat
+# databases get this table too, through create_spotlights. inferred marks a
+# spotlight reconstructed from a stored price by pricing.infer_spotlights.
+SPOTLIGHTS_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS spotlights (
+    url TEXT NOT NULL,
+    label TEXT NOT NULL,
+    box_name TEXT NOT NULL,
+    price REAL,
+    stock INTEGER,
+    direct INTEGER NOT NULL,
+    inferred INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (url, label, box_name)
+) WITHOUT ROWID;
+'''
+
+def is_normalized(connection):
+    row = connection.execute("SELECT type FROM sqlite_master WHERE name = 'card_data'").fetchone()
+    return row is not None and row[0] == 'view'
+
+def create_schema(connection):
+    connection.executescript(SCHEMA)
+    create_spotlights(connection)
+
+def create_spotlights(connection):
+    connection.executescript(SPOTLIGHTS_SCHEMA)
+
+def has_spotlights(connection, schema='main'):
+    return connection.execute(f"SELECT 1 FROM {schema}.sqlite_master WHERE name = 'spotlights'").fetchone() is not None
+
+def start_scrape_run(connection, backend):
+    with connection:
+        cursor = connection.execute('INSERT INTO scrape_runs (started_at, backend) VALUES (?, ?)', (int(time.time()), backend))
+    return cursor.lastrowid
+
+def finish_scrape_run(connection, run_id):
+    with connection:
+        connection.execute('''
+        UPDATE scrape_runs
+        SET finished_at = ?,
+            cards = (SELECT COUNT(*) FROM cards),
+            listings = (SELECT COUNT(*) FROM listings)
+        WHERE run_id = ?
+        ''', (int(time.time()), run_id))
+
+def migrate_database(db_path):
+    # Converts a flat card_data table into the normalized schema, in place
+    connection = sqlite3.connect(db_path)
+    try:
+        if is_normalized(connection):
+            return False
+        with connection:
+            connection.execute('ALTER TABLE card_data RENAME TO card_data_legacy')
+            connection.executescript(SCHEMA)
+            create_spotlights(connection)
+            run_id = connection.execute(
+                'INSERT INTO scrape_runs (started_at, backend) VALUES (?, ?)',
+                (int(os.path.getmtime(db_path)), 'migrated')
+            ).lastrowid
+            connection.execute('''
+            INSERT INTO card_data (name, label, "set", number_in_set, image_url, box_name, url, price, shipping, stock, price_avg)
+            SELECT name, label, "set", number_in_set, image_url, box_name, url, price, shipping, stock, price_avg
+            FROM card_data_legacy
+            ORDER BY rowid
+            ''')
+            connection.execute('DROP TABLE card_data_legacy')
+        finish_scrape_run(connection, run_id)
+        connection.execute('VACUUM')
+        return True
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    # Usage: python schema.py                         (migrates a copy of the live snapshot and publishes it)
+    #        python schema.py db_path [db_path ...]   (migrates unpublished databases, e.g. pullbox_cards_yesterday.db, in place)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    if len(sys.argv) == 1:
+        if republish_snapshot(base_path, migrate_database) is None:
+            print(f"Already migrated: {current_snapshot_path(base_path)}")
+    else:
+        published = [db_path for db_path in sys.argv[1:] if is_published(base_path, db_path)]
+        if published:
+            print(f"Not writing to published snapshots {', '.join(published)}; run without arguments to migrate and republish the live one")
+            sys.exit(1)
+        for db_path in sys.argv[1:]:
+            print(f"{'Migrated' if migrate_database(db_path) else 'Already migrated'}: {db_path}")
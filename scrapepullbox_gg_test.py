@@ -1,6 +1,5 @@
-import requests
-from bs4 import BeautifulSoup
 import csv
+from box_catalog import scrape_boxes
 
 # List of box names
 box_names = [
@@ -96,42 +95,19 @@ box_names = [
     "I Can Haz Battle, Meow?"
 ]
 
-# Function to convert box name to URL
-def box_name_to_url(box_name):
-    cleaned_name = box_name.lower().replace(" ", "-").replace(",", "").replace("!", "").replace("'", "").replace("?", "").replace("+", "plus")
-    return f"https://www.pullbox.gg/box/{cleaned_name}"
-
-# Function to scrape card names and coin values from a given URL
-def scrape_card_data(url, box_name):
-    response = requests.get(url)
-    card_data = []
-    if response.status_code == 200:
-        soup = BeautifulSoup(response.content, "html.parser")
-        card_tags = soup.find_all("p", class_="text-center w-full text-xs font-normal line-clamp-2")
-        coin_tags = soup.find_all("div", class_="flex items-center p-2 justify-between")
-        
-        for card_tag, coin_tag in zip(card_tags, coin_tags):
-            card_name = card_tag.text.strip()
-            coin_value = coin_tag.find("span", class_="text-xs flex justify-center items-center gap-1").find("span").text.strip()
-            card_data.append((card_name, box_name, coin_value))
-    
-    return card_data
-
 # CSV file to save the data
 csv_file = "card_names_and_values.csv"
 
+# All boxes are fetched concurrently; each page is parsed once for details and coin values
+results, errors = scrape_boxes(box_names)
+
 # Write to CSV
 with open(csv_file, mode='w', newline='', encoding='utf-8') as file:
     writer = csv.writer(file)
     writer.writerow(["Card Name", "Box Name", "Coin Value"])
-    
-    # Iterate through all box names, convert to URL, and scrape card data
-    for box_name in box_names:
-        url = box_name_to_url(box_name)
-        card_data = scrape_card_data(url, box_name)
-        
-        # Write each card's data to the CSV file
-        for card in card_data:
-            writer.writerow(card)
+
+    for rows in results.values():
+        for card_name, condition, printing, card_set, coin_value, box_name in rows:
+            writer.writerow((card_name, box_name, coin_value))
 
 print(f"Card names, their respective boxes, and coin values have been saved to {csv_file}")
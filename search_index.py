@@ -0,0 +1,140 @@
+import difflib
+import os
+import re
+import sqlite3
+import sys
+from card_names import process_card_number, process_name, process_set_name
+from schema import is_normalized
+from snapshots import is_published, republish_snapshot
+
+# Card search. Each snapshot carries two FTS5 tables over the same cleaned-up
+# text: card_search (word tokens, for prefix matches ranked by bm25) and
+# card_search_trigram (for typo-tolerant matches when the prefix query comes up
+# short). Names drop variant text like "(Secret)" and the " - Set" suffix;
+# sets drop their series prefix, as process_name/process_set_name do for eBay.
+# The variant text gets its own, lightly weighted column.
+SEARCH_SCHEMA = '''
+DROP TABLE IF EXISTS card_search;
+DROP TABLE IF EXISTS card_search_trigram;
+CREATE VIRTUAL TABLE card_search USING fts5(
+    name, variant, set_name, number, box_name,
+    card_name UNINDEXED, label UNINDEXED,
+    tokenize = 'unicode61 remove_diacritics 2',
+    prefix = '2 3'
+);
+CREATE VIRTUAL TABLE card_search_trigram USING fts5(text, tokenize = 'trigram');
+'''
+
+# bm25 column weights: a hit in the card name outranks one in the set or box
+RANK_SQL = 'bm25(card_search, 10.0, 2.0, 3.0, 5.0, 1.0)'
+
+FUZZY_CANDIDATES = 200
+FUZZY_MIN_RATIO = 0.75
+
+def search_name(name):
+    return process_name(name.split(' - ')[0])
+
+def search_variant(name):
+    return ' '.join(re.findall(r'\(([^)]*)\)', name.split(' - ')[0]))
+
+def search_text(name, card_set, number_in_set, box_name):
+    return (search_name(name), search_variant(name), process_set_name(card_set or ''), process_card_number(number_in_set or ''), box_name)
+
+def build_search_index(connection):
+    table = 'cards' if is_normalized(connection) else 'card_data'
+    cards = connection.execute(f'SELECT name, box_name, label, MAX("set"), MAX(number_in_set) FROM {table} GROUP BY name, box_name, label').fetchall()
+    rows = [search_text(name, card_set, number_in_set, box_name) + (name, label) for name, box_name, label, card_set, number_in_set in cards]
+    with connection:
+        connection.executescript(SEARCH_SCHEMA)
+        connection.executemany('INSERT INTO card_search (name, variant, set_name, number, box_name, card_name, label) VALUES (?, ?, ?, ?, ?, ?, ?)', rows)
+        # rowids line up, so a trigram hit maps straight back to its card_search row
+        connection.executemany('INSERT INTO card_search_trigram (rowid, text) SELECT ?, ?',
+                               [(rowid, ' '.join(row[:5])) for rowid, row in enumerate(rows, start=1)])
+        connection.execute("INSERT INTO card_search (card_search) VALUES ('optimize')")
+    return len(rows)
+
+def has_search_index(connection):
+    return connection.execute("SELECT 1 FROM sqlite_master WHERE name = 'card_search'").fetchone() is not None
+
+def tokenize(query):
+    return re.findall(r'\w+', query.lower())
+
+def word_matches(token, words):
+    return any(word.startswith(token) or difflib.SequenceMatcher(None, token, word).ratio() >= FUZZY_MIN_RATIO for word in words)
+
+def fuzzy_matches(connection, tokens, exclude, limit):
+    # Candidates share trigrams with the query; each query word must then be a
+    # prefix of, or close to, some word in the card's text
+    trigrams = {token[i:i + 3] for token in tokens if len(token) >= 3 for i in range(len(token) - 2)}
+    if not trigrams:
+        return []
+    candidates = connection.execute(f'''
+    SELECT rowid, text FROM card_search_trigram
+    WHERE card_search_trigram MATCH ?
+    ORDER BY rank
+    LIMIT {FUZZY_CANDIDATES}
+    ''', (' OR '.join(f'"{trigram}"' for trigram in sorted(trigrams)),)).fetchall()
+
+    scored = []
+    for rowid, text in candidates:
+        if rowid in exclude:
+            continue
+        words = tokenize(text)
+        if all(word_matches(token, words) for token in tokens):
+            score = sum(max(difflib.SequenceMatcher(None, token, word).ratio() for word in words) for token in tokens)
+            scored.append((-score, rowid))
+    return [rowid for _, rowid in sorted(scored)[:limit]]
+
+def search_cards(connection, query, limit=20):
+    # Returns [(name, box_name, label)], best match first
+    tokens = tokenize(query)
+    if not tokens:
+        return []
+    rowids = [row[0] for row in connection.execute(f'''
+    SELECT rowid FROM card_search
+    WHERE card_search MATCH ?
+    ORDER BY {RANK_SQL}
+    LIMIT ?
+    ''', (' AND '.join(f'"{token}"*' for token in tokens), limit))]
+    if len(rowids) < limit:
+        rowids += fuzzy_matches(connection, tokens, set(rowids), limit - len(rowids))
+    if not rowids:
+        return []
+
+    keys = {row[0]: row[1:] for row in connection.execute(f'''
+    SELECT rowid, card_name, box_name, label FROM card_search
+    WHERE rowid IN ({', '.join('?' for _ in rowids)})
+    ''', rowids)}
+    return [keys[rowid] for rowid in rowids]
+
+def build_memory_index(connection):
+    # For snapshots published before search existed, which the app opens read-only
+    memory = sqlite3.connect(':memory:', check_same_thread=False)
+    table = 'cards' if is_normalized(connection) else 'card_data'
+    memory.execute('CREATE TABLE card_data (name TEXT, box_name TEXT, label TEXT, "set" TEXT, number_in_set TEXT)')
+    memory.executemany('INSERT INTO card_data VALUES (?, ?, ?, ?, ?)',
+                       connection.execute(f'SELECT DISTINCT name, box_name, label, "set", number_in_set FROM {table}'))
+    build_search_index(memory)
+    return memory
+
+def index_database(db_path):
+    connection = sqlite3.connect(db_path)
+    try:
+        print(f"Indexed {build_search_index(connection)} cards in {db_path}")
+    finally:
+        connection.close()
+
+if __name__ == "__main__":
+    # Usage: python search_index.py                         (indexes a copy of the live snapshot and publishes it)
+    #        python search_index.py db_path [db_path ...]   (indexes unpublished databases, e.g. staging files, in place)
+    script_dir = os.path.dirname(os.path.abspath(__file__))
+    base_path = os.path.join(script_dir, 'databases')
+    if len(sys.argv) == 1:
+        republish_snapshot(base_path, index_database)
+    else:
+        published = [db_path for db_path in sys.argv[1:] if is_published(base_path, db_path)]
+        if published:
+            print(f"Not writing to published snapshots {', '.join(published)}; run without arguments to index and republish the live one")
+            sys.exit(1)
+        for db_path in sys.argv[1:]:
+            index_database(db_path)
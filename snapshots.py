@@ -0,0 +1,119 @@
+import os
+import glob
+import sqlite3
+from datetime import datetime
+
+# Each nightly crawl builds into a staging file and is then published as a dated
+# snapshot. current_snapshot.txt names the live one; it is swapped with os.replace
+# so readers always see either the old or the new snapshot, never a half-built one.
+SNAPSHOT_DIR = 'snapshots'
+SNAPSHOT_PREFIX = 'pullbox_cards_'
+POINTER_FILE = 'current_snapshot.txt'
+LEGACY_DB = 'pullbox_cards.db'
+
+def get_snapshot_dir(base_path):
+    return os.path.join(base_path, SNAPSHOT_DIR)
+
+def list_snapshots(base_path):
+    return sorted(glob.glob(os.path.join(get_snapshot_dir(base_path), f'{SNAPSHOT_PREFIX}*.db')))
+
+def current_snapshot_path(base_path):
+    pointer_path = os.path.join(base_path, POINTER_FILE)
+    try:
+        with open(pointer_path, encoding='utf-8') as pointer:
+            snapshot_name = pointer.read().strip()
+    except FileNotFoundError:
+        snapshot_name = ''
+
+    if snapshot_name:
+        snapshot_path = os.path.join(get_snapshot_dir(base_path), snapshot_name)
+        if os.path.exists(snapshot_path):
+            return snapshot_path
+
+    # Databases created before snapshots existed
+    legacy_path = os.path.join(base_path, LEGACY_DB)
+    return legacy_path if os.path.exists(legacy_path) else None
+
+def previous_snapshot_path(base_path, snapshot_path):
+    snapshots = list_snapshots(base_path)
+    if snapshot_path in snapshots:
+        index = snapshots.index(snapshot_path)
+        return snapshots[index - 1] if index > 0 else None
+    return None
+
+def remove_database_files(db_path):
+    for suffix in ('', '-wal', '-shm', '-journal'):
+        try:
+            os.remove(db_path + suffix)
+        except FileNotFoundError:
+            pass
+
+def new_staging_path(base_path):
+    snapshot_dir = get_snapshot_dir(base_path)
+    os.makedirs(snapshot_dir, exist_ok=True)
+    # Leftovers from a crawl that was interrupted before publishing
+    for stale in glob.glob(os.path.join(snapshot_dir, 'staging_*.db')):
+        remove_database_files(stale)
+    return os.path.join(snapshot_dir, f'staging_{datetime.now():%Y%m%d_%H%M%S}.db')
+
+def write_pointer(base_path, snapshot_name):
+    pointer_path = os.path.join(base_path, POINTER_FILE)
+    temp_path = pointer_path + '.tmp'
+    with open(temp_path, 'w', encoding='utf-8') as pointer:
+        pointer.write(snapshot_name)
+        pointer.flush()
+        os.fsync(pointer.fileno())
+    os.replace(temp_path, pointer_path)
+
+def prune_snapshots(base_path, keep):
+    current = current_snapshot_path(base_path)
+    for snapshot_path in list_snapshots(base_path)[:-max(keep, 1)]:
+        if snapshot_path == current:
+            continue
+        try:
+            remove_database_files(snapshot_path)
+        except OSError as e:
+            # Still open somewhere (e.g. a reader on Windows); it will be pruned next run
+            print(f"Could not remove old snapshot {snapshot_path}: {e}")
+
+def publish_snapshot(base_path, staging_path, keep=7):
+    snapshot_name = f'{SNAPSHOT_PREFIX}{datetime.now():%Y%m%d_%H%M%S}.db'
+    snapshot_path = os.path.join(get_snapshot_dir(base_path), snapshot_name)
+    os.replace(staging_path, snapshot_path)
+    write_pointer(base_path, snapshot_name)
+    prune_snapshots(base_path, keep)
+    print(f"Published snapshot {snapshot_path}")
+    return snapshot_path
+
+def is_published(base_path, db_path):
+    # The live database and every dated snapshot are opened immutable by the web app, never write to them
+    directory, name = os.path.split(os.path.abspath(db_path))
+    if os.path.basename(directory) == SNAPSHOT_DIR and name.startswith(SNAPSHOT_PREFIX):
+        return True
+    published = list_snapshots(base_path) + [current_snapshot_path(base_path)]
+    return any(path is not None and os.path.exists(path) and os.path.samefile(path, db_path) for path in published)
+
+def republish_snapshot(base_path, update, keep=7):
+    # Copies the live snapshot into a staging file, runs update(staging_path) on the copy and
+    # publishes it; when update returns False there was nothing to change and the copy is dropped
+    source_path = current_snapshot_path(base_path)
+    if source_path is None:
+        raise FileNotFoundError(f"No published database found in {base_path}")
+    staging_path = new_staging_path(base_path)
+
+    source = sqlite3.connect(f"file:{source_path}?mode=ro", uri=True)
+    staging = sqlite3.connect(staging_path)
+    try:
+        source.backup(staging)
+    finally:
+        staging.close()
+        source.close()
+    try:
+        changed = update(staging_path)
+    except BaseException:
+        remove_database_files(staging_path)
+        raise
+    if changed is False:
+        remove_database_files(staging_path)
+        return None
+    return publish_snapshot(base_path, staging_path, keep=keep)
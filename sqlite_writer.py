@@ -0,0 +1,136 @@
+import queue
+import sqlite3
+import threading
+import time
+
+# busy_timeout goes first so the others wait out a lock held by another writer
+WRITER_PRAGMAS = (
+    'PRAGMA busy_timeout=5000',
+    'PRAGMA journal_mode=WAL',
+    'PRAGMA synchronous=NORMAL',
+    'PRAGMA temp_store=MEMORY',
+    'PRAGMA cache_size=-20000',
+)
+
+def configure_connection(connection):
+    # WAL lets readers (the Flask app) keep reading while the crawl writes
+    for pragma in WRITER_PRAGMAS:
+        connection.execute(pragma)
+
+def is_busy_error(error):
+    # SQLITE_BUSY / SQLITE_LOCKED: another connection (e.g. the other writer on the staging db) holds the lock
+    return isinstance(error, sqlite3.OperationalError) and ('locked' in str(error) or 'busy' in str(error))
+
+class SqliteBatchWriter:
+    """Writes rows from any thread to one SQLite database on a dedicated thread.
+
+    Rows are inserted with executemany, one transaction per batch of
+    `batch_size` rows or every `flush_interval` seconds, whichever comes first.
+    A batch that hits a locked database is retried `max_retries` times; rows
+    that still can't be written count in failed_rows, and `ok` tells the
+    caller whether everything put() was written.
+    """
+
+    _STOP = object()
+
+    def __init__(self, db_path, insert_sql, batch_size=500, flush_interval=2.0, max_queue=10000,
+                 max_retries=5, retry_delay=0.5):
+        self.db_path = db_path
+        self.insert_sql = insert_sql
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue = queue.Queue(maxsize=max_queue)
+        self.rows_written = 0
+        self.batches_written = 0
+        self.failed_rows = 0
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.error = None
+        self.stopped = False
+        self.started = time.monotonic()
+        self.thread = threading.Thread(target=self._run, name='sqlite-writer', daemon=True)
+        self.thread.start()
+
+    @property
+    def ok(self):
+        return self.failed_rows == 0 and self.error is None and (self.thread.is_alive() or self.stopped)
+
+    def _put(self, item):
+        # Blocks when the writer falls max_queue cards behind, which throttles the scrapers,
+        # but never on a writer thread that has died
+        while True:
+            if not self.thread.is_alive():
+                raise RuntimeError(f"The writer for {self.db_path} has stopped: {self.error}")
+            try:
+                self.queue.put(item, timeout=1.0)
+                return
+            except queue.Full:
+                pass
+
+    def put(self, rows):
+        self._put(list(rows))
+
+    def _flush(self, connection, pending):
+        if not pending:
+            return
+        for attempt in range(self.max_retries + 1):
+            try:
+                with connection:
+                    connection.executemany(self.insert_sql, pending)
+                self.rows_written += len(pending)
+                self.batches_written += 1
+                break
+            except sqlite3.Error as e:
+                if is_busy_error(e) and attempt < self.max_retries:
+                    time.sleep(self.retry_delay * 2 ** attempt)
+                    continue
+                print(f"Failed to write {len(pending)} rows to {self.db_path}: {e}")
+                self.failed_rows += len(pending)
+                self.error = e
+                break
+        pending.clear()
+
+    def _run(self):
+        try:
+            self._write_loop()
+        except BaseException as e:
+            self.error = e
+            print(f"The writer for {self.db_path} stopped: {e}")
+
+    def _write_loop(self):
+        connection = sqlite3.connect(self.db_path)
+        configure_connection(connection)
+        pending = []
+        deadline = time.monotonic() + self.flush_interval
+        try:
+            while True:
+                try:
+                    item = self.queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    item = None
+
+                if item is self._STOP:
+                    break
+                if item:
+                    pending.extend(item)
+
+                if len(pending) >= self.batch_size or time.monotonic() >= deadline:
+                    self._flush(connection, pending)
+                    deadline = time.monotonic() + self.flush_interval
+        finally:
+            self._flush(connection, pending)
+            connection.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            connection.close()
+
+    def close(self):
+        # Returns self.ok: False when any row wasn't written or the writer thread died
+        try:
+            self._put(self._STOP)
+        except RuntimeError:
+            pass
+        self.thread.join()
+        self.stopped = True
+        elapsed = time.monotonic() - self.started
+        print(f"Wrote {self.rows_written} rows in {self.batches_written} batches "
+              f"({self.rows_written / elapsed if elapsed else 0:.0f} rows/s), {self.failed_rows} rows failed")
+        return self.ok
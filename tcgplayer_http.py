@@ -0,0 +1,228 @@
+import json
+import os
+import re
+import sys
+import threading
+import requests
+from urllib.parse import urlparse, parse_qs
+
+TCGPLAYER_API_BASE = os.environ.get('TCGPLAYER_API_BASE', 'https://mp-search-api.tcgplayer.com')
+PRODUCT_IMAGE_URL = 'https://product-images.tcgplayer.com/fit-in/400x400/{product_id}.jpg'
+USER_AGENT = 'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/124.0 Safari/537.36'
+
+NA_LISTING = {
+    'Price': "NA",
+    'Stock': "NA",
+    'Shipping Cost': "NA",
+    'Seller': "NA",
+    'Sales': "NA",
+    'Direct': "NA"
+}
+
+NA_SPOTLIGHT = {
+    'Spotlight Price': "NA",
+    'Spotlight Stock': "NA",
+    'Direct': "NA"
+}
+
+def get_product_id(url):
+    match = re.search(r'/product/(\d+)', url)
+    if not match:
+        raise ValueError(f"No TCGplayer product id in URL {url}")
+    return int(match.group(1))
+
+def get_listing_filters(url):
+    query = parse_qs(urlparse(url).query)
+    term = {
+        'sellerStatus': 'Live',
+        'channelId': 0,
+        'language': ['English'],
+        'listingType': query.get('ListingType', ['standard'])[0]
+    }
+    if 'Printing' in query:
+        term['printing'] = [query['Printing'][0]]
+    if 'Condition' in query:
+        term['condition'] = query['Condition'][0].split('|')
+    return term
+
+def format_price(value):
+    # Same text the product page renders, e.g. "$1,234.56"
+    return f"${float(value):,.2f}"
+
+def format_shipping(value):
+    # The page only renders .shipping-messages__price for paid shipping
+    if not value:
+        return "NA"
+    return format_price(value)
+
+def format_number_in_set(details):
+    attributes = details.get('customAttributes') or {}
+    number = attributes.get('number')
+    rarity = details.get('rarityName')
+    if number and rarity:
+        return f"{number} / {rarity}"
+    return number or rarity or "NA"
+
+def parse_card_info(product_id, details):
+    return {
+        'Card Name': (details.get('productName') or "NA").strip(),
+        'Card Set': (details.get('setName') or "NA").strip(),
+        'Number in Set': format_number_in_set(details),
+        'Image URL': PRODUCT_IMAGE_URL.format(product_id=product_id)
+    }
+
+def is_direct(listing):
+    # directProduct (TCGplayer fulfils this listing) rather than directSeller
+    # (the seller is in the Direct program): it is what puts the Direct banner
+    # on the spotlight and what the crawler's "Free Shipping" rule depends on,
+    # so listings and spotlight are judged the same way
+    return bool(listing.get('directProduct'))
+
+def parse_listings_info(listings):
+    listings_info = []
+    for listing in listings:
+        listings_info.append({
+            'Price': format_price(listing['price']),
+            'Stock': str(int(listing['quantity'])),
+            'Shipping Cost': format_shipping(listing.get('shippingPrice')),
+            'Seller': listing.get('sellerName', "NA"),
+            'Sales': str(listing.get('sellerSales', "NA")),
+            'Direct': "yes" if is_direct(listing) else "no"
+        })
+    if not listings_info:
+        listings_info.append(dict(NA_LISTING))
+    return listings_info
+
+def parse_spotlight_info(listings):
+    # The product page spotlights the cheapest TCGplayer Direct listing when one
+    # exists, otherwise the cheapest listing overall
+    if not listings:
+        return dict(NA_SPOTLIGHT)
+    direct_listings = [listing for listing in listings if is_direct(listing)]
+    spotlight = (direct_listings or listings)[0]
+    return {
+        'Spotlight Price': f"{float(spotlight['price']):.2f}",
+        'Spotlight Stock': str(int(spotlight['quantity'])),
+        'Direct': "yes" if is_direct(spotlight) else "no"
+    }
+
+class TcgplayerHttpClient:
+    """Fetches a product page's card, listing and spotlight data from the JSON
+    API the page itself calls, without a browser."""
+
+    def __init__(self, api_base=TCGPLAYER_API_BASE, listings_per_page=10, timeout=10, session=None):
+        self.api_base = api_base.rstrip('/')
+        self.listings_per_page = listings_per_page
+        self.timeout = timeout
+        self.session = session or requests.Session()
+        self.session.headers.setdefault('User-Agent', USER_AGENT)
+
+    def get_product_details(self, product_id):
+        response = self.session.get(f"{self.api_base}/v2/product/{product_id}/details", timeout=self.timeout)
+        response.raise_for_status()
+        return response.json()
+
+    def get_listings(self, product_id, filters):
+        payload = {
+            'filters': {
+                'term': filters,
+                'range': {'quantity': {'gte': 1}},
+                'exclude': {'channelExclusion': 0}
+            },
+            'from': 0,
+            'size': self.listings_per_page,
+            'sort': {'field': 'price+shipping', 'order': 'asc'},
+            'context': {'shippingCountry': 'US', 'cart': {}}
+        }
+        response = self.session.post(f"{self.api_base}/v1/product/{product_id}/listings", json=payload, timeout=self.timeout)
+        response.raise_for_status()
+        results = response.json().get('results') or [{}]
+        return results[0].get('results', [])
+
+    def fetch_card_page(self, url):
+        product_id = get_product_id(url)
+        card_info = parse_card_info(product_id, self.get_product_details(product_id))
+        listings = self.get_listings(product_id, get_listing_filters(url))
+        return card_info, parse_listings_info(listings), parse_spotlight_info(listings)
+
+    def close(self):
+        self.session.close()
+
+# Recorded API responses (trimmed) for the offline check below
+FIXTURE_PRODUCT_ID = 250299
+FIXTURE_DETAILS = {
+    'productName': 'Umbreon VMAX (Alternate Art Secret)',
+    'setName': 'SWSH07: Evolving Skies',
+    'rarityName': 'Secret Rare',
+    'customAttributes': {'number': '215/203'},
+}
+FIXTURE_LISTINGS = {'results': [{'totalResults': 3, 'results': [
+    {'price': 1349.99, 'quantity': 1.0, 'shippingPrice': 0.0, 'sellerName': 'Card Shop A', 'sellerSales': '10,000+',
+     'directSeller': True, 'directProduct': False},
+    {'price': 1375.0, 'quantity': 2.0, 'shippingPrice': 0.0, 'sellerName': 'Card Shop B', 'sellerSales': '5,000+',
+     'directSeller': True, 'directProduct': True},
+    {'price': 1399.5, 'quantity': 1.0, 'shippingPrice': 4.99, 'sellerName': 'Card Shop C', 'sellerSales': '100+',
+     'directSeller': False, 'directProduct': False},
+]}]}
+
+if __name__ == "__main__":
+    # Usage: python tcgplayer_http.py
+    # Parses the recorded responses served by a local stand-in for the TCGplayer API, no network needed
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class FakeTcgplayerApi(BaseHTTPRequestHandler):
+        def respond(self, payload):
+            body = json.dumps(payload).encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            self.respond(FIXTURE_DETAILS)
+
+        def do_POST(self):
+            request_body = json.loads(self.rfile.read(int(self.headers['Content-Length'])))
+            self.server.filters = request_body['filters']['term']
+            self.respond(FIXTURE_LISTINGS)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FakeTcgplayerApi)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    client = TcgplayerHttpClient(api_base=f"http://127.0.0.1:{server.server_port}")
+    try:
+        card_info, listings_info, spotlight_info = client.fetch_card_page(
+            f"https://www.tcgplayer.com/product/{FIXTURE_PRODUCT_ID}/pokemon-umbreon-vmax?Printing=Holofoil&Condition=Near+Mint|Lightly+Played")
+    finally:
+        client.close()
+        server.shutdown()
+
+    expected_card_info = {
+        'Card Name': 'Umbreon VMAX (Alternate Art Secret)',
+        'Card Set': 'SWSH07: Evolving Skies',
+        'Number in Set': '215/203 / Secret Rare',
+        'Image URL': PRODUCT_IMAGE_URL.format(product_id=FIXTURE_PRODUCT_ID),
+    }
+    expected_listings = [
+        {'Price': '$1,349.99', 'Stock': '1', 'Shipping Cost': 'NA', 'Seller': 'Card Shop A', 'Sales': '10,000+', 'Direct': 'no'},
+        {'Price': '$1,375.00', 'Stock': '2', 'Shipping Cost': 'NA', 'Seller': 'Card Shop B', 'Sales': '5,000+', 'Direct': 'yes'},
+        {'Price': '$1,399.50', 'Stock': '1', 'Shipping Cost': '$4.99', 'Seller': 'Card Shop C', 'Sales': '100+', 'Direct': 'no'},
+    ]
+    expected_spotlight = {'Spotlight Price': '1375.00', 'Spotlight Stock': '2', 'Direct': 'yes'}
+    expected_filters = {'sellerStatus': 'Live', 'channelId': 0, 'language': ['English'], 'listingType': 'standard',
+                        'printing': ['Holofoil'], 'condition': ['Near Mint', 'Lightly Played']}
+
+    failures = [name for name, actual, expected in (
+        ('card info', card_info, expected_card_info),
+        ('listings', listings_info, expected_listings),
+        ('spotlight', spotlight_info, expected_spotlight),
+        ('listing filters', server.filters, expected_filters),
+        ('empty listings', (parse_listings_info([]), parse_spotlight_info([])), ([NA_LISTING], NA_SPOTLIGHT)),
+    ) if actual != expected]
+    for name in failures:
+        print(f"Mismatch in {name}")
+    print("Offline check passed" if not failures else f"{len(failures)} offline checks failed")
+    sys.exit(1 if failures else 0)
@@ -1,28 +1,26 @@
-import pandas as pd
-import sqlite3
 from os.path import exists
+from ingest import ingest_file
+
+FILTERED_COLUMNS = {
+    'name': 'TEXT',
+    'source': 'TEXT',
+    'details': 'TEXT',
+    'value': 'REAL',
+}
 
 def filter_and_save_to_db(input_file, output_db):
     # Check if the input file exists
     if not exists(input_file):
         raise FileNotFoundError(f"The file {input_file} does not exist.")
-    
+
     try:
-        # Read the CSV file into a pandas DataFrame
-        df = pd.read_csv(input_file)
-        
-        # Filter the DataFrame to exclude rows where the "value" column is null
-        filtered_df = df.dropna(subset=['details'])
-        
-        # Select only the specified columns
-        filtered_df = filtered_df[['name', 'source', 'details', 'value']]
-        
-        # Use a context manager to handle the SQLite database connection
-        with sqlite3.connect(output_db) as conn:
-            # Write the filtered data to a new table named 'filtered_data' in the database
-            filtered_df.to_sql('filtered_data', conn, if_exists='replace', index=False)
-            
-        print("Filtered data has been written to", output_db)
+        # Streams the CSV in chunks, skipping rows without "details". Rows are keyed by
+        # their position in the file, so duplicates are kept as to_sql kept them
+        rows = ingest_file(input_file, output_db, 'filtered_data', FILTERED_COLUMNS, required=['details'])
+        if rows is not None:
+            print(f"{rows} rows of filtered data have been written to", output_db)
+        else:
+            print("Filtered data has been written to", output_db)
     except Exception as e:
         print("An error occurred:", e)
 
@@ -0,0 +1,147 @@
+import os
+import sqlite3
+import threading
+import time
+import numpy as np
+import pandas as pd
+import requests
+from concurrent.futures import ThreadPoolExecutor
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Resolves TCGplayer product links to the URL they finally redirect to. Only
+# headers are fetched (HEAD, or a streamed GET whose body is never read when a
+# server refuses HEAD), many at once over one pooled session, and every
+# resolved redirect is cached on disk keyed by the source URL, so a re-run on
+# an unchanged sheet makes no requests at all. Only redirects that end in a
+# 2xx page are cached: a 404, 429 or 5xx is used for this run, as it always
+# was, and tried again on the next.
+
+PRINTING_SUFFIXES = {
+    'Holofoil': "&Printing=Holofoil",
+    'Normal': "&Printing=Normal",
+    '1st Edition Holofoil': "&Printing=1st+Edition+Holofoil",
+    '1st Edition': "&Printing=1st+Edition",
+    'Reverse Holofoil': "&Printing=Reverse+Holofoil",
+}
+
+# Checked in order; the first condition text that matches wins
+CONDITION_SUFFIXES = (
+    ('Lightly Played+', "&ListingType=standard&page=1&Condition=Lightly+Played|Near+Mint"),
+    ('Near Mint', "&ListingType=standard&page=1&Condition=Near+Mint"),
+)
+DEFAULT_CONDITION_SUFFIX = "&ListingType=standard&page=1"
+
+CACHE_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS redirects (
+    source_url TEXT PRIMARY KEY,
+    final_url TEXT NOT NULL,
+    resolved_at INTEGER NOT NULL
+) WITHOUT ROWID;
+'''
+
+def get_cache_path(base_path):
+    return os.path.join(base_path, 'redirect_cache.db')
+
+class RedirectCache:
+    def __init__(self, cache_path):
+        self.connection = sqlite3.connect(cache_path, check_same_thread=False)
+        self.connection.executescript(CACHE_SCHEMA)
+        self.lock = threading.Lock()
+
+    def get_many(self, source_urls):
+        found = {}
+        source_urls = list(source_urls)
+        with self.lock:
+            # Chunked to stay under SQLite's bound parameter limit
+            for i in range(0, len(source_urls), 500):
+                chunk = source_urls[i:i + 500]
+                found.update(self.connection.execute(
+                    f"SELECT source_url, final_url FROM redirects WHERE source_url IN ({', '.join('?' for _ in chunk)})", chunk
+                ).fetchall())
+        return found
+
+    def put(self, source_url, final_url):
+        with self.lock:
+            with self.connection:
+                self.connection.execute('INSERT OR REPLACE INTO redirects (source_url, final_url, resolved_at) VALUES (?, ?, ?)',
+                                        (source_url, final_url, int(time.time())))
+
+    def close(self):
+        self.connection.close()
+
+def create_session(pool_size=16, retries=3, backoff_factor=0.5):
+    retry = Retry(total=retries, backoff_factor=backoff_factor, status_forcelist=(429, 500, 502, 503, 504),
+                  allowed_methods=frozenset(['HEAD', 'GET']), respect_retry_after_header=True, raise_on_status=False)
+    adapter = HTTPAdapter(pool_connections=4, pool_maxsize=pool_size, max_retries=retry)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+def resolve_url(session, url, timeout=15):
+    # Returns (final URL, status code of the page it ends on)
+    response = session.head(url, allow_redirects=True, timeout=timeout)
+    if response.status_code in (403, 405, 501):
+        # No HEAD support; follow the redirects with GET but never download the page
+        with session.get(url, allow_redirects=True, timeout=timeout, stream=True) as response:
+            return response.url, response.status_code
+    return response.url, response.status_code
+
+def resolve_urls(urls, cache, concurrency=16, session=None):
+    # Returns {source_url: final_url}; URLs that fail to resolve are left out
+    unique_urls = list(dict.fromkeys(urls))
+    resolved = cache.get_many(unique_urls)
+    pending = [url for url in unique_urls if url not in resolved]
+    if not pending:
+        return resolved
+
+    session = session or create_session(pool_size=concurrency)
+
+    def resolve(url):
+        try:
+            final_url, status_code = resolve_url(session, url)
+        except requests.exceptions.RequestException as e:
+            print(f"Error processing URL: {url}. Error: {e}")
+            return url, None
+        if 200 <= status_code < 300:
+            cache.put(url, final_url)
+        else:
+            print(f"Not caching {url}, it ended on status {status_code}")
+        return url, final_url
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for url, final_url in executor.map(resolve, pending):
+            if final_url is not None:
+                resolved[url] = final_url
+    print(f"Resolved {len(pending)} URLs ({len(unique_urls) - len(pending)} from cache)")
+    return resolved
+
+def build_query_suffix(printing, condition):
+    # Vectorized form of the per-row Printing/Condition if/elif chains
+    printing_suffix = printing.map(PRINTING_SUFFIXES).fillna('')
+    condition = condition.astype(str)
+    condition_suffix = np.select(
+        [condition.str.contains(text, regex=False) for text, _ in CONDITION_SUFFIXES],
+        [suffix for _, suffix in CONDITION_SUFFIXES],
+        default=DEFAULT_CONDITION_SUFFIX
+    )
+    return printing_suffix + pd.Series(condition_suffix, index=condition.index)
+
+def add_new_urls(df, cache, concurrency=16, session=None):
+    # Fills df['New_URL'] for rows with a URL, condition and printing; returns the new URLs in row order
+    complete = df['Urls'].notna() & df['Condition'].notna() & df['Printing'].notna()
+    skipped = int((~complete).sum())
+    if skipped:
+        print(f"Missing URL, condition, or printing in {skipped} rows. Skipping...")
+
+    rows = df[complete]
+    resolved = resolve_urls(rows['Urls'], cache, concurrency=concurrency, session=session)
+    final_urls = rows['Urls'].map(resolved)
+    new_urls = (final_urls + build_query_suffix(rows['Printing'], rows['Condition'])).dropna()
+
+    if 'New_URL' not in df.columns:
+        df['New_URL'] = None
+    df['New_URL'] = df['New_URL'].astype(object)
+    df.loc[new_urls.index, 'New_URL'] = new_urls
+    return new_urls.tolist()
@@ -0,0 +1,157 @@
+import queue
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from selenium import webdriver
+from selenium.webdriver.chrome.service import Service
+from selenium.common.exceptions import WebDriverException
+from webdriver_manager.chrome import ChromeDriverManager
+
+_chromedriver_path = None
+_chromedriver_lock = threading.Lock()
+
+def get_chromedriver_path():
+    # ChromeDriverManager().install() hits the network and the disk cache, only do it once per process
+    global _chromedriver_path
+    with _chromedriver_lock:
+        if _chromedriver_path is None:
+            _chromedriver_path = ChromeDriverManager().install()
+    return _chromedriver_path
+
+def create_webdriver():
+    return webdriver.Chrome(service=Service(get_chromedriver_path()))
+
+def is_driver_healthy(driver):
+    try:
+        driver.current_url
+        return True
+    except Exception:
+        return False
+
+def quit_driver(driver):
+    try:
+        driver.quit()
+    except Exception as e:
+        print(f"Error while quitting webdriver: {e}")
+
+def percentile(values, pct):
+    if not values:
+        return None
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+class WebDriverPool:
+    """Bounded pool of warm Chrome drivers shared between threads.
+
+    At most `size` drivers exist at once; callers block (up to `acquire_timeout`
+    seconds) until one is free. A driver is recycled after `max_pages` checkouts
+    or as soon as it fails a health check.
+    """
+
+    def __init__(self, size=2, max_pages=50, acquire_timeout=60, driver_factory=create_webdriver):
+        self.size = size
+        self.max_pages = max_pages
+        self.acquire_timeout = acquire_timeout
+        self.driver_factory = driver_factory
+        self._slots = threading.BoundedSemaphore(size)
+        self._idle = queue.LifoQueue()
+        self._lock = threading.Lock()
+        self._pages = {}
+        self._wait_times = deque(maxlen=1000)
+        self._checkouts = 0
+        self._created = 0
+        self._recycled = 0
+        self._closed = False
+
+    def _new_driver(self):
+        driver = self.driver_factory()
+        with self._lock:
+            self._pages[id(driver)] = 0
+            self._created += 1
+        return driver
+
+    def _discard(self, driver):
+        with self._lock:
+            self._pages.pop(id(driver), None)
+            self._recycled += 1
+        quit_driver(driver)
+
+    def acquire(self):
+        if self._closed:
+            raise RuntimeError("WebDriverPool is closed")
+
+        start = time.monotonic()
+        if not self._slots.acquire(timeout=self.acquire_timeout):
+            raise TimeoutError(f"No webdriver became available within {self.acquire_timeout} seconds")
+        waited = time.monotonic() - start
+
+        try:
+            driver = None
+            while driver is None:
+                try:
+                    driver = self._idle.get_nowait()
+                except queue.Empty:
+                    driver = self._new_driver()
+                    break
+                if not is_driver_healthy(driver):
+                    self._discard(driver)
+                    driver = None
+        except Exception:
+            self._slots.release()
+            raise
+
+        with self._lock:
+            self._checkouts += 1
+            self._wait_times.append(waited)
+        return driver
+
+    def release(self, driver, broken=False):
+        try:
+            with self._lock:
+                pages = self._pages.get(id(driver), 0) + 1
+                self._pages[id(driver)] = pages
+            if self._closed or broken or pages >= self.max_pages:
+                self._discard(driver)
+            else:
+                self._idle.put(driver)
+        finally:
+            self._slots.release()
+
+    @contextmanager
+    def checkout(self):
+        driver = self.acquire()
+        broken = False
+        try:
+            yield driver
+        except WebDriverException:
+            broken = not is_driver_healthy(driver)
+            raise
+        finally:
+            self.release(driver, broken=broken)
+
+    def stats(self):
+        with self._lock:
+            waits = list(self._wait_times)
+            return {
+                'size': self.size,
+                'max_pages': self.max_pages,
+                'live_drivers': len(self._pages),
+                'idle_drivers': self._idle.qsize(),
+                'checkouts': self._checkouts,
+                'drivers_created': self._created,
+                'drivers_recycled': self._recycled,
+                'queue_wait_p50': percentile(waits, 50),
+                'queue_wait_p95': percentile(waits, 95),
+                'queue_wait_max': max(waits) if waits else None,
+            }
+
+    def close(self):
+        self._closed = True
+        while True:
+            try:
+                driver = self._idle.get_nowait()
+            except queue.Empty:
+                break
+            self._discard(driver)